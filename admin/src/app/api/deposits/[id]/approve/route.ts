@@ -21,37 +21,38 @@ export async function POST(
       return NextResponse.json({ error: 'Deposit already processed' }, { status: 400 })
     }
 
-    // Update deposit status
-    await prisma.deposit.update({
-      where: { id },
-      data: { status: 'COMPLETED' },
-    })
+    const settled = await prisma.$transaction(async (tx) => {
+      // Claim the deposit first so the CryptoBot webhook or poller cannot credit it a second time
+      const claimed = await tx.deposit.updateMany({
+        where: { id, status: 'PENDING' },
+        data: { status: 'COMPLETED' },
+      })
+      if (claimed.count === 0) {
+        return false
+      }
+
+      // Upsert balance (create if not exists, increment if exists)
+      await tx.balance.upsert({
+        where: { userId: deposit.userId },
+        create: {
+          userId: deposit.userId,
+          amount: deposit.amount,
+        },
+        update: {
+          amount: { increment: deposit.amount },
+        },
+      })
 
-    // Upsert balance (create if not exists, increment if exists)
-    await prisma.balance.upsert({
-      where: { userId: deposit.userId },
-      create: {
-        userId: deposit.userId,
-        amount: deposit.amount,
-      },
-      update: {
-        amount: { increment: deposit.amount },
-      },
+      await tx.transaction.updateMany({
+        where: { depositId: id, status: 'PENDING' },
+        data: { status: 'COMPLETED' },
+      })
+      return true
     })
 
-    // Update transaction linked to this deposit
-    await prisma.transaction.updateMany({
-      where: { 
-        userId: deposit.userId,
-        type: 'TOPUP',
-        status: 'PENDING',
-        metadata: {
-          path: ['depositId'],
-          equals: id,
-        },
-      },
-      data: { status: 'COMPLETED' },
-    })
+    if (!settled) {
+      return NextResponse.json({ error: 'Deposit already processed' }, { status: 409 })
+    }
 
     return NextResponse.json({ success: true })
   } catch (error) {
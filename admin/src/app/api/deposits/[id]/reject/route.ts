@@ -21,23 +21,29 @@ export async function POST(
       return NextResponse.json({ error: 'Deposit already processed' }, { status: 400 })
     }
 
-    await prisma.$transaction([
-      prisma.deposit.update({
-        where: { id },
-        data: { 
+    const cancelled = await prisma.$transaction(async (tx) => {
+      // Same claim as approve: never cancel a deposit that was credited meanwhile
+      const claimed = await tx.deposit.updateMany({
+        where: { id, status: 'PENDING' },
+        data: {
           status: 'CANCELLED',
           adminNote: reason,
         },
-      }),
-      prisma.transaction.updateMany({
-        where: { 
-          userId: deposit.userId,
-          type: 'TOPUP',
-          status: 'PENDING',
-        },
+      })
+      if (claimed.count === 0) {
+        return false
+      }
+
+      await tx.transaction.updateMany({
+        where: { depositId: id, status: 'PENDING' },
         data: { status: 'CANCELLED' },
-      }),
-    ])
+      })
+      return true
+    })
+
+    if (!cancelled) {
+      return NextResponse.json({ error: 'Deposit already processed' }, { status: 409 })
+    }
 
     return NextResponse.json({ success: true })
   } catch (error) {
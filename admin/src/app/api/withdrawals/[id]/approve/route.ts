@@ -1,6 +1,8 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { prisma } from '@/lib/prisma'
 
+class SettlementError extends Error {}
+
 export async function POST(
   request: NextRequest,
   { params }: { params: Promise<{ id: string }> }
@@ -20,23 +22,43 @@ export async function POST(
       return NextResponse.json({ error: 'Withdrawal already processed' }, { status: 400 })
     }
 
-    await prisma.$transaction([
-      prisma.withdrawal.update({
-        where: { id },
+    const settled = await prisma.$transaction(async (tx) => {
+      // Claim the withdrawal first so a concurrent approve or reject cannot settle it twice
+      const claimed = await tx.withdrawal.updateMany({
+        where: { id, status: 'PENDING' },
         data: { status: 'COMPLETED' },
-      }),
-      prisma.transaction.updateMany({
-        where: { 
-          userId: withdrawal.userId,
-          type: 'WITHDRAW',
-          status: 'PENDING',
+      })
+      if (claimed.count === 0) {
+        return false
+      }
+
+      const captured = await tx.balance.updateMany({
+        where: { userId: withdrawal.userId, held: { gte: withdrawal.amount } },
+        data: {
+          amount: { decrement: withdrawal.amount },
+          held: { decrement: withdrawal.amount },
         },
+      })
+      if (captured.count === 0) {
+        throw new SettlementError('Held balance does not cover withdrawal')
+      }
+
+      await tx.transaction.updateMany({
+        where: { withdrawalId: id, status: 'PENDING' },
         data: { status: 'COMPLETED' },
-      }),
-    ])
+      })
+      return true
+    })
+
+    if (!settled) {
+      return NextResponse.json({ error: 'Withdrawal already processed' }, { status: 400 })
+    }
 
     return NextResponse.json({ success: true })
   } catch (error) {
+    if (error instanceof SettlementError) {
+      return NextResponse.json({ error: error.message }, { status: 409 })
+    }
     console.error('Approve withdrawal error:', error)
     return NextResponse.json({ error: 'Server error' }, { status: 500 })
   }
@@ -1,6 +1,8 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { prisma } from '@/lib/prisma'
 
+class SettlementError extends Error {}
+
 export async function POST(
   request: NextRequest,
   { params }: { params: Promise<{ id: string }> }
@@ -21,30 +23,43 @@ export async function POST(
       return NextResponse.json({ error: 'Withdrawal already processed' }, { status: 400 })
     }
 
-    await prisma.$transaction([
-      prisma.withdrawal.update({
-        where: { id },
-        data: { 
+    const settled = await prisma.$transaction(async (tx) => {
+      // Claim the withdrawal first so a concurrent approve or reject cannot settle it twice
+      const claimed = await tx.withdrawal.updateMany({
+        where: { id, status: 'PENDING' },
+        data: {
           status: 'CANCELLED',
           adminNote: reason,
         },
-      }),
-      prisma.balance.update({
-        where: { userId: withdrawal.userId },
-        data: { amount: { increment: withdrawal.amount } },
-      }),
-      prisma.transaction.updateMany({
-        where: { 
-          userId: withdrawal.userId,
-          type: 'WITHDRAW',
-          status: 'PENDING',
-        },
+      })
+      if (claimed.count === 0) {
+        return false
+      }
+
+      const released = await tx.balance.updateMany({
+        where: { userId: withdrawal.userId, held: { gte: withdrawal.amount } },
+        data: { held: { decrement: withdrawal.amount } },
+      })
+      if (released.count === 0) {
+        throw new SettlementError('Held balance does not cover withdrawal')
+      }
+
+      await tx.transaction.updateMany({
+        where: { withdrawalId: id, status: 'PENDING' },
         data: { status: 'CANCELLED' },
-      }),
-    ])
+      })
+      return true
+    })
+
+    if (!settled) {
+      return NextResponse.json({ error: 'Withdrawal already processed' }, { status: 400 })
+    }
 
     return NextResponse.json({ success: true })
   } catch (error) {
+    if (error instanceof SettlementError) {
+      return NextResponse.json({ error: error.message }, { status: 409 })
+    }
     console.error('Reject withdrawal error:', error)
     return NextResponse.json({ error: 'Server error' }, { status: 500 })
   }
@@ -1,5 +1,6 @@
 import os
 from dataclasses import dataclass
+from decimal import Decimal
 from typing import Optional
 
 
@@ -7,6 +8,7 @@ from typing import Optional
 class BotConfig:
     token: str
     admin_ids: list[int]
+    user_state_capacity: int = 10000
 
 
 @dataclass
@@ -27,6 +29,38 @@ class OxaPayConfig:
 class CryptoBotConfig:
     api_token: str
     margin: float = 0.05
+    rate_refresh_interval: int = 60
+    rate_max_age: int = 300
+
+
+@dataclass
+class PricingConfig:
+    usd_to_idr: Decimal
+    default_margin: Decimal = Decimal("2")
+    settings_refresh_interval: int = 60
+    quote_ttl: int = 60
+    quote_tolerance: Decimal = Decimal("0.5")
+
+
+@dataclass
+class WorkerConfig:
+    payout_concurrency: int = 3
+    payout_lease_seconds: int = 120
+    reconcile_interval: int = 60
+    reconcile_batch_size: int = 200
+    reconcile_concurrency: int = 5
+    deposit_poll_interval: int = 60
+    activity_flush_interval: int = 5
+    inactivity_sweep_interval: int = 3600
+    inactive_days: int = 180
+
+
+@dataclass
+class ThrottleConfig:
+    rate: float = 3.0
+    burst: float = 10.0
+    notice_interval: float = 3.0
+    redis_url: str = ""
 
 
 @dataclass
@@ -35,6 +69,9 @@ class AppConfig:
     database: DatabaseConfig
     oxapay: OxaPayConfig
     cryptobot: CryptoBotConfig
+    pricing: PricingConfig
+    workers: WorkerConfig
+    throttle: ThrottleConfig
     webhook_host: str
     debug: bool = False
 
@@ -50,6 +87,7 @@ def load_config() -> AppConfig:
         bot=BotConfig(
             token=os.getenv("TELEGRAM_BOT_TOKEN", ""),
             admin_ids=admin_ids,
+            user_state_capacity=int(os.getenv("USER_STATE_CAPACITY", "10000")),
         ),
         database=DatabaseConfig(
             url=os.getenv("BOT_DATABASE", ""),
@@ -63,6 +101,32 @@ def load_config() -> AppConfig:
         cryptobot=CryptoBotConfig(
             api_token=os.getenv("CRYPTOBOT_API_TOKEN", ""),
             margin=float(os.getenv("CRYPTOBOT_MARGIN", "0.05")),
+            rate_refresh_interval=int(os.getenv("CRYPTOBOT_RATE_REFRESH_INTERVAL", "60")),
+            rate_max_age=int(os.getenv("CRYPTOBOT_RATE_MAX_AGE", "300")),
+        ),
+        pricing=PricingConfig(
+            usd_to_idr=Decimal(os.getenv("USD_TO_IDR", "16000")),
+            default_margin=Decimal(os.getenv("DEFAULT_MARGIN", "2")),
+            settings_refresh_interval=int(os.getenv("COIN_SETTINGS_REFRESH_INTERVAL", "60")),
+            quote_ttl=int(os.getenv("QUOTE_TTL", "60")),
+            quote_tolerance=Decimal(os.getenv("QUOTE_TOLERANCE", "0.5")),
+        ),
+        workers=WorkerConfig(
+            payout_concurrency=int(os.getenv("PAYOUT_CONCURRENCY", "3")),
+            payout_lease_seconds=int(os.getenv("PAYOUT_LEASE_SECONDS", "120")),
+            reconcile_interval=int(os.getenv("RECONCILE_INTERVAL", "60")),
+            reconcile_batch_size=int(os.getenv("RECONCILE_BATCH_SIZE", "200")),
+            reconcile_concurrency=int(os.getenv("RECONCILE_CONCURRENCY", "5")),
+            deposit_poll_interval=int(os.getenv("DEPOSIT_POLL_INTERVAL", "60")),
+            activity_flush_interval=int(os.getenv("ACTIVITY_FLUSH_INTERVAL", "5")),
+            inactivity_sweep_interval=int(os.getenv("INACTIVITY_SWEEP_INTERVAL", "3600")),
+            inactive_days=int(os.getenv("INACTIVE_DAYS", "180")),
+        ),
+        throttle=ThrottleConfig(
+            rate=float(os.getenv("THROTTLE_RATE", "3")),
+            burst=float(os.getenv("THROTTLE_BURST", "10")),
+            notice_interval=float(os.getenv("THROTTLE_NOTICE_INTERVAL", "3")),
+            redis_url=os.getenv("REDIS_URL", ""),
         ),
         webhook_host=webhook_host,
         debug=os.getenv("DEBUG", "false").lower() == "true",
@@ -0,0 +1,190 @@
+"""Print EXPLAIN ANALYZE plans for the SQL behind bot/db/queries.py.
+
+Run with `python -m bot.db.explain` against a database with realistic data.
+Write statements are analyzed inside a transaction that is always rolled back.
+Raw statements are imported from queries.py; Prisma model calls are listed as
+the SQL they compile to.
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from prisma import Prisma
+
+from bot.db.queries import (
+    HOLD_BALANCE_SQL,
+    CAPTURE_HOLD_SQL,
+    RELEASE_HOLD_SQL,
+    MARK_INACTIVE_USERS_SQL,
+    CLAIM_PAYOUT_JOB_SQL,
+    MARK_STALLED_PAYOUT_JOBS_SQL,
+    transition_orders_sql,
+)
+
+
+SAMPLE_SQL = """
+SELECT
+    (SELECT id FROM users ORDER BY created_at DESC LIMIT 1) AS user_id,
+    (SELECT telegram_id FROM users ORDER BY created_at DESC LIMIT 1) AS telegram_id,
+    (SELECT COALESCE(email, '') FROM users WHERE email IS NOT NULL LIMIT 1) AS email,
+    (SELECT COALESCE(whatsapp, '') FROM users WHERE whatsapp IS NOT NULL LIMIT 1) AS whatsapp,
+    (SELECT id FROM deposits ORDER BY created_at DESC LIMIT 1) AS deposit_id,
+    (SELECT id FROM withdrawals ORDER BY created_at DESC LIMIT 1) AS withdrawal_id,
+    (SELECT COALESCE(oxapay_payment_id, '') FROM crypto_orders WHERE oxapay_payment_id IS NOT NULL LIMIT 1) AS payment_id,
+    (SELECT id FROM crypto_orders ORDER BY created_at DESC LIMIT 1) AS order_id
+"""
+
+
+def _keys(*keys):
+    return lambda samples: [str(samples[key] or "") for key in keys]
+
+
+# (name in queries.py, SQL it runs, params for $1..$n from the samples, writes)
+QUERIES = [
+    ("get_user_by_telegram_id", "SELECT * FROM users WHERE telegram_id = $1::bigint", _keys("telegram_id"), False),
+    ("get_user_by_email", "SELECT * FROM users WHERE email = $1 LIMIT 1", _keys("email"), False),
+    ("get_user_by_whatsapp", "SELECT * FROM users WHERE whatsapp = $1 LIMIT 1", _keys("whatsapp"), False),
+    ("get_referral_count", "SELECT COUNT(*) FROM users WHERE referred_by_id = $1", _keys("user_id"), False),
+    (
+        "get_user_transactions",
+        "SELECT * FROM transactions WHERE user_id = $1 ORDER BY created_at DESC LIMIT 10 OFFSET 0",
+        _keys("user_id"),
+        False,
+    ),
+    (
+        "get_user_transactions(type)",
+        "SELECT * FROM transactions WHERE user_id = $1 AND type = 'BUY' ORDER BY created_at DESC LIMIT 10",
+        _keys("user_id"),
+        False,
+    ),
+    ("count_user_transactions", "SELECT COUNT(*) FROM transactions WHERE user_id = $1", _keys("user_id"), False),
+    (
+        "get_referral_bonus_earned",
+        "SELECT * FROM transactions WHERE user_id = $1 AND type = 'REFERRAL_BONUS' AND status = 'COMPLETED'",
+        _keys("user_id"),
+        False,
+    ),
+    (
+        "get_pending_cryptobot_deposits",
+        "SELECT * FROM deposits WHERE status = 'PENDING' AND cryptobot_invoice_id IS NOT NULL ORDER BY id LIMIT 100",
+        _keys(),
+        False,
+    ),
+    (
+        "pending_topup (admin)",
+        "SELECT * FROM deposits WHERE status = 'PENDING' ORDER BY created_at LIMIT 20",
+        _keys(),
+        False,
+    ),
+    (
+        "pending_withdraw (admin)",
+        "SELECT * FROM withdrawals WHERE status = 'PENDING' ORDER BY created_at LIMIT 20",
+        _keys(),
+        False,
+    ),
+    (
+        "get_open_orders_page",
+        "SELECT * FROM crypto_orders "
+        "WHERE status IN ('PROCESSING', 'AWAITING_PAYMENT', 'AWAITING_CRYPTO') ORDER BY id LIMIT 200",
+        _keys(),
+        False,
+    ),
+    (
+        "sell webhook order lookup",
+        "SELECT * FROM crypto_orders WHERE oxapay_payment_id = $1 LIMIT 1",
+        _keys("payment_id"),
+        False,
+    ),
+    ("get_active_coin_settings", "SELECT * FROM coin_settings WHERE is_active", _keys(), False),
+    ("get_payment_methods", "SELECT * FROM payment_methods WHERE is_active", _keys(), False),
+    (
+        "get_pending_webhook_events",
+        "SELECT * FROM webhook_events WHERE status = 'PENDING' AND next_attempt_at <= NOW() "
+        "ORDER BY next_attempt_at LIMIT 500",
+        _keys(),
+        False,
+    ),
+    (
+        "complete_deposit (transactions)",
+        "UPDATE transactions SET status = 'COMPLETED' WHERE deposit_id = $1",
+        _keys("deposit_id"),
+        True,
+    ),
+    (
+        "complete_withdrawal (transactions)",
+        "UPDATE transactions SET status = 'COMPLETED' WHERE withdrawal_id = $1",
+        _keys("withdrawal_id"),
+        True,
+    ),
+    ("hold_balance", HOLD_BALANCE_SQL, lambda samples: ["1", str(samples["user_id"] or "")], True),
+    ("capture_hold", CAPTURE_HOLD_SQL, lambda samples: ["1", str(samples["user_id"] or "")], True),
+    ("release_hold", RELEASE_HOLD_SQL, lambda samples: ["1", str(samples["user_id"] or "")], True),
+    (
+        "mark_inactive_users",
+        MARK_INACTIVE_USERS_SQL,
+        lambda samples: [(datetime.utcnow() - timedelta(days=180)).isoformat(), "", 1000],
+        True,
+    ),
+    ("claim_payout_job", CLAIM_PAYOUT_JOB_SQL, lambda samples: [60], True),
+    ("mark_stalled_payout_jobs", MARK_STALLED_PAYOUT_JOBS_SQL, lambda samples: [], True),
+    (
+        "transition_orders",
+        transition_orders_sql(1),
+        lambda samples: [str(samples["order_id"] or ""), "PROCESSING", "COMPLETED"],
+        True,
+    ),
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+async def explain(db: Prisma, sql: str, params: list, writes: bool) -> list[str]:
+    statement = f"EXPLAIN (ANALYZE, BUFFERS) {sql}"
+
+    if not writes:
+        rows = await db.query_raw(statement, *params)
+        return [row["QUERY PLAN"] for row in rows]
+
+    plan: list[str] = []
+    try:
+        async with db.tx() as tx:
+            rows = await tx.query_raw(statement, *params)
+            plan = [row["QUERY PLAN"] for row in rows]
+            raise _Rollback()
+    except _Rollback:
+        pass
+    return plan
+
+
+async def main(only: list[str]):
+    db = Prisma()
+    await db.connect()
+
+    try:
+        samples = (await db.query_raw(SAMPLE_SQL))[0]
+
+        for name, sql, build_params, writes in QUERIES:
+            if only and not any(term in name for term in only):
+                continue
+
+            params = build_params(samples)
+            print(f"=== {name}")
+
+            try:
+                for line in await explain(db, sql, params, writes):
+                    print(f"    {line}")
+            except Exception as e:
+                print(f"    failed: {e}")
+            print()
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
@@ -1,15 +1,91 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from decimal import Decimal
-from typing import Optional
-from datetime import datetime
+from typing import AsyncIterator, Optional, Union
+from datetime import datetime, timezone
 from prisma import Prisma, Json
-from prisma.models import User, Balance, Transaction, Deposit, Withdrawal, CryptoOrder, CoinSetting, PaymentMethod, ReferralSetting
+from prisma.errors import UniqueViolationError
+from prisma.models import User, Balance, Transaction, Deposit, Withdrawal, CryptoOrder, CoinSetting, PaymentMethod, ReferralSetting, PayoutJob, WebhookEvent
+
+from bot.utils.cache import user_cache
+
+
+_active_tx: ContextVar[Optional[Prisma]] = ContextVar("active_transaction", default=None)
+
+
+class InsufficientBalanceError(Exception):
+    pass
+
+
+@asynccontextmanager
+async def unit_of_work(db: Prisma) -> AsyncIterator[Prisma]:
+    # Prisma has no nested transactions; reuse the caller's when db is the one opened here
+    if db is _active_tx.get():
+        yield db
+        return
+    
+    with user_cache.deferred():
+        async with db.tx() as tx:
+            token = _active_tx.set(tx)
+            try:
+                yield tx
+            finally:
+                _active_tx.reset(token)
+
+
+async def transition_status(
+    db: Prisma,
+    model: str,
+    record_id: str,
+    from_status: Union[str, list[str]],
+    to_status: str,
+    data: Optional[dict] = None,
+) -> bool:
+    # Compare-and-set: only the caller whose update moved the row may apply side effects
+    expected = {"in": from_status} if isinstance(from_status, list) else from_status
+    moved = await getattr(db, model).update_many(
+        where={"id": record_id, "status": expected},
+        data={**(data or {}), "status": to_status}
+    )
+    return moved == 1
 
 
 async def get_user_by_telegram_id(db: Prisma, telegram_id: int) -> Optional[User]:
-    return await db.user.find_unique(
+    user = user_cache.get_user(telegram_id)
+    if user:
+        if not user_cache.balance_fresh(telegram_id):
+            await refresh_balance(db, user)
+        return user
+    
+    user = await db.user.find_unique(
         where={"telegramId": telegram_id},
         include={"balance": True}
     )
+    if user:
+        user_cache.set_user(user)
+    return user
+
+
+async def refresh_balance(db: Prisma, user: User) -> User:
+    """Re-read the balance of a possibly cached user; money screens call this before showing or checking funds"""
+    user.balance = await db.balance.find_unique(where={"userId": user.id})
+    user_cache.mark_balance_fresh(user.telegramId)
+    return user
+
+
+async def update_user(db: Prisma, user_id: str, data: dict) -> User:
+    user = await db.user.update(
+        where={"id": user_id},
+        data=data,
+        include={"balance": True}
+    )
+    user_cache.set_user(user)
+    return user
+
+
+async def delete_user(db: Prisma, user: User):
+    await db.user.delete(where={"id": user.id})
+    user_cache.invalidate_user(user.telegramId)
 
 
 async def create_user(
@@ -38,32 +114,106 @@ async def create_user(
             "referralCode": referral_code,
             "referredById": referred_by_id,
             "status": "ACTIVE",
-        }
-    )
-    
-    await db.balance.create(
-        data={
-            "userId": user.id,
-            "amount": Decimal("0"),
-        }
-    )
-    
-    return await db.user.find_unique(
-        where={"id": user.id},
+            "balance": {"create": {"amount": Decimal("0")}},
+        },
         include={"balance": True}
     )
+    user_cache.set_user(user)
+    return user
 
 
 async def get_user_balance(db: Prisma, user_id: str) -> Decimal:
     balance = await db.balance.find_unique(where={"userId": user_id})
-    return balance.amount if balance else Decimal("0")
+    return balance.amount - balance.held if balance else Decimal("0")
 
 
 async def update_balance(db: Prisma, user_id: str, amount: Decimal) -> Balance:
-    return await db.balance.update(
+    balance = await db.balance.update(
         where={"userId": user_id},
         data={"amount": {"increment": amount}}
     )
+    user_cache.invalidate_user_id(user_id)
+    return balance
+
+
+HOLD_BALANCE_SQL = """
+    UPDATE balances
+    SET held = held + $1::numeric, updated_at = NOW()
+    WHERE user_id = $2 AND amount - held >= $1::numeric
+"""
+
+
+async def hold_balance(db: Prisma, user_id: str, amount: Decimal) -> bool:
+    # Single conditional UPDATE so concurrent holds can never overdraw
+    held = await db.execute_raw(
+        HOLD_BALANCE_SQL,
+        str(amount),
+        user_id,
+    )
+    user_cache.invalidate_user_id(user_id)
+    return held > 0
+
+
+CAPTURE_HOLD_SQL = """
+    UPDATE balances
+    SET amount = amount - $1::numeric, held = held - $1::numeric, updated_at = NOW()
+    WHERE user_id = $2 AND held >= $1::numeric AND amount >= $1::numeric
+"""
+
+
+async def capture_hold(db: Prisma, user_id: str, amount: Decimal) -> bool:
+    captured = await db.execute_raw(
+        CAPTURE_HOLD_SQL,
+        str(amount),
+        user_id,
+    )
+    user_cache.invalidate_user_id(user_id)
+    return captured > 0
+
+
+RELEASE_HOLD_SQL = """
+    UPDATE balances
+    SET held = held - $1::numeric, updated_at = NOW()
+    WHERE user_id = $2 AND held >= $1::numeric
+"""
+
+
+async def release_hold(db: Prisma, user_id: str, amount: Decimal) -> bool:
+    released = await db.execute_raw(
+        RELEASE_HOLD_SQL,
+        str(amount),
+        user_id,
+    )
+    user_cache.invalidate_user_id(user_id)
+    return released > 0
+
+
+MARK_INACTIVE_USERS_SQL = """
+    WITH batch AS (
+        SELECT id FROM users
+        WHERE status = 'ACTIVE' AND last_active_at < $1::timestamp AND id > $2
+        ORDER BY id
+        LIMIT $3
+    )
+    UPDATE users AS u
+    SET status = 'INACTIVE', updated_at = NOW()
+    FROM batch
+    WHERE u.id = batch.id AND u.status = 'ACTIVE'
+    RETURNING u.id, u.telegram_id
+"""
+
+
+async def mark_inactive_users(db: Prisma, cutoff: datetime, after_id: str, limit: int) -> list[dict]:
+    # One keyset batch of stale ACTIVE users, flipped in a single set-based UPDATE
+    rows = await db.query_raw(
+        MARK_INACTIVE_USERS_SQL,
+        cutoff.isoformat(),
+        after_id,
+        limit,
+    )
+    for row in rows:
+        user_cache.invalidate_user(int(row["telegram_id"]))
+    return rows
 
 
 async def get_user_by_referral_code(db: Prisma, code: str) -> Optional[User]:
@@ -83,28 +233,94 @@ async def create_deposit(
     user_id: str,
     amount: Decimal,
     payment_method: str,
+    cryptobot_invoice_id: Optional[str] = None,
 ) -> Deposit:
-    deposit = await db.deposit.create(
-        data={
-            "userId": user_id,
-            "amount": amount,
-            "paymentMethod": payment_method,
-            "status": "PENDING",
-        }
-    )
+    async with unit_of_work(db) as tx:
+        deposit = await tx.deposit.create(
+            data={
+                "userId": user_id,
+                "amount": amount,
+                "paymentMethod": payment_method,
+                "status": "PENDING",
+                "cryptobotInvoiceId": cryptobot_invoice_id,
+            }
+        )
+        
+        await tx.transaction.create(
+            data={
+                "user": {"connect": {"id": user_id}},
+                "type": "TOPUP",
+                "amount": amount,
+                "status": "PENDING",
+                "description": f"Deposit via {payment_method}",
+                "deposit": {"connect": {"id": deposit.id}},
+            }
+        )
     
-    await db.transaction.create(
-        data={
-            "user": {"connect": {"id": user_id}},
-            "type": "TOPUP",
-            "amount": amount,
-            "status": "PENDING",
-            "description": f"Deposit via {payment_method}",
-            "metadata": Json({"depositId": deposit.id}),
-        }
+    return deposit
+
+
+async def complete_deposit(db: Prisma, deposit: Deposit, from_status: Union[str, list[str]] = "PENDING") -> bool:
+    async with unit_of_work(db) as tx:
+        if not await transition_status(tx, "deposit", deposit.id, from_status, "COMPLETED"):
+            return False
+        
+        await update_balance(tx, deposit.userId, deposit.amount)
+        
+        await tx.transaction.update_many(
+            where={"depositId": deposit.id},
+            data={"status": "COMPLETED"}
+        )
+    
+    return True
+
+
+async def cancel_deposit(db: Prisma, deposit_id: str) -> bool:
+    async with unit_of_work(db) as tx:
+        if not await transition_status(tx, "deposit", deposit_id, "PENDING", "CANCELLED"):
+            return False
+        
+        await tx.transaction.update_many(
+            where={"depositId": deposit_id},
+            data={"status": "CANCELLED"}
+        )
+    
+    return True
+
+
+async def get_pending_cryptobot_deposits(
+    db: Prisma,
+    after_id: Optional[str] = None,
+    limit: int = 100,
+) -> list[Deposit]:
+    where = {"status": "PENDING", "cryptobotInvoiceId": {"not": None}}
+    if after_id:
+        where["id"] = {"gt": after_id}
+    
+    return await db.deposit.find_many(
+        where=where,
+        include={"user": True},
+        order={"id": "asc"},
+        take=limit,
     )
+
+
+async def fail_deposits(db: Prisma, deposit_ids: list[str]) -> int:
+    if not deposit_ids:
+        return 0
     
-    return deposit
+    async with unit_of_work(db) as tx:
+        moved = await tx.deposit.update_many(
+            where={"id": {"in": deposit_ids}, "status": "PENDING"},
+            data={"status": "FAILED"}
+        )
+        
+        await tx.transaction.update_many(
+            where={"depositId": {"in": deposit_ids}, "status": "PENDING"},
+            data={"status": "FAILED"}
+        )
+    
+    return moved
 
 
 async def create_withdrawal(
@@ -117,33 +333,68 @@ async def create_withdrawal(
     ewallet_type: Optional[str] = None,
     ewallet_number: Optional[str] = None,
 ) -> Withdrawal:
-    withdrawal = await db.withdrawal.create(
-        data={
-            "userId": user_id,
-            "amount": amount,
-            "bankName": bank_name,
-            "accountNumber": account_number,
-            "accountName": account_name,
-            "ewalletType": ewallet_type,
-            "ewalletNumber": ewallet_number,
-            "status": "PENDING",
-        }
-    )
-    
-    await db.transaction.create(
-        data={
-            "user": {"connect": {"id": user_id}},
-            "type": "WITHDRAW",
-            "amount": amount,
-            "status": "PENDING",
-            "description": f"Withdraw to {bank_name or ewallet_type}",
-            "metadata": Json({"withdrawalId": withdrawal.id}),
-        }
-    )
+    async with unit_of_work(db) as tx:
+        if not await hold_balance(tx, user_id, amount):
+            raise InsufficientBalanceError(user_id)
+        
+        withdrawal = await tx.withdrawal.create(
+            data={
+                "userId": user_id,
+                "amount": amount,
+                "bankName": bank_name,
+                "accountNumber": account_number,
+                "accountName": account_name,
+                "ewalletType": ewallet_type,
+                "ewalletNumber": ewallet_number,
+                "status": "PENDING",
+            }
+        )
+        
+        await tx.transaction.create(
+            data={
+                "user": {"connect": {"id": user_id}},
+                "type": "WITHDRAW",
+                "amount": amount,
+                "status": "PENDING",
+                "description": f"Withdraw to {bank_name or ewallet_type}",
+                "withdrawal": {"connect": {"id": withdrawal.id}},
+            }
+        )
     
     return withdrawal
 
 
+async def complete_withdrawal(db: Prisma, withdrawal: Withdrawal) -> bool:
+    async with unit_of_work(db) as tx:
+        if not await transition_status(tx, "withdrawal", withdrawal.id, "PENDING", "COMPLETED"):
+            return False
+        
+        if not await capture_hold(tx, withdrawal.userId, withdrawal.amount):
+            raise InsufficientBalanceError(withdrawal.userId)
+        
+        await tx.transaction.update_many(
+            where={"withdrawalId": withdrawal.id},
+            data={"status": "COMPLETED"}
+        )
+    
+    return True
+
+
+async def fail_withdrawal(db: Prisma, withdrawal: Withdrawal) -> bool:
+    async with unit_of_work(db) as tx:
+        if not await transition_status(tx, "withdrawal", withdrawal.id, "PENDING", "FAILED"):
+            return False
+        
+        await release_hold(tx, withdrawal.userId, withdrawal.amount)
+        
+        await tx.transaction.update_many(
+            where={"withdrawalId": withdrawal.id},
+            data={"status": "FAILED"}
+        )
+    
+    return True
+
+
 async def create_crypto_order(
     db: Prisma,
     user_id: str,
@@ -160,6 +411,7 @@ async def create_crypto_order(
     expires_at: Optional[datetime] = None,
     oxapay_payment_id: Optional[str] = None,
     oxapay_payout_id: Optional[str] = None,
+    status: str = "PENDING",
 ) -> CryptoOrder:
     return await db.cryptoorder.create(
         data={
@@ -174,7 +426,7 @@ async def create_crypto_order(
             "networkFee": network_fee,
             "walletAddress": wallet_address,
             "depositAddress": deposit_address,
-            "status": "PENDING",
+            "status": status,
             "expiresAt": expires_at,
             "oxapayPaymentId": oxapay_payment_id,
             "oxapayPayoutId": oxapay_payout_id,
@@ -182,6 +434,204 @@ async def create_crypto_order(
     )
 
 
+async def enqueue_payout_job(
+    db: Prisma,
+    order_id: str,
+    chat_id: Optional[int] = None,
+    message_id: Optional[int] = None,
+) -> PayoutJob:
+    return await db.payoutjob.create(
+        data={
+            "orderId": order_id,
+            "chatId": chat_id,
+            "messageId": message_id,
+        }
+    )
+
+
+CLAIM_PAYOUT_JOB_SQL = """
+    UPDATE payout_jobs
+    SET status = 'RUNNING',
+        attempts = attempts + 1,
+        lease_until = NOW() + make_interval(secs => $1),
+        updated_at = NOW()
+    WHERE id = (
+        SELECT id FROM payout_jobs
+        WHERE status = 'QUEUED'
+        ORDER BY created_at
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, order_id, chat_id, message_id, attempts
+"""
+
+
+async def claim_payout_job(db: Prisma, lease_seconds: int) -> Optional[dict]:
+    rows = await db.query_raw(
+        CLAIM_PAYOUT_JOB_SQL,
+        lease_seconds,
+    )
+    return rows[0] if rows else None
+
+
+MARK_STALLED_PAYOUT_JOBS_SQL = """
+    UPDATE payout_jobs
+    SET status = 'STALLED', updated_at = NOW()
+    WHERE status = 'RUNNING' AND lease_until < NOW()
+    RETURNING id, order_id
+"""
+
+
+async def mark_stalled_payout_jobs(db: Prisma) -> list[dict]:
+    return await db.query_raw(
+        MARK_STALLED_PAYOUT_JOBS_SQL
+    )
+
+
+async def finish_payout_job(db: Prisma, job_id: str, status: str, error: Optional[str] = None) -> PayoutJob:
+    return await db.payoutjob.update(
+        where={"id": job_id},
+        data={"status": status, "lastError": error, "leaseUntil": None}
+    )
+
+
+async def record_payout_reference(db: Prisma, order_id: str, payout_id: str) -> bool:
+    # Saved as soon as the provider answers, so a crash before settling still leaves a trackId to reconcile
+    moved = await db.cryptoorder.update_many(
+        where={"id": order_id, "status": "PROCESSING"},
+        data={"oxapayPayoutId": payout_id}
+    )
+    return moved == 1
+
+
+async def complete_buy_order(db: Prisma, order: CryptoOrder, data: Optional[dict] = None) -> tuple[bool, bool]:
+    """Settle a sent buy payout; returns (moved, captured) where captured is False if the hold was missing"""
+    async with unit_of_work(db) as tx:
+        if not await transition_status(tx, "cryptoorder", order.id, "PROCESSING", "COMPLETED", data):
+            return False, False
+        
+        captured = await capture_hold(tx, order.userId, order.fiatAmount)
+        if captured:
+            await tx.transaction.create(
+                data={
+                    "userId": order.userId,
+                    "type": "BUY",
+                    "amount": order.fiatAmount,
+                    "status": "COMPLETED",
+                    "description": f"Beli {order.cryptoAmount:.8f} {order.coinSymbol}",
+                    "orderId": order.id,
+                }
+            )
+        
+        await tx.payoutjob.update_many(
+            where={"orderId": order.id},
+            data={"status": "SUCCEEDED", "leaseUntil": None}
+        )
+    
+    return True, captured
+
+
+async def fail_buy_order(db: Prisma, order: CryptoOrder, error: Optional[str] = None) -> bool:
+    async with unit_of_work(db) as tx:
+        if not await transition_status(tx, "cryptoorder", order.id, "PROCESSING", "FAILED"):
+            return False
+        
+        await release_hold(tx, order.userId, order.fiatAmount)
+        
+        await tx.payoutjob.update_many(
+            where={"orderId": order.id},
+            data={"status": "FAILED", "lastError": error, "leaseUntil": None}
+        )
+    
+    return True
+
+
+async def record_webhook_event(
+    db: Prisma,
+    provider: str,
+    idempotency_key: str,
+    payload: dict,
+) -> Optional[WebhookEvent]:
+    try:
+        return await db.webhookevent.create(
+            data={
+                "provider": provider,
+                "idempotencyKey": idempotency_key,
+                "payload": Json(payload),
+            }
+        )
+    except UniqueViolationError:
+        return None
+
+
+async def get_pending_webhook_events(db: Prisma, limit: int = 500) -> list[WebhookEvent]:
+    return await db.webhookevent.find_many(
+        where={"status": "PENDING", "nextAttemptAt": {"lte": datetime.now(timezone.utc)}},
+        order={"nextAttemptAt": "asc"},
+        take=limit,
+    )
+
+
+async def retry_webhook_event(
+    db: Prisma,
+    event_id: str,
+    error: str,
+    retry_at: Optional[datetime],
+) -> bool:
+    # Stays PENDING until retry_at; without one the event is parked as FAILED for an admin
+    data = {"attempts": {"increment": 1}, "lastError": error[:500]}
+    if retry_at:
+        data["nextAttemptAt"] = retry_at
+    else:
+        data["status"] = "FAILED"
+    
+    moved = await db.webhookevent.update_many(
+        where={"id": event_id, "status": "PENDING"},
+        data=data
+    )
+    return moved == 1
+
+
+async def get_open_orders_page(
+    db: Prisma,
+    statuses: list[str],
+    after_id: Optional[str] = None,
+    limit: int = 200,
+) -> list[CryptoOrder]:
+    where = {"status": {"in": statuses}}
+    if after_id:
+        where["id"] = {"gt": after_id}
+    
+    return await db.cryptoorder.find_many(
+        where=where,
+        include={"payoutJob": True},
+        order={"id": "asc"},
+        take=limit,
+    )
+
+
+def transition_orders_sql(count: int) -> str:
+    values = ", ".join(
+        f"(${i * 3 + 1}::text, ${i * 3 + 2}::text, ${i * 3 + 3}::text)" for i in range(count)
+    )
+    return f"""
+    UPDATE crypto_orders AS o
+    SET status = v.to_status::"OrderStatus", updated_at = NOW()
+    FROM (VALUES {values}) AS v(id, from_status, to_status)
+    WHERE o.id = v.id AND o.status = v.from_status::"OrderStatus"
+    RETURNING o.id
+"""
+
+
+async def transition_orders(db: Prisma, transitions: list[tuple[str, str, str]]) -> list[str]:
+    if not transitions:
+        return []
+    
+    params = [value for transition in transitions for value in transition]
+    rows = await db.query_raw(transition_orders_sql(len(transitions)), *params)
+    return [row["id"] for row in rows]
+
+
 async def get_coin_settings(db: Prisma, coin_symbol: str, network: str) -> Optional[CoinSetting]:
     return await db.coinsetting.find_unique(
         where={"coinSymbol_network": {"coinSymbol": coin_symbol, "network": network}}
@@ -192,6 +642,10 @@ async def get_active_coin_settings(db: Prisma) -> list[CoinSetting]:
     return await db.coinsetting.find_many(where={"isActive": True})
 
 
+async def get_all_coin_settings(db: Prisma) -> list[CoinSetting]:
+    return await db.coinsetting.find_many()
+
+
 async def get_payment_methods(db: Prisma, is_active: bool = True) -> list[PaymentMethod]:
     return await db.paymentmethod.find_many(where={"isActive": is_active})
 
@@ -254,26 +708,32 @@ async def process_referral_bonus(
     referrer_bonus: Decimal,
     referee_bonus: Decimal,
 ):
-    if referrer_bonus > 0:
-        await update_balance(db, referrer_id, referrer_bonus)
-        await db.transaction.create(
-            data={
-                "userId": referrer_id,
-                "type": "REFERRAL_BONUS",
-                "amount": referrer_bonus,
-                "status": "COMPLETED",
-                "description": "Bonus referral",
-            }
+    bonuses = [
+        (user_id, bonus, description)
+        for user_id, bonus, description in (
+            (referrer_id, referrer_bonus, "Bonus referral"),
+            (referee_id, referee_bonus, "Bonus pendaftaran"),
         )
+        if bonus > 0
+    ]
+    if not bonuses:
+        return
     
-    if referee_bonus > 0:
-        await update_balance(db, referee_id, referee_bonus)
-        await db.transaction.create(
-            data={
-                "userId": referee_id,
-                "type": "REFERRAL_BONUS",
-                "amount": referee_bonus,
-                "status": "COMPLETED",
-                "description": "Bonus pendaftaran",
-            }
-        )
+    async with db.batch_() as batcher:
+        for user_id, bonus, description in bonuses:
+            batcher.balance.update(
+                where={"userId": user_id},
+                data={"amount": {"increment": bonus}}
+            )
+            batcher.transaction.create(
+                data={
+                    "userId": user_id,
+                    "type": "REFERRAL_BONUS",
+                    "amount": bonus,
+                    "status": "COMPLETED",
+                    "description": description,
+                }
+            )
+    
+    for user_id, _, _ in bonuses:
+        user_cache.invalidate_user_id(user_id)
\ No newline at end of file
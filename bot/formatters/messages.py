@@ -1,6 +1,6 @@
 from decimal import Decimal
 from datetime import datetime, timezone, timedelta
-from typing import Optional
+from typing import Mapping, Optional
 import random
 
 WIB = timezone(timedelta(hours=7))
@@ -67,6 +67,12 @@ def format_currency(amount: Decimal, symbol: str = "IDR") -> str:
     return f"{amount:,.8f}".rstrip('0').rstrip('.') + f" {symbol}"
 
 
+def format_held(held: Optional[Decimal]) -> str:
+    if not held:
+        return ""
+    return f"\n{Emoji.CLOCK} Ditahan: <b>{format_currency(held)}</b>"
+
+
 def format_welcome() -> str:
     return """<b>Selamat Datang di KriptoEcer</b> {coin}
 
@@ -92,14 +98,14 @@ Dengan menggunakan layanan ini, Anda menyetujui:
 {warning} Pastikan Anda memahami risiko trading crypto.""".format(warning=Emoji.WARNING)
 
 
-def format_main_menu(balance: Decimal, name: str, telegram_id: int) -> str:
+def format_main_menu(balance: Decimal, name: str, telegram_id: int, held: Optional[Decimal] = None) -> str:
     greeting = get_wib_greeting()
     quote = get_quote()
     
     return """{greeting}, <b>{name}</b>!
 <code>ID: {telegram_id}</code>
 
-💰 Saldo: <b>{balance}</b>
+💰 Saldo: <b>{balance}</b>{held}
 
 <i>{quote}</i>
 
@@ -108,19 +114,19 @@ def format_main_menu(balance: Decimal, name: str, telegram_id: int) -> str:
         name=name,
         telegram_id=telegram_id,
         balance=format_currency(balance),
+        held=format_held(held),
         quote=quote
     )
 
 
-def format_rates(rates: dict, usd_to_idr: Decimal) -> str:
+def format_rates(rates_idr: Mapping[str, Decimal], usd_to_idr: Decimal) -> str:
     supported = ["BTC", "ETH", "BNB", "SOL", "USDT", "USDC"]
     
     lines = [f"{Emoji.CHART} <b>Harga Crypto Saat Ini</b>\n"]
     
     for symbol in supported:
-        if symbol in rates:
-            price_usd = Decimal(str(rates[symbol]))
-            price_idr = price_usd * usd_to_idr
+        if symbol in rates_idr:
+            price_idr = rates_idr[symbol]
             lines.append(f"{Emoji.DOT} <b>{symbol}</b>: {format_currency(price_idr)}")
     
     lines.append(f"\n<i>Kurs saat ini: $1 = Rp {usd_to_idr:,.0f}</i>")
@@ -129,16 +135,17 @@ def format_rates(rates: dict, usd_to_idr: Decimal) -> str:
     return "\n".join(lines)
 
 
-def format_balance(balance: Decimal) -> str:
+def format_balance(balance: Decimal, held: Optional[Decimal] = None) -> str:
     return """{money} <b>Saldo Anda</b>
 
-<b>{balance}</b>
+<b>{balance}</b>{held}
 
 {dot} Deposit untuk menambah saldo
 {dot} Withdraw untuk menarik saldo""".format(
         money=Emoji.MONEY,
         dot=Emoji.DOT,
-        balance=format_currency(balance)
+        balance=format_currency(balance),
+        held=format_held(held)
     )
 
 
@@ -204,8 +211,7 @@ def format_coin_networks(coin: str) -> str:
 Pilih network yang ingin Anda gunakan:""".format(coin=coin)
 
 
-def format_buy_amount(coin: str, network: str, rate: Decimal, margin: Decimal) -> str:
-    final_rate = rate * (1 + margin / 100)
+def format_buy_amount(coin: str, network: str, buy_rate: Decimal, margin: Decimal) -> str:
     return """{coin_emoji} <b>Beli {coin}</b> ({network})
 
 {chart} Rate: <b>{rate}</b> / {coin}
@@ -217,7 +223,7 @@ Masukkan jumlah pembelian dalam Rupiah:
         chart=Emoji.CHART,
         coin=coin,
         network=network,
-        rate=format_currency(final_rate),
+        rate=format_currency(buy_rate),
         margin=margin
     )
 
@@ -422,7 +428,8 @@ def format_profile(
     status: str,
     referral_code: str,
     created_at,
-    balance: Decimal
+    balance: Decimal,
+    held: Optional[Decimal] = None
 ) -> str:
     status_text = {
         "ACTIVE": f"{Emoji.CHECK} Aktif",
@@ -441,7 +448,7 @@ def format_profile(
 {dot} <b>Email:</b> {email}
 {dot} <b>WhatsApp:</b> {whatsapp}
 
-{money} <b>Saldo:</b> {balance}
+{money} <b>Saldo:</b> {balance}{held}
 {gift} <b>Kode Referral:</b> <code>{referral_code}</code>
 
 <b>Status Akun:</b> {status}
@@ -455,6 +462,7 @@ def format_profile(
         email=email or "-",
         whatsapp=whatsapp or "-",
         balance=format_currency(balance),
+        held=format_held(held),
         referral_code=referral_code,
         status=status_text,
         created_at=created_wib
@@ -5,7 +5,15 @@ from aiogram.filters import Command
 from prisma import Prisma
 
 from bot.formatters.messages import Emoji
-from bot.db.queries import update_balance
+from bot.db.queries import (
+    complete_deposit,
+    fail_deposits,
+    complete_withdrawal,
+    fail_withdrawal,
+    complete_buy_order,
+    fail_buy_order,
+    InsufficientBalanceError,
+)
 from bot.config import config
 
 router = Router()
@@ -22,6 +30,7 @@ async def admin_menu(message: Message, db: Prisma, **kwargs):
     
     pending_deposits = await db.deposit.count(where={"status": "PENDING"})
     pending_withdrawals = await db.withdrawal.count(where={"status": "PENDING"})
+    stalled_payouts = await db.payoutjob.count(where={"status": "STALLED"})
     total_users = await db.user.count()
     active_users = await db.user.count(where={"status": "ACTIVE"})
     
@@ -29,11 +38,13 @@ async def admin_menu(message: Message, db: Prisma, **kwargs):
         f"<b>Admin Panel</b>\n\n"
         f"{Emoji.DOT} Users: {total_users} (Active: {active_users})\n"
         f"{Emoji.DOT} Pending Top Up: {pending_deposits}\n"
-        f"{Emoji.DOT} Pending Withdraw: {pending_withdrawals}\n\n"
+        f"{Emoji.DOT} Pending Withdraw: {pending_withdrawals}\n"
+        f"{Emoji.DOT} Stalled Payout: {stalled_payouts}\n\n"
         f"<b>Commands:</b>\n"
         f"/pending_topup - /pending_withdraw\n"
         f"/approve_topup [id] - /reject_topup [id]\n"
-        f"/approve_withdraw [id] - /reject_withdraw [id]",
+        f"/approve_withdraw [id] - /reject_withdraw [id]\n"
+        f"/resolve_payout [order_id] [sent|refund]",
         parse_mode="HTML"
     )
 
@@ -124,22 +135,10 @@ async def approve_topup(message: Message, db: Prisma, **kwargs):
         await message.answer("Deposit tidak ditemukan.")
         return
     
-    if deposit.status != "PENDING":
+    if deposit.status != "PENDING" or not await complete_deposit(db, deposit):
         await message.answer("Deposit sudah diproses.")
         return
     
-    await db.deposit.update(
-        where={"id": deposit_id},
-        data={"status": "COMPLETED"}
-    )
-    
-    await update_balance(db, deposit.userId, deposit.amount)
-    
-    await db.transaction.update_many(
-        where={"metadata": {"path": ["depositId"], "equals": deposit_id}},
-        data={"status": "COMPLETED"}
-    )
-    
     await message.answer(
         f"{Emoji.CHECK} Top up approved!\n"
         f"User: {deposit.user.firstName or deposit.user.username}\n"
@@ -178,20 +177,10 @@ async def reject_topup(message: Message, db: Prisma, **kwargs):
         await message.answer("Deposit tidak ditemukan.")
         return
     
-    if deposit.status != "PENDING":
+    if deposit.status != "PENDING" or not await fail_deposits(db, [deposit_id]):
         await message.answer("Deposit sudah diproses.")
         return
     
-    await db.deposit.update(
-        where={"id": deposit_id},
-        data={"status": "FAILED"}
-    )
-    
-    await db.transaction.update_many(
-        where={"metadata": {"path": ["depositId"], "equals": deposit_id}},
-        data={"status": "FAILED"}
-    )
-    
     await message.answer(f"{Emoji.CHECK} Top up rejected!")
     
     try:
@@ -231,23 +220,15 @@ async def approve_withdraw(message: Message, db: Prisma, **kwargs):
         await message.answer("Withdrawal sudah diproses.")
         return
     
-    user_balance = await db.balance.find_unique(where={"userId": withdrawal.userId})
-    
-    if not user_balance or user_balance.amount < withdrawal.amount:
+    try:
+        completed = await complete_withdrawal(db, withdrawal)
+    except InsufficientBalanceError:
         await message.answer("Saldo user tidak cukup.")
         return
     
-    await update_balance(db, withdrawal.userId, -withdrawal.amount)
-    
-    await db.withdrawal.update(
-        where={"id": withdrawal_id},
-        data={"status": "COMPLETED"}
-    )
-    
-    await db.transaction.update_many(
-        where={"metadata": {"path": ["withdrawalId"], "equals": withdrawal_id}},
-        data={"status": "COMPLETED"}
-    )
+    if not completed:
+        await message.answer("Withdrawal sudah diproses.")
+        return
     
     await message.answer(
         f"{Emoji.CHECK} Withdraw approved!\n"
@@ -287,20 +268,10 @@ async def reject_withdraw(message: Message, db: Prisma, **kwargs):
         await message.answer("Withdrawal tidak ditemukan.")
         return
     
-    if withdrawal.status != "PENDING":
+    if withdrawal.status != "PENDING" or not await fail_withdrawal(db, withdrawal):
         await message.answer("Withdrawal sudah diproses.")
         return
     
-    await db.withdrawal.update(
-        where={"id": withdrawal_id},
-        data={"status": "FAILED"}
-    )
-    
-    await db.transaction.update_many(
-        where={"metadata": {"path": ["withdrawalId"], "equals": withdrawal_id}},
-        data={"status": "FAILED"}
-    )
-    
     await message.answer(f"{Emoji.CHECK} Withdraw rejected!")
     
     try:
@@ -313,3 +284,61 @@ async def reject_withdraw(message: Message, db: Prisma, **kwargs):
         )
     except Exception:
         pass
+
+
+@router.message(Command("resolve_payout"))
+async def resolve_payout(message: Message, db: Prisma, **kwargs):
+    if not is_admin(message.from_user.id):
+        return
+    
+    args = message.text.split()
+    if len(args) < 3 or args[2] not in ("sent", "refund"):
+        await message.answer("Usage: /resolve_payout [order_id] [sent|refund]")
+        return
+    
+    order_id, action = args[1], args[2]
+    
+    order = await db.cryptoorder.find_unique(
+        where={"id": order_id},
+        include={"user": True, "payoutJob": True}
+    )
+    
+    if not order or order.orderType != "BUY":
+        await message.answer("Order tidak ditemukan.")
+        return
+    
+    if order.payoutJob and order.payoutJob.status in ("QUEUED", "RUNNING"):
+        await message.answer("Payout masih berjalan, tunggu sampai selesai atau terhenti.")
+        return
+    
+    if action == "sent":
+        moved, captured = await complete_buy_order(db, order)
+    else:
+        moved, captured = await fail_buy_order(db, order, "Refunded by admin"), True
+    
+    if not moved:
+        await message.answer("Order sudah diproses.")
+        return
+    
+    await message.answer(
+        f"{Emoji.CHECK} Payout resolved: {action}\n"
+        f"User: {order.user.firstName or order.user.username}\n"
+        f"Amount: Rp {order.fiatAmount:,.0f}"
+        + ("" if captured else "\n\nSaldo user tidak bisa dipotong, cek manual.")
+    )
+    
+    if action == "sent":
+        text = (
+            f"<b>Pembelian Berhasil</b> {Emoji.CHECK}\n\n"
+            f"{order.cryptoAmount:.8f} {order.coinSymbol} telah dikirim ke wallet Anda."
+        )
+    else:
+        text = (
+            f"<b>Pembelian Dibatalkan</b> {Emoji.CROSS}\n\n"
+            f"Rp {order.fiatAmount:,.0f} telah dikembalikan ke saldo Anda."
+        )
+    
+    try:
+        await message.bot.send_message(order.user.telegramId, text, parse_mode="HTML")
+    except Exception:
+        pass
@@ -5,6 +5,8 @@ from prisma import Prisma
 
 from bot.formatters.messages import format_balance
 from bot.keyboards.inline import CallbackData, get_balance_keyboard
+from bot.db.queries import refresh_balance
+from bot.utils.helpers import available_balance, held_balance
 
 router = Router()
 
@@ -15,10 +17,11 @@ async def show_balance(callback: CallbackQuery, db: Prisma, user: Optional[dict]
         await callback.answer("Silakan daftar terlebih dahulu.", show_alert=True)
         return
     
-    balance = user.balance.amount if user.balance else 0
+    user = await refresh_balance(db, user)
+    balance = available_balance(user)
     
     await callback.message.edit_text(
-        format_balance(balance),
+        format_balance(balance, held_balance(user)),
         reply_markup=get_balance_keyboard(),
         parse_mode="HTML"
     )
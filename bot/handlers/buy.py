@@ -1,4 +1,3 @@
-from decimal import Decimal
 from datetime import datetime, timedelta
 from typing import Optional
 from aiogram import Router, F
@@ -12,7 +11,7 @@ from bot.formatters.messages import (
     format_coin_networks,
     format_buy_amount,
     format_buy_confirm,
-    format_transaction_success,
+    format_transaction_pending,
     format_error,
     format_insufficient_balance,
     Emoji,
@@ -25,18 +24,25 @@ from bot.keyboards.inline import (
     get_back_keyboard,
     get_cancel_keyboard,
 )
-from bot.utils.helpers import parse_amount, idr_to_crypto
-from bot.services.oxapay import OxaPayService
+from bot.utils.helpers import parse_amount, available_balance
+from bot.utils.money import Amount, idr
+from bot.services.market import MarketDataRefresher
+from bot.services.pricing import PricingEngine
+from bot.services.quotes import LockedQuote
+from bot.workers.payouts import PayoutWorker
 from bot.db.queries import (
-    get_coin_settings,
     create_crypto_order,
-    update_balance,
+    enqueue_payout_job,
+    get_user_balance,
+    refresh_balance,
+    hold_balance,
+    unit_of_work,
+    InsufficientBalanceError,
 )
-from bot.config import config
 
 router = Router()
 
-USD_TO_IDR = Decimal("16000")
+MIN_BUY = idr(10000)
 
 
 class BuyStates(StatesGroup):
@@ -47,22 +53,35 @@ class BuyStates(StatesGroup):
     confirming = State()
 
 
+async def price_buy_confirm(state: FSMContext, locked: LockedQuote, notice: str = "") -> Optional[str]:
+    data = await state.get_data()
+    quote = locked.quote
+    amount_idr = Amount.parse(data["amount_idr"])
+    crypto_amount = quote.crypto_for_idr(amount_idr)
+    
+    if crypto_amount is None:
+        return None
+    
+    await state.update_data(quote_id=locked.id, crypto_amount=crypto_amount.serialize())
+    
+    return notice + format_buy_confirm(
+        coin=quote.symbol,
+        network=quote.network,
+        fiat_amount=amount_idr,
+        crypto_amount=crypto_amount,
+        rate=quote.buy_rate,
+        network_fee=quote.network_fee,
+        total=Amount.parse(data["total_idr"]),
+    ) + f"\n\n<i>Rate dikunci selama {locked.ttl} detik.</i>"
+
+
 @router.callback_query(F.data == CallbackData.MENU_BUY)
-async def show_buy_menu(callback: CallbackQuery, state: FSMContext, db: Prisma, user: Optional[dict] = None, **kwargs):
+async def show_buy_menu(callback: CallbackQuery, state: FSMContext, db: Prisma, market: MarketDataRefresher, user: Optional[dict] = None, **kwargs):
     if not user or user.status != "ACTIVE":
         await callback.answer("Silakan daftar terlebih dahulu.", show_alert=True)
         return
     
-    oxapay = OxaPayService(
-        merchant_api_key=config.oxapay.merchant_api_key,
-        payout_api_key=config.oxapay.payout_api_key,
-        webhook_secret=config.oxapay.webhook_secret,
-    )
-    
-    try:
-        coins = await oxapay.get_supported_coins()
-    finally:
-        await oxapay.close()
+    coins = market.snapshot.get_supported_coins()
     
     await state.set_state(BuyStates.selecting_coin)
     
@@ -75,83 +94,50 @@ async def show_buy_menu(callback: CallbackQuery, state: FSMContext, db: Prisma,
 
 
 @router.callback_query(F.data.startswith("buy:coin:"))
-async def select_buy_coin(callback: CallbackQuery, state: FSMContext, **kwargs):
+async def select_buy_coin(callback: CallbackQuery, state: FSMContext, market: MarketDataRefresher, pricing: PricingEngine, **kwargs):
     coin = callback.data.split(":")[-1]
     
-    oxapay = OxaPayService(
-        merchant_api_key=config.oxapay.merchant_api_key,
-        payout_api_key=config.oxapay.payout_api_key,
-        webhook_secret=config.oxapay.webhook_secret,
-    )
-    
-    try:
-        networks = await oxapay.get_coin_networks(coin)
-        rate_usd = await oxapay.get_exchange_rate(coin, "USD")
-    finally:
-        await oxapay.close()
+    networks = market.snapshot.get_coin_networks(coin)
     
     if not networks:
         await callback.answer("Network tidak tersedia.", show_alert=True)
         return
     
-    rate_idr = rate_usd * USD_TO_IDR if rate_usd else None
-    
     await state.update_data(coin=coin)
     await state.set_state(BuyStates.selecting_network)
     
     await callback.message.edit_text(
         format_coin_networks(coin),
-        reply_markup=get_networks_keyboard(networks, coin, "buy", rate_idr),
+        reply_markup=get_networks_keyboard(networks, coin, "buy", pricing.table),
         parse_mode="HTML"
     )
     await callback.answer()
 
 
 @router.callback_query(F.data.startswith("buy:network:"))
-async def select_buy_network(callback: CallbackQuery, state: FSMContext, db: Prisma, **kwargs):
+async def select_buy_network(callback: CallbackQuery, state: FSMContext, pricing: PricingEngine, **kwargs):
     parts = callback.data.split(":")
     coin = parts[2]
     network = parts[3]
     
-    coin_setting = await get_coin_settings(db, coin, network)
-    
-    if not coin_setting:
-        margin = Decimal("2")
-    else:
-        margin = coin_setting.buyMargin
+    locked = pricing.lock_quote(callback.from_user.id, coin, network)
     
-    oxapay = OxaPayService(
-        merchant_api_key=config.oxapay.merchant_api_key,
-        payout_api_key=config.oxapay.payout_api_key,
-        webhook_secret=config.oxapay.webhook_secret,
-    )
-    
-    try:
-        rate_usd = await oxapay.get_exchange_rate(coin, "USD")
-        networks = await oxapay.get_coin_networks(coin)
-    finally:
-        await oxapay.close()
-    
-    if not rate_usd:
-        await callback.answer("Gagal mendapatkan rate.", show_alert=True)
+    if not locked:
+        if pricing.table.is_stale:
+            await callback.answer("Gagal mendapatkan rate.", show_alert=True)
+        else:
+            await callback.answer("Network tidak tersedia.", show_alert=True)
         return
     
-    rate_idr = rate_usd * USD_TO_IDR
-    
-    network_info = next((n for n in networks if n["network"] == network), None)
-    network_fee = network_info["withdraw_fee"] if network_info else Decimal("0")
-    
     await state.update_data(
         coin=coin,
         network=network,
-        rate_idr=float(rate_idr),
-        margin=float(margin),
-        network_fee=float(network_fee),
+        quote_id=locked.id,
     )
     await state.set_state(BuyStates.entering_amount)
     
     await callback.message.edit_text(
-        format_buy_amount(coin, network, rate_idr, margin),
+        format_buy_amount(coin, network, locked.quote.buy_rate, locked.quote.buy_margin),
         reply_markup=get_cancel_keyboard("buy:back"),
         parse_mode="HTML"
     )
@@ -159,10 +145,10 @@ async def select_buy_network(callback: CallbackQuery, state: FSMContext, db: Pri
 
 
 @router.message(BuyStates.entering_amount)
-async def process_buy_amount(message: Message, state: FSMContext, db: Prisma, user: Optional[dict] = None, **kwargs):
+async def process_buy_amount(message: Message, state: FSMContext, db: Prisma, pricing: PricingEngine, user: Optional[dict] = None, **kwargs):
     amount_idr = parse_amount(message.text)
     
-    if not amount_idr or amount_idr < Decimal("10000"):
+    if not amount_idr or amount_idr < MIN_BUY:
         await message.answer(
             format_error("Jumlah minimal pembelian adalah Rp 10.000"),
             reply_markup=get_cancel_keyboard("buy:back"),
@@ -174,24 +160,29 @@ async def process_buy_amount(message: Message, state: FSMContext, db: Prisma, us
         await message.answer(format_error("User tidak ditemukan."), parse_mode="HTML")
         return
     
-    balance = user.balance.amount if user.balance else Decimal("0")
+    user = await refresh_balance(db, user)
+    balance = available_balance(user)
     
     data = await state.get_data()
-    rate_idr = Decimal(str(data["rate_idr"]))
-    margin = Decimal(str(data["margin"]))
-    network_fee = Decimal(str(data["network_fee"]))
+    locked = pricing.revalidate(message.from_user.id, data.get("quote_id"), data["coin"], data["network"])
     
-    calc = idr_to_crypto(amount_idr, rate_idr, margin, network_fee)
+    if not locked:
+        await message.answer(
+            format_error("Gagal mendapatkan rate. Silakan coba lagi."),
+            reply_markup=get_cancel_keyboard("buy:back"),
+            parse_mode="HTML"
+        )
+        return
     
-    if calc.get("error"):
+    if locked.quote.crypto_for_idr(amount_idr) is None:
         await message.answer(
-            format_error(calc["error"]),
+            format_error("Amount too low to cover network fee"),
             reply_markup=get_cancel_keyboard("buy:back"),
             parse_mode="HTML"
         )
         return
     
-    total_idr = calc["total_idr"]
+    total_idr = amount_idr
     
     if total_idr > balance:
         await message.answer(
@@ -202,10 +193,9 @@ async def process_buy_amount(message: Message, state: FSMContext, db: Prisma, us
         return
     
     await state.update_data(
-        amount_idr=float(amount_idr),
-        crypto_amount=float(calc["crypto_amount"]),
-        total_idr=float(total_idr),
-        network_fee_idr=float(calc["network_fee_idr"]),
+        quote_id=locked.id,
+        amount_idr=amount_idr.serialize(),
+        total_idr=total_idr.serialize(),
     )
     await state.set_state(BuyStates.entering_wallet)
     
@@ -218,7 +208,7 @@ async def process_buy_amount(message: Message, state: FSMContext, db: Prisma, us
 
 
 @router.message(BuyStates.entering_wallet)
-async def process_wallet_address(message: Message, state: FSMContext, **kwargs):
+async def process_wallet_address(message: Message, state: FSMContext, pricing: PricingEngine, **kwargs):
     wallet = message.text.strip()
     
     if len(wallet) < 20:
@@ -230,34 +220,43 @@ async def process_wallet_address(message: Message, state: FSMContext, **kwargs):
         return
     
     data = await state.get_data()
+    locked = pricing.revalidate(message.from_user.id, data.get("quote_id"), data["coin"], data["network"])
+    text = await price_buy_confirm(state, locked) if locked else None
+    
+    if not text:
+        await message.answer(
+            format_error("Rate berubah dan jumlah tidak lagi mencukupi. Silakan ulangi pembelian."),
+            reply_markup=get_back_keyboard(),
+            parse_mode="HTML"
+        )
+        await state.clear()
+        return
+    
     await state.update_data(wallet_address=wallet)
     await state.set_state(BuyStates.confirming)
     
     await message.answer(
-        format_buy_confirm(
-            coin=data["coin"],
-            network=data["network"],
-            fiat_amount=Decimal(str(data["amount_idr"])),
-            crypto_amount=Decimal(str(data["crypto_amount"])),
-            rate=Decimal(str(data["rate_idr"])) * (Decimal("1") + Decimal(str(data["margin"])) / Decimal("100")),
-            network_fee=Decimal(str(data["network_fee"])),
-            total=Decimal(str(data["total_idr"])),
-        ),
+        text,
         reply_markup=get_confirm_keyboard("buy", "process"),
         parse_mode="HTML"
     )
 
 
-@router.callback_query(F.data == "buy:confirm:process")
-async def confirm_buy(callback: CallbackQuery, state: FSMContext, db: Prisma, user: Optional[dict] = None, **kwargs):
+@router.callback_query(F.data == "buy:confirm:process", flags={"user_lock": True, "rate_cost": 5})
+async def confirm_buy(callback: CallbackQuery, state: FSMContext, db: Prisma, pricing: PricingEngine, payouts: PayoutWorker, user: Optional[dict] = None, **kwargs):
     data = await state.get_data()
     
     if not user:
         await callback.answer("User tidak ditemukan.", show_alert=True)
         return
     
-    balance = user.balance.amount if user.balance else Decimal("0")
-    total_idr = Decimal(str(data["total_idr"]))
+    if "total_idr" not in data:
+        await callback.answer("Pesanan sudah diproses.", show_alert=True)
+        return
+    
+    user = await refresh_balance(db, user)
+    balance = available_balance(user)
+    total_idr = Amount.parse(data["total_idr"])
     
     if total_idr > balance:
         await callback.message.edit_text(
@@ -268,99 +267,80 @@ async def confirm_buy(callback: CallbackQuery, state: FSMContext, db: Prisma, us
         await callback.answer()
         return
     
-    order = await create_crypto_order(
-        db=db,
-        user_id=user.id,
-        order_type="BUY",
-        coin_symbol=data["coin"],
-        network=data["network"],
-        crypto_amount=Decimal(str(data["crypto_amount"])),
-        fiat_amount=Decimal(str(data["amount_idr"])),
-        rate=Decimal(str(data["rate_idr"])),
-        margin=Decimal(str(data["margin"])),
-        network_fee=Decimal(str(data["network_fee"])),
-        wallet_address=data["wallet_address"],
-        expires_at=datetime.utcnow() + timedelta(hours=24),
-    )
-    
-    await update_balance(db, user.id, -total_idr)
-    
-    await db.cryptoorder.update(
-        where={"id": order.id},
-        data={"status": "PROCESSING"}
-    )
-    
-    oxapay = OxaPayService(
-        merchant_api_key=config.oxapay.merchant_api_key,
-        payout_api_key=config.oxapay.payout_api_key,
-        webhook_secret=config.oxapay.webhook_secret,
-    )
+    locked = pricing.revalidate(callback.from_user.id, data.get("quote_id"), data["coin"], data["network"])
     
-    try:
-        result = await oxapay.create_payout(
-            address=data["wallet_address"],
-            amount=Decimal(str(data["crypto_amount"])),
-            currency=data["coin"],
-            network=data["network"],
-            description=f"Order {order.id}",
-        )
-        
-        if result.success:
-            await db.cryptoorder.update(
-                where={"id": order.id},
-                data={
-                    "status": "COMPLETED",
-                    "oxapayPayoutId": result.payout_id,
-                    "txHash": result.tx_hash,
-                }
+    if not locked or locked.id != data.get("quote_id"):
+        text = None
+        if locked:
+            text = await price_buy_confirm(
+                state,
+                locked,
+                notice=f"{Emoji.WARNING} <i>Rate telah berubah, silakan konfirmasi ulang.</i>\n\n",
             )
-            
-            await db.transaction.create(
-                data={
-                    "userId": user.id,
-                    "type": "BUY",
-                    "amount": total_idr,
-                    "status": "COMPLETED",
-                    "description": f"Beli {data['crypto_amount']:.8f} {data['coin']}",
-                    "metadata": {"orderId": order.id},
-                }
+        
+        if text:
+            await callback.message.edit_text(
+                text,
+                reply_markup=get_confirm_keyboard("buy", "process"),
+                parse_mode="HTML"
             )
-            
+        else:
             await state.clear()
-            
             await callback.message.edit_text(
-                format_transaction_success("Beli Crypto", total_idr) + 
-                f"\n\nAnda menerima: <b>{data['crypto_amount']:.8f} {data['coin']}</b>\n"
-                f"Ke: <code>{data['wallet_address'][:20]}...</code>",
+                format_error("Rate tidak tersedia. Silakan ulangi pembelian."),
                 reply_markup=get_back_keyboard(),
                 parse_mode="HTML"
             )
-        else:
-            await update_balance(db, user.id, total_idr)
-            await db.cryptoorder.update(
-                where={"id": order.id},
-                data={"status": "FAILED"}
+        await callback.answer()
+        return
+    
+    quote = locked.quote
+    fiat_amount = Amount.parse(data["amount_idr"]).to_decimal()
+    
+    try:
+        async with unit_of_work(db) as tx:
+            if not await hold_balance(tx, user.id, fiat_amount):
+                raise InsufficientBalanceError(user.id)
+            
+            order = await create_crypto_order(
+                db=tx,
+                user_id=user.id,
+                order_type="BUY",
+                coin_symbol=data["coin"],
+                network=data["network"],
+                crypto_amount=Amount.parse(data["crypto_amount"]).to_decimal(),
+                fiat_amount=fiat_amount,
+                rate=quote.rate_idr,
+                margin=quote.buy_margin,
+                network_fee=quote.network_fee.to_decimal(),
+                wallet_address=data["wallet_address"],
+                expires_at=datetime.utcnow() + timedelta(hours=24),
+                status="PROCESSING",
             )
             
-            await callback.message.edit_text(
-                format_error(f"Payout gagal: {result.error}"),
-                reply_markup=get_back_keyboard(),
-                parse_mode="HTML"
+            await enqueue_payout_job(
+                tx,
+                order.id,
+                chat_id=callback.message.chat.id,
+                message_id=callback.message.message_id,
             )
-    except Exception as e:
-        await update_balance(db, user.id, total_idr)
-        await db.cryptoorder.update(
-            where={"id": order.id},
-            data={"status": "FAILED"}
-        )
-        
+    except InsufficientBalanceError:
         await callback.message.edit_text(
-            format_error(f"Terjadi kesalahan: {str(e)}"),
+            format_insufficient_balance(total_idr, idr(await get_user_balance(db, user.id))),
             reply_markup=get_back_keyboard(),
             parse_mode="HTML"
         )
-    finally:
-        await oxapay.close()
+        await callback.answer()
+        return
+    
+    payouts.notify()
+    
+    await state.clear()
+    
+    await callback.message.edit_text(
+        format_transaction_pending(),
+        parse_mode="HTML"
+    )
     
     await callback.answer()
 
@@ -378,17 +358,8 @@ async def cancel_buy(callback: CallbackQuery, state: FSMContext, **kwargs):
 
 
 @router.callback_query(F.data == "buy:back")
-async def back_to_buy_coins(callback: CallbackQuery, state: FSMContext, **kwargs):
-    oxapay = OxaPayService(
-        merchant_api_key=config.oxapay.merchant_api_key,
-        payout_api_key=config.oxapay.payout_api_key,
-        webhook_secret=config.oxapay.webhook_secret,
-    )
-    
-    try:
-        coins = await oxapay.get_supported_coins()
-    finally:
-        await oxapay.close()
+async def back_to_buy_coins(callback: CallbackQuery, state: FSMContext, market: MarketDataRefresher, **kwargs):
+    coins = market.snapshot.get_supported_coins()
     
     await state.set_state(BuyStates.selecting_coin)
     
@@ -1,4 +1,4 @@
-from decimal import Decimal
+from decimal import Decimal, ROUND_UP
 from typing import Optional
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
@@ -9,13 +9,14 @@ from prisma import Prisma
 from bot.formatters.messages import Emoji
 from bot.keyboards.inline import CallbackData, get_back_keyboard, get_cancel_keyboard
 from bot.services.cryptobot import CryptoBotService
-from bot.db.queries import create_deposit
+from bot.db.queries import create_deposit, complete_deposit, fail_deposits, cancel_deposit
 from bot.config import config
+from bot.utils.money import Amount
+from bot.utils.helpers import available_balance, held_balance
 
 router = Router()
 
 MIN_DEPOSIT = Decimal("1")
-MARGIN = Decimal("0.05")
 
 
 class CryptoDepositStates(StatesGroup):
@@ -24,13 +25,6 @@ class CryptoDepositStates(StatesGroup):
     confirming = State()
 
 
-def get_cryptobot() -> CryptoBotService:
-    return CryptoBotService(
-        api_token=config.cryptobot.api_token,
-        margin=config.cryptobot.margin,
-    )
-
-
 def get_crypto_deposit_keyboard():
     from aiogram.types import InlineKeyboardButton
     from aiogram.utils.keyboard import InlineKeyboardBuilder
@@ -100,25 +94,28 @@ async def select_crypto_coin(callback: CallbackQuery, state: FSMContext, **kwarg
     await callback.answer()
 
 
-@router.message(CryptoDepositStates.entering_amount)
-async def process_crypto_amount(message: Message, state: FSMContext, db: Prisma, user: Optional[dict] = None, **kwargs):
+@router.message(CryptoDepositStates.entering_amount, flags={"user_lock": True, "rate_cost": 3})
+async def process_crypto_amount(message: Message, state: FSMContext, db: Prisma, cryptobot: CryptoBotService, user: Optional[dict] = None, **kwargs):
     try:
         await message.delete()
     except:
         pass
     
+    data = await state.get_data()
+    coin = data.get("coin", "USDT")
+    
     try:
-        amount = Decimal(message.text.strip().replace(",", "."))
+        amount = Amount.from_decimal(message.text.strip().replace(",", "."), coin)
     except:
-        sent = await message.answer(
+        await message.answer(
             f"{Emoji.CROSS} Format jumlah tidak valid. Gunakan angka.",
             reply_markup=get_cancel_keyboard("topup:method:crypto"),
             parse_mode="HTML"
         )
         return
     
-    if amount < MIN_DEPOSIT:
-        sent = await message.answer(
+    if amount.to_decimal() < MIN_DEPOSIT:
+        await message.answer(
             f"{Emoji.CROSS} Jumlah minimal adalah {MIN_DEPOSIT}",
             reply_markup=get_cancel_keyboard("topup:method:crypto"),
             parse_mode="HTML"
@@ -129,8 +126,6 @@ async def process_crypto_amount(message: Message, state: FSMContext, db: Prisma,
         await message.answer(f"{Emoji.CROSS} User tidak ditemukan.", parse_mode="HTML")
         return
     
-    data = await state.get_data()
-    coin = data.get("coin", "USDT")
     prompt_msg_id = data.get("prompt_msg_id")
     
     if prompt_msg_id:
@@ -139,88 +134,88 @@ async def process_crypto_amount(message: Message, state: FSMContext, db: Prisma,
         except:
             pass
     
-    cryptobot = get_cryptobot()
+    idr_rate = cryptobot.get_idr_rate(coin)
     
-    try:
-        result = await cryptobot.create_invoice(
-            asset=coin,
-            amount=amount,
-            description=f"Deposit {amount} {coin} - @kriptoecerbot",
-            expires_in=3600,
-        )
-        
-        if not result.success:
-            await message.answer(
-                f"{Emoji.CROSS} Gagal membuat invoice: {result.error}",
-                reply_markup=get_back_keyboard(),
-                parse_mode="HTML"
-            )
-            return
-        
-        idr_rate = await cryptobot.get_idr_rate(coin)
-        gross_idr = amount * idr_rate
-        fee_idr = gross_idr * MARGIN
-        net_idr = gross_idr - fee_idr
-        
-        deposit = await create_deposit(
-            db=db,
-            user_id=user.id,
-            amount=net_idr,
-            payment_method=f"CryptoBot {coin}",
-        )
-        
-        await db.deposit.update(
-            where={"id": deposit.id},
-            data={"cryptobotInvoiceId": result.invoice_id}
-        )
-        
-        await state.update_data(
-            deposit_id=deposit.id,
-            invoice_id=result.invoice_id,
-            amount=float(amount),
-            amount_idr=float(net_idr),
+    if idr_rate is None:
+        await message.answer(
+            f"{Emoji.CROSS} Rate {coin} sedang tidak tersedia. Silakan coba lagi nanti.",
+            reply_markup=get_back_keyboard(),
+            parse_mode="HTML"
         )
-        await state.set_state(CryptoDepositStates.confirming)
-        
-        margin_pct = int(MARGIN * 100)
-        
+        return
+    
+    result = await cryptobot.create_invoice(
+        asset=coin,
+        amount=amount.to_decimal(),
+        description=f"Deposit {amount:f} {coin} - @kriptoecerbot",
+        expires_in=3600,
+    )
+    
+    if not result.success:
         await message.answer(
-            f"{Emoji.COIN} <b>Invoice Deposit {coin}</b>\n\n"
-            f"━━━━━━━━━━━━━━━━━━━━━━\n"
-            f"Deposit: <b>{amount} {coin}</b>\n"
-            f"Rate: <b>Rp {idr_rate:,.0f}/{coin}</b>\n"
-            f"Gross: <b>Rp {gross_idr:,.0f}</b>\n"
-            f"Fee ({margin_pct}%): <b>-Rp {fee_idr:,.0f}</b>\n"
-            f"━━━━━━━━━━━━━━━━━━━━━━\n"
-            f"Saldo diterima: <b>Rp {net_idr:,.0f}</b>\n\n"
-            f"Klik tombol untuk bayar via @CryptoBot:",
-            reply_markup=get_pay_keyboard(result.pay_url, deposit.id),
+            f"{Emoji.CROSS} Gagal membuat invoice: {result.error}",
+            reply_markup=get_back_keyboard(),
             parse_mode="HTML"
         )
-        
-        for admin_id in config.bot.admin_ids:
-            try:
-                await message.bot.send_message(
-                    admin_id,
-                    f"<b>Request Deposit Crypto Baru</b>\n\n"
-                    f"{Emoji.DOT} User: {user.firstName or user.username} (ID: {user.telegramId})\n"
-                    f"{Emoji.DOT} Deposit: {amount} {coin}\n"
-                    f"{Emoji.DOT} Gross: Rp {gross_idr:,.0f}\n"
-                    f"{Emoji.DOT} Fee 5%: Rp {fee_idr:,.0f}\n"
-                    f"{Emoji.DOT} Net: Rp {net_idr:,.0f}\n"
-                    f"{Emoji.DOT} Invoice: {result.invoice_id}\n\n"
-                    f"ID: <code>{deposit.id}</code>",
-                    parse_mode="HTML"
-                )
-            except Exception:
-                pass
-        
-    finally:
-        await cryptobot.close()
+        return
+    
+    margin = Decimal(str(config.cryptobot.margin))
+    gross_idr = amount.convert(idr_rate, "IDR")
+    fee_idr = gross_idr.convert(margin, "IDR", ROUND_UP)
+    net_idr = gross_idr - fee_idr
+    
+    deposit = await create_deposit(
+        db=db,
+        user_id=user.id,
+        amount=net_idr.to_decimal(),
+        payment_method=f"CryptoBot {coin}",
+        cryptobot_invoice_id=result.invoice_id,
+    )
+    
+    await state.update_data(
+        deposit_id=deposit.id,
+        invoice_id=result.invoice_id,
+        amount=amount.serialize(),
+        amount_idr=net_idr.serialize(),
+    )
+    await state.set_state(CryptoDepositStates.confirming)
+    
+    margin_pct = int(margin * 100)
+    
+    await message.answer(
+        f"{Emoji.COIN} <b>Invoice Deposit {coin}</b>\n\n"
+        f"━━━━━━━━━━━━━━━━━━━━━━\n"
+        f"Deposit: <b>{amount:f} {coin}</b>\n"
+        f"Rate: <b>Rp {idr_rate:,.0f}/{coin}</b>\n"
+        f"Gross: <b>Rp {gross_idr:,.0f}</b>\n"
+        f"Fee ({margin_pct}%): <b>-Rp {fee_idr:,.0f}</b>\n"
+        f"━━━━━━━━━━━━━━━━━━━━━━\n"
+        f"Saldo diterima: <b>Rp {net_idr:,.0f}</b>\n\n"
+        f"Klik tombol untuk bayar via @CryptoBot:",
+        reply_markup=get_pay_keyboard(result.pay_url, deposit.id),
+        parse_mode="HTML"
+    )
+    
+    for admin_id in config.bot.admin_ids:
+        try:
+            await message.bot.send_message(
+                admin_id,
+                f"<b>Request Deposit Crypto Baru</b>\n\n"
+                f"{Emoji.DOT} User: {user.firstName or user.username} (ID: {user.telegramId})\n"
+                f"{Emoji.DOT} Deposit: {amount:f} {coin}\n"
+                f"{Emoji.DOT} Gross: Rp {gross_idr:,.0f}\n"
+                f"{Emoji.DOT} Fee {margin_pct}%: Rp {fee_idr:,.0f}\n"
+                f"{Emoji.DOT} Net: Rp {net_idr:,.0f}\n"
+                f"{Emoji.DOT} Invoice: {result.invoice_id}\n\n"
+                f"ID: <code>{deposit.id}</code>",
+                parse_mode="HTML"
+            )
+        except Exception:
+            pass
 
 
-@router.callback_query(F.data.startswith("crypto_deposit:check:"))
-async def check_crypto_payment(callback: CallbackQuery, state: FSMContext, db: Prisma, **kwargs):
+@router.callback_query(F.data.startswith("crypto_deposit:check:"), flags={"user_lock": True, "rate_cost": 3})
+async def check_crypto_payment(callback: CallbackQuery, state: FSMContext, db: Prisma, cryptobot: CryptoBotService, **kwargs):
     deposit_id = callback.data.split(":")[-1]
     
     deposit = await db.deposit.find_unique(where={"id": deposit_id})
@@ -238,62 +233,48 @@ async def check_crypto_payment(callback: CallbackQuery, state: FSMContext, db: P
         await callback.answer("Invoice tidak ditemukan.", show_alert=True)
         return
     
-    cryptobot = get_cryptobot()
+    invoice = await cryptobot.get_invoice(deposit.cryptobotInvoiceId)
     
-    try:
-        invoice = await cryptobot.get_invoice(deposit.cryptobotInvoiceId)
-        
-        if not invoice:
-            await callback.answer("Tidak dapat mengecek status pembayaran.", show_alert=True)
+    if not invoice:
+        await callback.answer("Tidak dapat mengecek status pembayaran.", show_alert=True)
+        return
+    
+    status = invoice.get("status", "")
+    
+    if status == "paid":
+        if not await complete_deposit(db, deposit):
+            await callback.answer("Deposit sudah diproses.", show_alert=True)
+            await state.clear()
             return
         
-        status = invoice.get("status", "")
-        
-        if status == "paid":
-            await db.deposit.update(
-                where={"id": deposit_id},
-                data={"status": "COMPLETED"}
-            )
-            
-            await db.balance.update(
-                where={"userId": deposit.userId},
-                data={"amount": {"increment": deposit.amount}}
-            )
-            
-            await state.clear()
-            
-            await callback.message.edit_text(
-                f"{Emoji.CHECK} <b>Deposit Berhasil!</b>\n\n"
-                f"Saldo Anda telah ditambah <b>Rp {deposit.amount:,.0f}</b>",
-                reply_markup=get_back_keyboard(),
-                parse_mode="HTML"
-            )
-            await callback.answer("Pembayaran berhasil!", show_alert=True)
+        await state.clear()
         
-        elif status == "expired":
-            await db.deposit.update(
-                where={"id": deposit_id},
-                data={"status": "FAILED"}
-            )
-            await state.clear()
-            
-            await callback.message.edit_text(
-                f"{Emoji.CROSS} <b>Invoice Expired</b>\n\n"
-                f"Invoice sudah kadaluarsa. Silakan buat deposit baru.",
-                reply_markup=get_back_keyboard(),
-                parse_mode="HTML"
-            )
-            await callback.answer("Invoice expired.", show_alert=True)
+        await callback.message.edit_text(
+            f"{Emoji.CHECK} <b>Deposit Berhasil!</b>\n\n"
+            f"Saldo Anda telah ditambah <b>Rp {deposit.amount:,.0f}</b>",
+            reply_markup=get_back_keyboard(),
+            parse_mode="HTML"
+        )
+        await callback.answer("Pembayaran berhasil!", show_alert=True)
+    
+    elif status == "expired":
+        await fail_deposits(db, [deposit_id])
+        await state.clear()
         
-        else:
-            await callback.answer(f"Status: {status}. Silakan selesaikan pembayaran.", show_alert=True)
+        await callback.message.edit_text(
+            f"{Emoji.CROSS} <b>Invoice Expired</b>\n\n"
+            f"Invoice sudah kadaluarsa. Silakan buat deposit baru.",
+            reply_markup=get_back_keyboard(),
+            parse_mode="HTML"
+        )
+        await callback.answer("Invoice expired.", show_alert=True)
     
-    finally:
-        await cryptobot.close()
+    else:
+        await callback.answer(f"Status: {status}. Silakan selesaikan pembayaran.", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("crypto_deposit:cancel:"))
-async def cancel_crypto_deposit(callback: CallbackQuery, state: FSMContext, db: Prisma, user: Optional[dict] = None, **kwargs):
+@router.callback_query(F.data.startswith("crypto_deposit:cancel:"), flags={"user_lock": True})
+async def cancel_crypto_deposit(callback: CallbackQuery, state: FSMContext, db: Prisma, cryptobot: CryptoBotService, user: Optional[dict] = None, **kwargs):
     from bot.formatters.messages import format_main_menu
     from bot.keyboards.inline import get_main_menu_keyboard
     
@@ -310,37 +291,30 @@ async def cancel_crypto_deposit(callback: CallbackQuery, state: FSMContext, db:
         return
     
     if deposit.cryptobotInvoiceId:
-        cryptobot = get_cryptobot()
-        try:
-            invoice = await cryptobot.get_invoice(deposit.cryptobotInvoiceId)
-            status = invoice.get("status", "")
+        invoice = await cryptobot.get_invoice(deposit.cryptobotInvoiceId)
+        status = invoice.get("status", "") if invoice else ""
+        
+        if status == "paid" and await complete_deposit(db, deposit):
+            await state.clear()
             
-            if status == "paid":
-                await db.deposit.update(
-                    where={"id": deposit_id},
-                    data={"status": "COMPLETED"}
-                )
-                await db.balance.update(
-                    where={"userId": deposit.userId},
-                    data={"amount": {"increment": deposit.amount}}
-                )
-                await state.clear()
-                
-                await callback.message.edit_text(
-                    f"{Emoji.CHECK} <b>Deposit Berhasil!</b>\n\n"
-                    f"Pembayaran terdeteksi. Saldo ditambah <b>Rp {deposit.amount:,.0f}</b>",
-                    reply_markup=get_back_keyboard(),
-                    parse_mode="HTML"
-                )
-                await callback.answer("Pembayaran sudah diterima!", show_alert=True)
-                return
-        finally:
-            await cryptobot.close()
-    
-    await db.deposit.update(
-        where={"id": deposit_id},
-        data={"status": "CANCELLED"}
-    )
+            await callback.message.edit_text(
+                f"{Emoji.CHECK} <b>Deposit Berhasil!</b>\n\n"
+                f"Pembayaran terdeteksi. Saldo ditambah <b>Rp {deposit.amount:,.0f}</b>",
+                reply_markup=get_back_keyboard(),
+                parse_mode="HTML"
+            )
+            await callback.answer("Pembayaran sudah diterima!", show_alert=True)
+            return
+        
+        # Withdraw the invoice first, otherwise a payment made after cancelling would land on a closed deposit
+        if status != "expired" and not await cryptobot.delete_invoice(deposit.cryptobotInvoiceId):
+            await callback.answer("Gagal membatalkan invoice. Coba lagi.", show_alert=True)
+            return
+    
+    if not await cancel_deposit(db, deposit_id):
+        await callback.answer("Deposit sudah diproses.", show_alert=True)
+        await state.clear()
+        return
     
     await state.clear()
     
@@ -350,11 +324,11 @@ async def cancel_crypto_deposit(callback: CallbackQuery, state: FSMContext, db:
         pass
     
     if user and user.status == "ACTIVE":
-        balance = user.balance.amount if user.balance else 0
+        balance = available_balance(user)
         name = user.firstName or user.username or "User"
         
         await callback.message.answer(
-            format_main_menu(balance, name, callback.from_user.id),
+            format_main_menu(balance, name, callback.from_user.id, held_balance(user)),
             reply_markup=get_main_menu_keyboard(),
             parse_mode="HTML"
         )
@@ -1,10 +1,11 @@
+from typing import Optional
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 from prisma import Prisma
 
 from bot.formatters.messages import Emoji, format_wib_datetime
 from bot.keyboards.inline import CallbackData, get_history_pagination_keyboard, get_back_keyboard
-from bot.db.queries import get_user_by_telegram_id, get_user_transactions, count_user_transactions
+from bot.db.queries import get_user_transactions, count_user_transactions
 
 router = Router()
 
@@ -12,19 +13,17 @@ ITEMS_PER_PAGE = 10
 
 
 @router.callback_query(F.data == CallbackData.MENU_HISTORY)
-async def show_history(callback: CallbackQuery, db: Prisma, **kwargs):
-    await show_history_page(callback, db, page=1)
+async def show_history(callback: CallbackQuery, db: Prisma, user: Optional[dict] = None, **kwargs):
+    await show_history_page(callback, db, user, page=1)
 
 
 @router.callback_query(F.data.startswith("history:page:"))
-async def show_history_page_callback(callback: CallbackQuery, db: Prisma, **kwargs):
+async def show_history_page_callback(callback: CallbackQuery, db: Prisma, user: Optional[dict] = None, **kwargs):
     page = int(callback.data.split(":")[-1])
-    await show_history_page(callback, db, page=page)
+    await show_history_page(callback, db, user, page=page)
 
 
-async def show_history_page(callback: CallbackQuery, db: Prisma, page: int = 1):
-    user = await get_user_by_telegram_id(db, callback.from_user.id)
-    
+async def show_history_page(callback: CallbackQuery, db: Prisma, user: Optional[dict], page: int = 1):
     if not user:
         await callback.answer("Silakan daftar terlebih dahulu.", show_alert=True)
         return
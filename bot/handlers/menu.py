@@ -1,4 +1,3 @@
-from decimal import Decimal
 from typing import Optional
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
@@ -8,33 +7,23 @@ from prisma import Prisma
 from bot.formatters.messages import format_referral_info, format_rates, format_profile, Emoji
 from bot.keyboards.inline import CallbackData, get_back_keyboard, get_referral_keyboard
 from bot.db.queries import get_referral_count, get_referral_bonus_earned, get_user_by_telegram_id
-from bot.services.oxapay import OxaPayService
-from bot.config import config
+from bot.services.pricing import PricingEngine
+from bot.utils.helpers import available_balance, held_balance
 
 router = Router()
 
-USD_TO_IDR = Decimal("16000")
-
 
 @router.callback_query(F.data == CallbackData.MENU_RATES)
-async def show_rates(callback: CallbackQuery, **kwargs):
-    oxapay = OxaPayService(
-        merchant_api_key=config.oxapay.merchant_api_key,
-        payout_api_key=config.oxapay.payout_api_key,
-        webhook_secret=config.oxapay.webhook_secret,
-    )
-    
-    try:
-        prices = await oxapay.get_prices()
-    finally:
-        await oxapay.close()
+async def show_rates(callback: CallbackQuery, pricing: PricingEngine, **kwargs):
+    table = pricing.table
     
-    if not prices:
-        await callback.answer("Gagal mengambil harga. Coba lagi.", show_alert=True)
+    # Same rule as buy and sell: never present an outdated snapshot as current prices
+    if table.is_stale or not table.rates_idr:
+        await callback.answer("Gagal mengambil harga terbaru. Coba lagi.", show_alert=True)
         return
     
     await callback.message.edit_text(
-        format_rates(prices, USD_TO_IDR),
+        format_rates(table.rates_idr, table.usd_to_idr),
         reply_markup=get_back_keyboard(),
         parse_mode="HTML"
     )
@@ -100,7 +89,7 @@ async def show_profile(callback: CallbackQuery, db: Prisma, user: Optional[dict]
         await callback.answer("Silakan daftar terlebih dahulu.", show_alert=True)
         return
     
-    balance = user.balance.amount if user.balance else 0
+    balance = available_balance(user)
     
     await callback.message.edit_text(
         format_profile(
@@ -112,7 +101,8 @@ async def show_profile(callback: CallbackQuery, db: Prisma, user: Optional[dict]
             status=user.status,
             referral_code=user.referralCode,
             created_at=user.createdAt,
-            balance=balance
+            balance=balance,
+            held=held_balance(user)
         ),
         reply_markup=get_back_keyboard(),
         parse_mode="HTML"
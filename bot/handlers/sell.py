@@ -21,17 +21,17 @@ from bot.keyboards.inline import (
     get_back_keyboard,
     get_cancel_keyboard,
 )
-from bot.utils.helpers import parse_crypto_amount, calculate_sell_price
+from bot.utils.helpers import parse_crypto_amount
+from bot.utils.money import idr
 from bot.services.oxapay import OxaPayService
-from bot.db.queries import (
-    get_coin_settings,
-    create_crypto_order,
-)
+from bot.services.market import MarketDataRefresher
+from bot.services.pricing import PricingEngine
+from bot.db.queries import create_crypto_order
 from bot.config import config
 
 router = Router()
 
-USD_TO_IDR = Decimal("16000")
+MIN_SELL = idr(10000)
 
 
 class SellStates(StatesGroup):
@@ -42,21 +42,12 @@ class SellStates(StatesGroup):
 
 
 @router.callback_query(F.data == CallbackData.MENU_SELL)
-async def show_sell_menu(callback: CallbackQuery, state: FSMContext, db: Prisma, user: Optional[dict] = None, **kwargs):
+async def show_sell_menu(callback: CallbackQuery, state: FSMContext, db: Prisma, market: MarketDataRefresher, user: Optional[dict] = None, **kwargs):
     if not user or user.status != "ACTIVE":
         await callback.answer("Silakan daftar terlebih dahulu.", show_alert=True)
         return
     
-    oxapay = OxaPayService(
-        merchant_api_key=config.oxapay.merchant_api_key,
-        payout_api_key=config.oxapay.payout_api_key,
-        webhook_secret=config.oxapay.webhook_secret,
-    )
-    
-    try:
-        coins = await oxapay.get_supported_coins()
-    finally:
-        await oxapay.close()
+    coins = market.snapshot.get_supported_coins()
     
     await state.set_state(SellStates.selecting_coin)
     
@@ -69,81 +60,54 @@ async def show_sell_menu(callback: CallbackQuery, state: FSMContext, db: Prisma,
 
 
 @router.callback_query(F.data.startswith("sell:coin:"))
-async def select_sell_coin(callback: CallbackQuery, state: FSMContext, **kwargs):
+async def select_sell_coin(callback: CallbackQuery, state: FSMContext, market: MarketDataRefresher, pricing: PricingEngine, **kwargs):
     coin = callback.data.split(":")[-1]
     
-    oxapay = OxaPayService(
-        merchant_api_key=config.oxapay.merchant_api_key,
-        payout_api_key=config.oxapay.payout_api_key,
-        webhook_secret=config.oxapay.webhook_secret,
-    )
-    
-    try:
-        networks = await oxapay.get_coin_networks(coin)
-        rate_usd = await oxapay.get_exchange_rate(coin, "USD")
-    finally:
-        await oxapay.close()
+    networks = market.snapshot.get_coin_networks(coin)
     
     if not networks:
         await callback.answer("Network tidak tersedia.", show_alert=True)
         return
     
-    rate_idr = rate_usd * USD_TO_IDR if rate_usd else None
-    
     await state.update_data(coin=coin)
     await state.set_state(SellStates.selecting_network)
     
     await callback.message.edit_text(
         format_coin_networks(coin),
-        reply_markup=get_networks_keyboard(networks, coin, "sell", rate_idr),
+        reply_markup=get_networks_keyboard(networks, coin, "sell", pricing.table),
         parse_mode="HTML"
     )
     await callback.answer()
 
 
 @router.callback_query(F.data.startswith("sell:network:"))
-async def select_sell_network(callback: CallbackQuery, state: FSMContext, db: Prisma, **kwargs):
+async def select_sell_network(callback: CallbackQuery, state: FSMContext, pricing: PricingEngine, **kwargs):
     parts = callback.data.split(":")
     coin = parts[2]
     network = parts[3]
     
-    coin_setting = await get_coin_settings(db, coin, network)
-    
-    if not coin_setting:
-        margin = Decimal("2")
-    else:
-        margin = coin_setting.sellMargin
-    
-    oxapay = OxaPayService(
-        merchant_api_key=config.oxapay.merchant_api_key,
-        payout_api_key=config.oxapay.payout_api_key,
-        webhook_secret=config.oxapay.webhook_secret,
-    )
+    locked = pricing.lock_quote(callback.from_user.id, coin, network)
     
-    try:
-        rate_usd = await oxapay.get_exchange_rate(coin, "USD")
-    finally:
-        await oxapay.close()
-    
-    if not rate_usd:
-        await callback.answer("Gagal mendapatkan rate.", show_alert=True)
+    if not locked:
+        if pricing.table.is_stale:
+            await callback.answer("Gagal mendapatkan rate.", show_alert=True)
+        else:
+            await callback.answer("Network tidak tersedia.", show_alert=True)
         return
     
-    rate_idr = rate_usd * USD_TO_IDR
-    rate_with_margin = rate_idr * (Decimal("1") - margin / Decimal("100"))
+    quote = locked.quote
     
     await state.update_data(
         coin=coin,
         network=network,
-        rate_idr=float(rate_idr),
-        margin=float(margin),
+        quote_id=locked.id,
     )
     await state.set_state(SellStates.entering_amount)
     
     await callback.message.edit_text(
         f"<b>Jual {coin}</b> ({network})\n\n"
-        f"Rate: <b>Rp {rate_with_margin:,.0f}</b> / {coin}\n"
-        f"<i>Sudah termasuk margin {margin}%</i>\n\n"
+        f"Rate: <b>Rp {quote.sell_rate:,.0f}</b> / {coin}\n"
+        f"<i>Sudah termasuk margin {quote.sell_margin}%</i>\n\n"
         f"Masukkan jumlah {coin}:\n"
         f"<i>Contoh: 0.001</i>",
         reply_markup=get_cancel_keyboard("sell:back"),
@@ -152,11 +116,12 @@ async def select_sell_network(callback: CallbackQuery, state: FSMContext, db: Pr
     await callback.answer()
 
 
-@router.message(SellStates.entering_amount)
-async def process_sell_amount(message: Message, state: FSMContext, db: Prisma, user: Optional[dict] = None, **kwargs):
-    crypto_amount = parse_crypto_amount(message.text)
+@router.message(SellStates.entering_amount, flags={"user_lock": True, "rate_cost": 3})
+async def process_sell_amount(message: Message, state: FSMContext, db: Prisma, oxapay: OxaPayService, pricing: PricingEngine, user: Optional[dict] = None, **kwargs):
+    data = await state.get_data()
+    crypto_amount = parse_crypto_amount(message.text, data["coin"])
     
-    if not crypto_amount or crypto_amount <= 0:
+    if not crypto_amount or crypto_amount.units <= 0:
         await message.answer(
             format_error("Jumlah tidak valid."),
             reply_markup=get_cancel_keyboard("sell:back"),
@@ -164,14 +129,20 @@ async def process_sell_amount(message: Message, state: FSMContext, db: Prisma, u
         )
         return
     
-    data = await state.get_data()
-    rate_idr = Decimal(str(data["rate_idr"]))
-    margin = Decimal(str(data["margin"]))
+    locked = pricing.revalidate(message.from_user.id, data.get("quote_id"), data["coin"], data["network"])
+    
+    if not locked:
+        await message.answer(
+            format_error("Gagal mendapatkan rate. Silakan coba lagi."),
+            reply_markup=get_cancel_keyboard("sell:back"),
+            parse_mode="HTML"
+        )
+        return
     
-    calc = calculate_sell_price(crypto_amount, rate_idr, margin)
-    fiat_amount = calc["total"]
+    quote = locked.quote
+    fiat_amount = quote.idr_for_crypto(crypto_amount)
     
-    if fiat_amount < Decimal("10000"):
+    if fiat_amount < MIN_SELL:
         await message.answer(
             format_error("Jumlah terlalu kecil. Minimum penjualan senilai Rp 10.000"),
             reply_markup=get_cancel_keyboard("sell:back"),
@@ -183,12 +154,6 @@ async def process_sell_amount(message: Message, state: FSMContext, db: Prisma, u
         await message.answer(format_error("User tidak ditemukan."), parse_mode="HTML")
         return
     
-    oxapay = OxaPayService(
-        merchant_api_key=config.oxapay.merchant_api_key,
-        payout_api_key=config.oxapay.payout_api_key,
-        webhook_secret=config.oxapay.webhook_secret,
-    )
-    
     try:
         result = await oxapay.create_static_address(
             currency=data["coin"],
@@ -204,25 +169,21 @@ async def process_sell_amount(message: Message, state: FSMContext, db: Prisma, u
             )
             return
         
-        order = await create_crypto_order(
+        await create_crypto_order(
             db=db,
             user_id=user.id,
             order_type="SELL",
             coin_symbol=data["coin"],
             network=data["network"],
-            crypto_amount=crypto_amount,
-            fiat_amount=fiat_amount,
-            rate=rate_idr,
-            margin=margin,
+            crypto_amount=crypto_amount.to_decimal(),
+            fiat_amount=fiat_amount.to_decimal(),
+            rate=quote.rate_idr,
+            margin=quote.sell_margin,
             network_fee=Decimal("0"),
             deposit_address=result.address,
             oxapay_payment_id=result.payment_id,
             expires_at=datetime.utcnow() + timedelta(hours=1),
-        )
-        
-        await db.cryptoorder.update(
-            where={"id": order.id},
-            data={"status": "AWAITING_CRYPTO"}
+            status="AWAITING_CRYPTO",
         )
         
         await state.clear()
@@ -233,7 +194,7 @@ async def process_sell_amount(message: Message, state: FSMContext, db: Prisma, u
                 network=data["network"],
                 crypto_amount=crypto_amount,
                 fiat_amount=fiat_amount,
-                rate=calc["rate_with_margin"],
+                rate=quote.sell_rate,
                 deposit_address=result.address,
             ),
             reply_markup=get_back_keyboard(),
@@ -246,22 +207,11 @@ async def process_sell_amount(message: Message, state: FSMContext, db: Prisma, u
             reply_markup=get_cancel_keyboard("sell:back"),
             parse_mode="HTML"
         )
-    finally:
-        await oxapay.close()
 
 
 @router.callback_query(F.data == "sell:back")
-async def back_to_sell_coins(callback: CallbackQuery, state: FSMContext, **kwargs):
-    oxapay = OxaPayService(
-        merchant_api_key=config.oxapay.merchant_api_key,
-        payout_api_key=config.oxapay.payout_api_key,
-        webhook_secret=config.oxapay.webhook_secret,
-    )
-    
-    try:
-        coins = await oxapay.get_supported_coins()
-    finally:
-        await oxapay.close()
+async def back_to_sell_coins(callback: CallbackQuery, state: FSMContext, market: MarketDataRefresher, **kwargs):
+    coins = market.snapshot.get_supported_coins()
     
     await state.set_state(SellStates.selecting_coin)
     
@@ -6,6 +6,7 @@ from aiogram.fsm.state import State, StatesGroup
 from prisma import Prisma
 from typing import Optional
 
+from bot.db.queries import update_user
 from bot.formatters.messages import Emoji
 from bot.keyboards.inline import CallbackData, get_settings_keyboard, get_back_keyboard, get_cancel_keyboard
 
@@ -32,11 +33,7 @@ async def show_settings(callback: CallbackQuery, db: Prisma, user: Optional[dict
         await callback.answer("Silakan daftar terlebih dahulu.", show_alert=True)
         return
     
-    fresh_user = await db.user.find_unique(
-        where={"id": user.id}
-    )
-    
-    has_pin = bool(fresh_user.pinHash) if fresh_user else False
+    has_pin = bool(user.pinHash)
     pin_status = f"{Emoji.CHECK} PIN sudah diatur" if has_pin else f"{Emoji.WARNING} PIN belum diatur"
     
     settings_text = f"""{Emoji.GEAR} <b>Pengaturan Akun</b>
@@ -164,10 +161,7 @@ async def process_confirm_pin(message: Message, state: FSMContext, db: Prisma, u
         return
     
     pin_hash = hash_pin(new_pin)
-    await db.user.update(
-        where={"id": user.id},
-        data={"pinHash": pin_hash}
-    )
+    await update_user(db, user.id, {"pinHash": pin_hash})
     
     await state.clear()
     
@@ -28,9 +28,12 @@ from bot.utils.helpers import (
     validate_phone,
     normalize_phone,
     generate_referral_code,
+    available_balance,
+    held_balance,
 )
 from bot.db.queries import (
     get_user_by_telegram_id,
+    delete_user,
     get_user_by_referral_code,
     get_user_by_email,
     get_user_by_whatsapp,
@@ -54,7 +57,7 @@ async def agree_terms(callback: CallbackQuery, state: FSMContext, db: Prisma, **
     user = await get_user_by_telegram_id(db, callback.from_user.id)
     
     if user and user.status == "INACTIVE":
-        await db.user.delete(where={"id": user.id})
+        await delete_user(db, user)
     elif user and user.status == "ACTIVE":
         await callback.answer("Anda sudah terdaftar!", show_alert=True)
         return
@@ -249,11 +252,11 @@ async def complete_signup(message: Message, state: FSMContext, db: Prisma):
         parse_mode="HTML"
     )
     
-    balance = user.balance.amount if user.balance else 0
+    balance = available_balance(user)
     name = user.firstName or user.username or "User"
     
     await message.answer(
-        format_main_menu(balance, name, message.from_user.id),
+        format_main_menu(balance, name, message.from_user.id, held_balance(user)),
         reply_markup=get_main_menu_keyboard(),
         parse_mode="HTML"
     )
@@ -298,11 +301,11 @@ async def complete_signup_callback(callback: CallbackQuery, state: FSMContext, d
         parse_mode="HTML"
     )
     
-    balance = user.balance.amount if user.balance else 0
+    balance = available_balance(user)
     name = user.firstName or user.username or "User"
     
     await callback.message.answer(
-        format_main_menu(balance, name, callback.from_user.id),
+        format_main_menu(balance, name, callback.from_user.id, held_balance(user)),
         reply_markup=get_main_menu_keyboard(),
         parse_mode="HTML"
     )
@@ -8,6 +8,7 @@ from typing import Optional
 from bot.formatters.messages import format_welcome, format_terms, format_main_menu
 from bot.keyboards.inline import get_terms_keyboard, get_main_menu_keyboard, CallbackData
 from bot.db.queries import get_user_by_telegram_id
+from bot.utils.helpers import available_balance, held_balance
 
 router = Router()
 
@@ -47,11 +48,11 @@ async def cmd_start(message: Message, state: FSMContext, db: Prisma, user: Optio
             )
             return
         
-        balance = user.balance.amount if user.balance else 0
+        balance = available_balance(user)
         name = user.firstName or user.username or "User"
         
         await message.answer(
-            format_main_menu(balance, name, message.from_user.id),
+            format_main_menu(balance, name, message.from_user.id, held_balance(user)),
             reply_markup=get_main_menu_keyboard(),
             parse_mode="HTML"
         )
@@ -76,11 +77,11 @@ async def back_to_menu(callback: CallbackQuery, state: FSMContext, db: Prisma, u
         await callback.answer()
         return
     
-    balance = user.balance.amount if user.balance else 0
+    balance = available_balance(user)
     name = user.firstName or user.username or "User"
     
     await callback.message.edit_text(
-        format_main_menu(balance, name, callback.from_user.id),
+        format_main_menu(balance, name, callback.from_user.id, held_balance(user)),
         reply_markup=get_main_menu_keyboard(),
         parse_mode="HTML"
     )
@@ -105,11 +106,11 @@ async def cancel_and_show_menu(callback: CallbackQuery, state: FSMContext, db: P
         await callback.answer()
         return
     
-    balance = user.balance.amount if user.balance else 0
+    balance = available_balance(user)
     name = user.firstName or user.username or "User"
     
     await callback.message.answer(
-        format_main_menu(balance, name, callback.from_user.id),
+        format_main_menu(balance, name, callback.from_user.id, held_balance(user)),
         reply_markup=get_main_menu_keyboard(),
         parse_mode="HTML"
     )
@@ -3,6 +3,7 @@ from aiogram.types import CallbackQuery
 from decimal import Decimal
 
 from bot.services.oxapay import OxaPayService
+from bot.services.market import MarketDataRefresher
 from bot.keyboards.inline import CallbackData, get_back_keyboard
 from bot.formatters.messages import Emoji
 
@@ -58,8 +59,8 @@ def get_coin_emoji(coin: str) -> str:
     return emojis.get(coin, "•")
 
 
-@router.callback_query(F.data == CallbackData.MENU_STOCK)
-async def show_stock(callback: CallbackQuery, oxapay: OxaPayService, **kwargs):
+@router.callback_query(F.data == CallbackData.MENU_STOCK, flags={"rate_cost": 5})
+async def show_stock(callback: CallbackQuery, oxapay: OxaPayService, market: MarketDataRefresher, **kwargs):
     await callback.answer()
     
     await callback.message.edit_text(
@@ -69,7 +70,7 @@ async def show_stock(callback: CallbackQuery, oxapay: OxaPayService, **kwargs):
     
     try:
         balances = await oxapay.get_balance()
-        prices = await oxapay.get_prices()
+        prices = market.snapshot.prices
         
         message = format_stock_message(balances, prices)
         
@@ -86,13 +87,13 @@ async def show_stock(callback: CallbackQuery, oxapay: OxaPayService, **kwargs):
         )
 
 
-@router.callback_query(F.data == "stock:refresh")
-async def refresh_stock(callback: CallbackQuery, oxapay: OxaPayService, **kwargs):
+@router.callback_query(F.data == "stock:refresh", flags={"rate_cost": 5})
+async def refresh_stock(callback: CallbackQuery, oxapay: OxaPayService, market: MarketDataRefresher, **kwargs):
     await callback.answer("Memperbarui data...")
     
     try:
         balances = await oxapay.get_balance()
-        prices = await oxapay.get_prices()
+        prices = market.snapshot.prices
         
         message = format_stock_message(balances, prices)
         
@@ -1,4 +1,3 @@
-from decimal import Decimal
 from typing import Optional
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
@@ -24,10 +23,11 @@ from bot.keyboards.inline import (
 from bot.utils.helpers import parse_amount
 from bot.db.queries import get_payment_methods, create_deposit
 from bot.config import config
+from bot.utils.money import idr
 
 router = Router()
 
-MIN_TOPUP = Decimal("10000")
+MIN_TOPUP = idr(10000)
 
 
 class TopupStates(StatesGroup):
@@ -92,7 +92,7 @@ async def select_topup_method(callback: CallbackQuery, state: FSMContext, db: Pr
     await callback.answer()
 
 
-@router.message(TopupStates.entering_amount)
+@router.message(TopupStates.entering_amount, flags={"user_lock": True})
 async def process_topup_amount(message: Message, state: FSMContext, db: Prisma, user: Optional[dict] = None, **kwargs):
     amount = parse_amount(message.text)
     
@@ -113,11 +113,11 @@ async def process_topup_amount(message: Message, state: FSMContext, db: Prisma,
     deposit = await create_deposit(
         db=db,
         user_id=user.id,
-        amount=amount,
+        amount=amount.to_decimal(),
         payment_method=data["method_name"],
     )
     
-    await state.update_data(deposit_id=deposit.id, amount=float(amount))
+    await state.update_data(deposit_id=deposit.id, amount=amount.serialize())
     await state.set_state(TopupStates.confirming)
     
     await message.answer(
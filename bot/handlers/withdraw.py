@@ -1,4 +1,3 @@
-from decimal import Decimal
 from typing import Optional
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
@@ -21,13 +20,14 @@ from bot.keyboards.inline import (
     get_cancel_keyboard,
     get_confirm_keyboard,
 )
-from bot.utils.helpers import parse_amount
-from bot.db.queries import create_withdrawal
+from bot.utils.helpers import parse_amount, available_balance
+from bot.db.queries import create_withdrawal, get_user_balance, refresh_balance, InsufficientBalanceError
 from bot.config import config
+from bot.utils.money import Amount, idr
 
 router = Router()
 
-MIN_WITHDRAW = Decimal("50000")
+MIN_WITHDRAW = idr(50000)
 
 
 class WithdrawStates(StatesGroup):
@@ -46,7 +46,8 @@ async def show_withdraw_menu(callback: CallbackQuery, state: FSMContext, db: Pri
         await callback.answer("Silakan daftar terlebih dahulu.", show_alert=True)
         return
     
-    balance = user.balance.amount if user.balance else Decimal("0")
+    user = await refresh_balance(db, user)
+    balance = available_balance(user)
     
     if balance < MIN_WITHDRAW:
         await callback.message.edit_text(
@@ -187,7 +188,8 @@ async def process_withdraw_amount(message: Message, state: FSMContext, db: Prism
         await message.answer(format_error("User tidak ditemukan."), parse_mode="HTML")
         return
     
-    balance = user.balance.amount if user.balance else Decimal("0")
+    user = await refresh_balance(db, user)
+    balance = available_balance(user)
     
     if amount > balance:
         await message.answer(
@@ -198,7 +200,7 @@ async def process_withdraw_amount(message: Message, state: FSMContext, db: Prism
         return
     
     data = await state.get_data()
-    await state.update_data(amount=float(amount))
+    await state.update_data(amount=amount.serialize())
     
     if data.get("method") == "bank":
         confirm_text = (
@@ -226,16 +228,22 @@ async def process_withdraw_amount(message: Message, state: FSMContext, db: Prism
     )
 
 
-@router.callback_query(F.data == "withdraw:confirm:confirm")
+@router.callback_query(F.data == "withdraw:confirm:confirm", flags={"user_lock": True, "rate_cost": 5})
 async def confirm_withdraw(callback: CallbackQuery, state: FSMContext, db: Prisma, user: Optional[dict] = None, **kwargs):
     data = await state.get_data()
-    amount = Decimal(str(data["amount"]))
     
     if not user:
         await callback.answer("User tidak ditemukan.", show_alert=True)
         return
     
-    balance = user.balance.amount if user.balance else Decimal("0")
+    if "amount" not in data:
+        await callback.answer("Withdraw sudah diproses.", show_alert=True)
+        return
+    
+    amount = Amount.parse(data["amount"])
+    
+    user = await refresh_balance(db, user)
+    balance = available_balance(user)
     
     if amount > balance:
         await callback.message.edit_text(
@@ -247,22 +255,32 @@ async def confirm_withdraw(callback: CallbackQuery, state: FSMContext, db: Prism
         return
     
     if data.get("method") == "bank":
-        withdrawal = await create_withdrawal(
-            db=db,
-            user_id=user.id,
-            amount=amount,
-            bank_name=data.get("bank_name"),
-            account_number=data.get("account_number"),
-            account_name=data.get("account_name"),
-        )
+        destination = {
+            "bank_name": data.get("bank_name"),
+            "account_number": data.get("account_number"),
+            "account_name": data.get("account_name"),
+        }
     else:
+        destination = {
+            "ewallet_type": data.get("ewallet_type"),
+            "ewallet_number": data.get("ewallet_number"),
+        }
+    
+    try:
         withdrawal = await create_withdrawal(
             db=db,
             user_id=user.id,
-            amount=amount,
-            ewallet_type=data.get("ewallet_type"),
-            ewallet_number=data.get("ewallet_number"),
+            amount=amount.to_decimal(),
+            **destination,
         )
+    except InsufficientBalanceError:
+        await callback.message.edit_text(
+            format_insufficient_balance(amount, idr(await get_user_balance(db, user.id))),
+            reply_markup=get_back_keyboard(),
+            parse_mode="HTML"
+        )
+        await callback.answer()
+        return
     
     await state.clear()
     
@@ -1,7 +1,9 @@
-from decimal import Decimal
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
-from typing import Optional
+from typing import Optional, Sequence
+
+from bot.services.catalog import CoinInfo, NetworkInfo
+from bot.services.quotes import QuoteTable
 
 
 class CallbackData:
@@ -125,14 +127,14 @@ def get_coin_emoji(coin: str) -> str:
     return emojis.get(coin, "•")
 
 
-def get_coins_keyboard(coins: list[dict], action: str) -> InlineKeyboardMarkup:
+def get_coins_keyboard(coins: Sequence[CoinInfo], action: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
     for i in range(0, len(coins), 2):
         row = []
         for j in range(2):
             if i + j < len(coins):
-                symbol = coins[i + j]["symbol"]
+                symbol = coins[i + j].symbol
                 emoji = get_coin_emoji(symbol)
                 row.append(
                     InlineKeyboardButton(
@@ -148,16 +150,16 @@ def get_coins_keyboard(coins: list[dict], action: str) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def get_networks_keyboard(networks: list[dict], coin: str, action: str, rate_idr: Optional[Decimal] = None) -> InlineKeyboardMarkup:
+def get_networks_keyboard(networks: Sequence[NetworkInfo], coin: str, action: str, quotes: Optional[QuoteTable] = None) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
     for net in networks:
-        network = net["network"]
-        fee = net.get("withdraw_fee", Decimal("0"))
+        network = net.network
+        fee = net.withdraw_fee
+        quote = quotes.get(coin, network) if quotes else None
         
-        if rate_idr and fee:
-            fee_idr = Decimal(str(fee)) * rate_idr
-            fee_text = f"Fee: Rp {fee_idr:,.0f}"
+        if quote and fee:
+            fee_text = f"Fee: Rp {quote.network_fee_idr:,.0f}"
         else:
             fee_text = f"Fee: {fee} {coin}"
         
@@ -3,18 +3,11 @@ from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
 from prisma import Prisma
 
-from bot.services.oxapay import OxaPayService
-from bot.config import config
-
 
 class DatabaseMiddleware(BaseMiddleware):
-    def __init__(self, prisma: Prisma):
+    def __init__(self, prisma: Prisma, **services: Any):
         self.prisma = prisma
-        self.oxapay = OxaPayService(
-            merchant_api_key=config.oxapay.merchant_api_key,
-            payout_api_key=config.oxapay.payout_api_key,
-            webhook_secret=config.oxapay.webhook_secret,
-        )
+        self.services = services
         super().__init__()
     
     async def __call__(
@@ -24,5 +17,5 @@ class DatabaseMiddleware(BaseMiddleware):
         data: Dict[str, Any],
     ) -> Any:
         data["db"] = self.prisma
-        data["oxapay"] = self.oxapay
+        data.update(self.services)
         return await handler(event, data)
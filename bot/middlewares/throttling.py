@@ -1,12 +1,16 @@
 from typing import Any, Awaitable, Callable, Dict
 from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
 from aiogram.types import TelegramObject, Message, CallbackQuery
-from cachetools import TTLCache
+
+from bot.utils.rate_limit import TokenBuckets
 
 
 class ThrottlingMiddleware(BaseMiddleware):
-    def __init__(self, rate_limit: float = 0.5):
-        self.cache = TTLCache(maxsize=10000, ttl=rate_limit)
+    """Token-bucket limit per user; handlers flagged with rate_cost spend more than one token"""
+    
+    def __init__(self, buckets: TokenBuckets):
+        self.buckets = buckets
         super().__init__()
     
     async def __call__(
@@ -23,11 +27,10 @@ class ThrottlingMiddleware(BaseMiddleware):
             user_id = event.from_user.id if event.from_user else None
         
         if user_id:
-            if user_id in self.cache:
-                if isinstance(event, CallbackQuery):
+            allowed, notify = await self.buckets.take(user_id, get_flag(data, "rate_cost", default=1))
+            if not allowed:
+                if notify and isinstance(event, CallbackQuery):
                     await event.answer("⏳ Mohon tunggu sebentar...", show_alert=False)
                 return
-            
-            self.cache[user_id] = True
         
         return await handler(event, data)
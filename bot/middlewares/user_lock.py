@@ -0,0 +1,33 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import TelegramObject, Message, CallbackQuery
+
+from bot.utils.locks import UserLockManager
+
+
+class UserLockMiddleware(BaseMiddleware):
+    """Serialises handlers flagged with user_lock per Telegram user"""
+    
+    def __init__(self, locks: UserLockManager):
+        self.locks = locks
+        super().__init__()
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not get_flag(data, "user_lock"):
+            return await handler(event, data)
+        
+        user_id = None
+        if isinstance(event, (Message, CallbackQuery)) and event.from_user:
+            user_id = event.from_user.id
+        
+        if not user_id:
+            return await handler(event, data)
+        
+        async with self.locks.hold(user_id):
+            return await handler(event, data)
@@ -1,19 +1,19 @@
 from typing import Any, Awaitable, Callable, Dict
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, CallbackQuery
 from prisma import Prisma
-from cachetools import TTLCache
+
+from bot.db.queries import get_user_by_telegram_id
+from bot.workers.activity import ActivityTracker
 
 
 class UserStatusMiddleware(BaseMiddleware):
-    INACTIVE_MONTHS = 6
     ACTIVITY_UPDATE_INTERVAL = 3600
     
-    def __init__(self):
+    def __init__(self, activity: ActivityTracker):
         super().__init__()
-        self._last_activity_cache: Dict[int, datetime] = {}
-        self._user_cache: TTLCache = TTLCache(maxsize=10000, ttl=300)
+        self.activity = activity
     
     async def __call__(
         self,
@@ -35,51 +35,17 @@ class UserStatusMiddleware(BaseMiddleware):
         if not user_id:
             return await handler(event, data)
         
-        now = datetime.now(timezone.utc)
-        cached_time = self._last_activity_cache.get(user_id)
-        
-        cached_user = self._user_cache.get(user_id)
-        if cached_user and cached_time and (now - cached_time).total_seconds() < self.ACTIVITY_UPDATE_INTERVAL:
-            data["user"] = cached_user
-            return await handler(event, data)
-        
-        user = await db.user.find_unique(
-            where={"telegramId": user_id},
-            include={"balance": True}
-        )
+        user = await get_user_by_telegram_id(db, user_id)
         
         if user:
-            inactive_threshold = now - timedelta(days=self.INACTIVE_MONTHS * 30)
-            
+            now = datetime.now(timezone.utc)
             last_active = user.lastActiveAt
             if last_active.tzinfo is None:
                 last_active = last_active.replace(tzinfo=timezone.utc)
             
-            if last_active < inactive_threshold and user.status == "ACTIVE":
-                await db.user.update(
-                    where={"id": user.id},
-                    data={"status": "INACTIVE"}
-                )
-                user = await db.user.find_unique(
-                    where={"id": user.id},
-                    include={"balance": True}
-                )
-            elif (now - last_active).total_seconds() >= self.ACTIVITY_UPDATE_INTERVAL:
-                await db.user.update(
-                    where={"id": user.id},
-                    data={"lastActiveAt": now}
-                )
+            if (now - last_active).total_seconds() >= self.ACTIVITY_UPDATE_INTERVAL:
+                self.activity.touch(user.id, now)
             
-            self._last_activity_cache[user_id] = now
-            self._user_cache[user_id] = user
             data["user"] = user
         
         return await handler(event, data)
-    
-    def invalidate_user(self, telegram_id: int):
-        self._user_cache.pop(telegram_id, None)
-        self._last_activity_cache.pop(telegram_id, None)
-    
-    def update_user_cache(self, telegram_id: int, user):
-        self._user_cache[telegram_id] = user
-        self._last_activity_cache[telegram_id] = datetime.now(timezone.utc)
@@ -0,0 +1,79 @@
+from decimal import Decimal
+from dataclasses import dataclass
+from typing import Optional
+
+from bot.services.oxapay import SUPPORTED_COINS
+
+
+@dataclass(frozen=True, slots=True)
+class NetworkInfo:
+    symbol: str
+    network: str
+    name: str
+    withdraw_fee: Decimal
+    withdraw_min: Decimal
+    deposit_min: Decimal
+
+
+@dataclass(frozen=True, slots=True)
+class CoinInfo:
+    symbol: str
+    name: str
+    networks: tuple[NetworkInfo, ...]
+
+
+def _to_decimal(value) -> Decimal:
+    return Decimal(str(value or 0))
+
+
+class CoinCatalog:
+    """Supported coins and their networks, parsed once per currency refresh"""
+    __slots__ = ("coins", "_by_symbol", "_by_network")
+    
+    def __init__(self, coins: tuple[CoinInfo, ...] = ()):
+        self.coins = coins
+        self._by_symbol: dict[str, CoinInfo] = {coin.symbol: coin for coin in coins}
+        self._by_network: dict[tuple[str, str], NetworkInfo] = {
+            (net.symbol, net.network): net
+            for coin in coins
+            for net in coin.networks
+        }
+    
+    @classmethod
+    def from_currencies(cls, currencies: dict) -> "CoinCatalog":
+        coins = []
+        
+        for symbol in SUPPORTED_COINS:
+            coin_data = currencies.get(symbol)
+            if not coin_data:
+                continue
+            
+            networks = tuple(
+                NetworkInfo(
+                    symbol=symbol,
+                    network=network_data.get("network", network_key),
+                    name=network_data.get("name", network_key),
+                    withdraw_fee=_to_decimal(network_data.get("withdraw_fee")),
+                    withdraw_min=_to_decimal(network_data.get("withdraw_min")),
+                    deposit_min=_to_decimal(network_data.get("deposit_min")),
+                )
+                for network_key, network_data in coin_data.get("networks", {}).items()
+            )
+            
+            coins.append(CoinInfo(
+                symbol=symbol,
+                name=coin_data.get("name", symbol),
+                networks=networks,
+            ))
+        
+        return cls(tuple(coins))
+    
+    def get_coin(self, symbol: str) -> Optional[CoinInfo]:
+        return self._by_symbol.get(symbol)
+    
+    def get_networks(self, symbol: str) -> tuple[NetworkInfo, ...]:
+        coin = self._by_symbol.get(symbol)
+        return coin.networks if coin else ()
+    
+    def get_network(self, symbol: str, network: str) -> Optional[NetworkInfo]:
+        return self._by_network.get((symbol, network))
@@ -1,8 +1,18 @@
-import aiohttp
+import asyncio
+import hashlib
+import hmac
+import logging
+import time
 from decimal import Decimal
-from typing import Optional, Dict
+from types import MappingProxyType
+from typing import Mapping, Optional
 from dataclasses import dataclass
 
+from bot.config import CryptoBotConfig
+from bot.services.transport import HttpTransport, TransportError
+
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class InvoiceResult:
@@ -23,38 +33,88 @@ class ExchangeRate:
 class CryptoBotService:
     BASE_URL = "https://pay.crypt.bot/api"
     SUPPORTED_COINS = ["USDT", "USDC"]
-    USD_TO_IDR = Decimal("16000")
+    TIMEOUTS = {
+        "/getMe": 5,
+        "/getExchangeRates": 5,
+        "/getInvoices": 15,
+        "/createInvoice": 15,
+        "/deleteInvoice": 15,
+    }
+    READ_METHODS = {"getMe", "getExchangeRates", "getInvoices"}
     
-    def __init__(self, api_token: str, margin: float = 0.05):
+    def __init__(
+        self,
+        api_token: str,
+        usd_to_idr: Decimal,
+        margin: float = 0.05,
+        rate_refresh_interval: float = 60,
+        rate_max_age: float = 300,
+    ):
         self.api_token = api_token
         self.margin = margin
-        self._session: Optional[aiohttp.ClientSession] = None
-        self._rates_cache: Dict[str, ExchangeRate] = {}
-    
-    async def _get_session(self) -> aiohttp.ClientSession:
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=30)
-            )
-        return self._session
+        self.usd_to_idr = usd_to_idr
+        self.rate_refresh_interval = rate_refresh_interval
+        self.rate_max_age = rate_max_age
+        self.transport = HttpTransport("cryptobot", self.BASE_URL, timeouts=self.TIMEOUTS)
+        self._rates: Mapping[str, ExchangeRate] = MappingProxyType({})
+        self._rates_fetched_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
     
     async def close(self):
-        if self._session and not self._session.closed:
-            await self._session.close()
+        await self.transport.close()
     
-    async def _request(self, method: str, data: Optional[dict] = None) -> dict:
-        session = await self._get_session()
-        url = f"{self.BASE_URL}/{method}"
+    @classmethod
+    def from_config(cls, cryptobot_config: CryptoBotConfig, usd_to_idr: Decimal) -> "CryptoBotService":
+        return cls(
+            api_token=cryptobot_config.api_token,
+            margin=cryptobot_config.margin,
+            rate_refresh_interval=cryptobot_config.rate_refresh_interval,
+            rate_max_age=cryptobot_config.rate_max_age,
+            usd_to_idr=usd_to_idr,
+        )
+    
+    async def start(self):
+        if not self.api_token or (self._refresh_task and not self._refresh_task.done()):
+            return
         
+        await self.get_exchange_rates()
+        self._refresh_task = asyncio.create_task(self._refresh_rates(), name="cryptobot-rates")
+    
+    async def stop(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+    
+    async def _refresh_rates(self):
+        while True:
+            await asyncio.sleep(self.rate_refresh_interval)
+            try:
+                await self.get_exchange_rates()
+            except Exception as e:
+                logger.error(f"CryptoBot rate refresh failed: {e}")
+            
+            if self.rates_stale:
+                logger.warning(f"CryptoBot rates are stale ({self.rates_age:.0f}s old)")
+    
+    async def _request(self, method: str, data: Optional[dict] = None) -> dict:
         headers = {
             "Crypto-Pay-API-Token": self.api_token,
             "Content-Type": "application/json",
         }
         
         try:
-            async with session.post(url, json=data or {}, headers=headers) as resp:
-                return await resp.json()
-        except Exception as e:
+            return await self.transport.request(
+                "POST",
+                f"/{method}",
+                json=data or {},
+                headers=headers,
+                idempotent=method in self.READ_METHODS,
+            )
+        except TransportError as e:
             return {"ok": False, "error": {"code": 0, "name": str(e)}}
     
     async def get_me(self) -> dict:
@@ -63,36 +123,50 @@ class CryptoBotService:
             return result.get("result", {})
         return {}
     
-    async def get_exchange_rates(self) -> Dict[str, ExchangeRate]:
+    @property
+    def rates_age(self) -> float:
+        return time.time() - self._rates_fetched_at
+    
+    @property
+    def rates_stale(self) -> bool:
+        return not self._rates_fetched_at or self.rates_age > self.rate_max_age
+    
+    async def get_exchange_rates(self) -> Mapping[str, ExchangeRate]:
         result = await self._request("getExchangeRates")
         rates = {}
         
-        if result.get("ok"):
-            for item in result.get("result", []):
-                if item.get("target") == "USD":
-                    source = item.get("source", "")
-                    rates[source] = ExchangeRate(
-                        source=source,
-                        target="USD",
-                        rate=Decimal(str(item.get("rate", "1"))),
-                        is_valid=item.get("is_valid", False),
-                    )
+        if not result.get("ok"):
+            return self._rates
+        
+        for item in result.get("result", []):
+            if item.get("target") == "USD":
+                source = item.get("source", "")
+                rates[source] = ExchangeRate(
+                    source=source,
+                    target="USD",
+                    rate=Decimal(str(item.get("rate", "1"))),
+                    is_valid=item.get("is_valid", False),
+                )
         
-        self._rates_cache = rates
-        return rates
+        self._rates = MappingProxyType(rates)
+        self._rates_fetched_at = time.time()
+        return self._rates
     
-    async def get_usd_rate(self, asset: str) -> Decimal:
-        if not self._rates_cache:
-            await self.get_exchange_rates()
+    def get_usd_rate(self, asset: str) -> Optional[Decimal]:
+        """Cached USD rate, or None when missing, invalid or older than rate_max_age"""
+        if self.rates_stale:
+            return None
         
-        rate = self._rates_cache.get(asset)
+        rate = self._rates.get(asset)
         if rate and rate.is_valid:
             return rate.rate
-        return Decimal("1")
+        return None
     
-    async def get_idr_rate(self, asset: str) -> Decimal:
-        usd_rate = await self.get_usd_rate(asset)
-        return usd_rate * self.USD_TO_IDR
+    def get_idr_rate(self, asset: str) -> Optional[Decimal]:
+        usd_rate = self.get_usd_rate(asset)
+        if usd_rate is None:
+            return None
+        return usd_rate * self.usd_to_idr
     
     async def create_invoice(
         self,
@@ -134,13 +208,39 @@ class CryptoBotService:
             error=error.get("name", "Unknown error")
         )
     
-    async def get_invoice(self, invoice_id: str) -> dict:
-        result = await self._request("getInvoices", {"invoice_ids": [int(invoice_id)]})
+    async def get_invoices(self, invoice_ids: list[str]) -> Optional[list[dict]]:
+        if not invoice_ids:
+            return []
+        
+        result = await self._request(
+            "getInvoices",
+            {"invoice_ids": [int(i) for i in invoice_ids], "count": len(invoice_ids)},
+        )
         if result.get("ok"):
-            items = result.get("result", {}).get("items", [])
-            if items:
-                return items[0]
+            return result.get("result", {}).get("items", [])
+        return None
+    
+    async def get_invoice(self, invoice_id: str) -> dict:
+        items = await self.get_invoices([invoice_id])
+        if items:
+            return items[0]
         return {}
     
+    async def delete_invoice(self, invoice_id: str) -> bool:
+        """Withdraw an invoice so it can no longer be paid; False if CryptoBot refused or was unreachable"""
+        result = await self._request("deleteInvoice", {"invoice_id": int(invoice_id)})
+        if not result.get("ok"):
+            logger.warning(f"CryptoBot deleteInvoice {invoice_id} failed: {result.get('error')}")
+        return bool(result.get("ok"))
+    
+    def verify_webhook(self, body: bytes, signature: str) -> bool:
+        if not self.api_token or not signature:
+            return False
+        
+        secret = hashlib.sha256(self.api_token.encode()).digest()
+        expected_sig = hmac.new(secret, body, hashlib.sha256).hexdigest()
+        
+        return hmac.compare_digest(expected_sig, signature)
+    
     def calculate_deposit_amount(self, crypto_amount: Decimal) -> Decimal:
         return crypto_amount / Decimal(str(1 + self.margin))
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Callable, Mapping, Optional
+
+from bot.services.oxapay import OxaPayService
+from bot.services.catalog import CoinCatalog, CoinInfo, NetworkInfo
+
+logger = logging.getLogger(__name__)
+
+
+_EMPTY: Mapping = MappingProxyType({})
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    """Immutable market data; replaced as a whole on every refresh"""
+    # A read-only proxy is unhashable, so dataclasses refuse it as a plain default
+    prices: Mapping[str, float] = field(default_factory=lambda: _EMPTY)
+    catalog: CoinCatalog = CoinCatalog()
+    fetched_at: float = 0.0
+    currencies_fetched_at: float = 0.0
+    max_age: float = 90.0
+    
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+    
+    @property
+    def is_stale(self) -> bool:
+        return not self.fetched_at or self.age > self.max_age
+    
+    def get_rate(self, symbol: str) -> Optional[Decimal]:
+        """USD price for a coin, or None when unknown"""
+        rate = self.prices.get(symbol)
+        if rate:
+            return Decimal(str(rate))
+        return None
+    
+    def get_supported_coins(self) -> tuple[CoinInfo, ...]:
+        return self.catalog.coins
+    
+    def get_coin_networks(self, symbol: str) -> tuple[NetworkInfo, ...]:
+        return self.catalog.get_networks(symbol)
+    
+    def get_network(self, symbol: str, network: str) -> Optional[NetworkInfo]:
+        return self.catalog.get_network(symbol, network)
+
+
+class MarketDataRefresher:
+    """Refreshes prices and currencies in the background and publishes a MarketSnapshot"""
+    
+    def __init__(
+        self,
+        oxapay: OxaPayService,
+        price_interval: float = 15,
+        currency_interval: float = 300,
+        max_age: float = 90,
+    ):
+        self.oxapay = oxapay
+        self.price_interval = price_interval
+        self.currency_interval = currency_interval
+        self.max_age = max_age
+        self.snapshot = MarketSnapshot(max_age=max_age)
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: list[Callable[[MarketSnapshot], None]] = []
+    
+    def subscribe(self, listener: Callable[[MarketSnapshot], None]):
+        """Call listener with every newly published snapshot"""
+        self._listeners.append(listener)
+    
+    async def start(self):
+        if self._task and not self._task.done():
+            return
+        
+        await self.refresh(force_currencies=True)
+        self._task = asyncio.create_task(self._run(), name="market-refresher")
+        logger.info("Market data refresher started")
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Market data refresher stopped")
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.price_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Market refresh failed: {e}")
+    
+    async def refresh(self, force_currencies: bool = False):
+        current = self.snapshot
+        now = time.time()
+        
+        currencies_due = force_currencies or (now - current.currencies_fetched_at) >= self.currency_interval
+        
+        if currencies_due:
+            prices, currencies = await asyncio.gather(
+                self.oxapay.get_prices(),
+                self.oxapay.get_currencies(),
+            )
+        else:
+            prices, currencies = await self.oxapay.get_prices(), None
+        
+        if prices is None and currencies is None:
+            if current.is_stale:
+                logger.warning(f"Market data is stale ({current.age:.0f}s old)")
+            return
+        
+        self.snapshot = MarketSnapshot(
+            prices=MappingProxyType(dict(prices)) if prices is not None else current.prices,
+            catalog=CoinCatalog.from_currencies(currencies) if currencies is not None else current.catalog,
+            fetched_at=now if prices is not None else current.fetched_at,
+            currencies_fetched_at=now if currencies is not None else current.currencies_fetched_at,
+            max_age=self.max_age,
+        )
+        
+        for listener in self._listeners:
+            try:
+                listener(self.snapshot)
+            except Exception as e:
+                logger.error(f"Market listener failed: {e}")
@@ -1,12 +1,13 @@
-import aiohttp
 import hashlib
 import hmac
-import json
-import time
+from datetime import datetime
 from decimal import Decimal
 from typing import Optional, Any
 from dataclasses import dataclass
 
+from bot.config import OxaPayConfig
+from bot.services.transport import HttpTransport, TransportError, CircuitOpenError
+
 
 @dataclass
 class CurrencyInfo:
@@ -29,144 +30,94 @@ class PayoutResult:
     payout_id: Optional[str] = None
     tx_hash: Optional[str] = None
     error: Optional[str] = None
+    # True when the request may have reached OxaPay (timeout, 5xx, dropped connection)
+    uncertain: bool = False
 
 
-_currencies_cache: dict = {}
-_currencies_cache_time: float = 0
-_prices_cache: dict = {}
-_prices_cache_time: float = 0
-CACHE_TTL = 30
+SUPPORTED_COINS = ["BTC", "ETH", "BNB", "SOL", "USDT", "USDC"]
 
 
 class OxaPayService:
     BASE_URL = "https://api.oxapay.com"
+    TIMEOUTS = {
+        "/v1/common/prices": 5,
+        "/v1/common/currencies": 10,
+        "/v1/payment/info": 10,
+        "/v1/payout/info": 10,
+        "/v1/payout": 15,
+        "/v1/general/balance": 10,
+        "/v1/payment/create": 20,
+        "/v1/payment/static-address": 20,
+        "/v1/payout/create": 45,
+    }
+    READ_ENDPOINTS = {
+        "/v1/common/prices",
+        "/v1/common/currencies",
+        "/v1/payment/info",
+        "/v1/payout/info",
+        "/v1/payout",
+        "/v1/general/balance",
+    }
     
     def __init__(self, merchant_api_key: str, payout_api_key: str, webhook_secret: str = ""):
         self.merchant_api_key = merchant_api_key
         self.payout_api_key = payout_api_key
         self.webhook_secret = webhook_secret
-        self._session: Optional[aiohttp.ClientSession] = None
-    
-    async def _get_session(self) -> aiohttp.ClientSession:
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=30)
-            )
-        return self._session
+        self.transport = HttpTransport("oxapay", self.BASE_URL, timeouts=self.TIMEOUTS)
     
     async def close(self):
-        if self._session and not self._session.closed:
-            await self._session.close()
+        await self.transport.close()
+    
+    @classmethod
+    def from_config(cls, oxapay_config: OxaPayConfig) -> "OxaPayService":
+        return cls(
+            merchant_api_key=oxapay_config.merchant_api_key,
+            payout_api_key=oxapay_config.payout_api_key,
+            webhook_secret=oxapay_config.webhook_secret,
+        )
     
     async def _request(
         self,
         method: str,
         endpoint: str,
         data: Optional[dict] = None,
-        use_payout_key: bool = False
+        use_payout_key: bool = False,
+        authenticated: bool = True,
+        params: Optional[dict] = None,
     ) -> dict:
-        session = await self._get_session()
-        url = f"{self.BASE_URL}{endpoint}"
-        
-        api_key = self.payout_api_key if use_payout_key else self.merchant_api_key
-        headers = {
-            "Content-Type": "application/json",
-            "merchant_api_key": api_key
-        }
+        headers = {"Content-Type": "application/json"}
+        if authenticated:
+            headers["merchant_api_key"] = self.payout_api_key if use_payout_key else self.merchant_api_key
         
         try:
-            if method == "GET":
-                async with session.get(url, headers=headers) as resp:
-                    return await resp.json()
-            else:
-                payload = data or {}
-                async with session.post(url, json=payload, headers=headers) as resp:
-                    return await resp.json()
-        except Exception as e:
+            return await self.transport.request(
+                method,
+                endpoint,
+                json=None if method == "GET" else (data or {}),
+                headers=headers,
+                idempotent=endpoint in self.READ_ENDPOINTS,
+                params=params,
+            )
+        except CircuitOpenError as e:
             return {"status": 0, "error": str(e)}
+        except TransportError as e:
+            return {"status": 0, "error": str(e), "unreachable": True}
     
-    async def get_currencies(self, force_refresh: bool = False) -> dict:
-        global _currencies_cache, _currencies_cache_time
-        
-        now = time.time()
-        if _currencies_cache and not force_refresh and (now - _currencies_cache_time) < CACHE_TTL:
-            return _currencies_cache
-        
+    async def get_currencies(self) -> Optional[dict]:
+        """Fetch the currency/network list. Returns None when the request fails."""
         result = await self._request("GET", "/v1/common/currencies")
         
         if result.get("status") == 200:
-            _currencies_cache = result.get("data", {})
-            _currencies_cache_time = now
-            return _currencies_cache
-        
-        return _currencies_cache or {}
-    
-    async def get_supported_coins(self) -> list[dict]:
-        currencies = await self.get_currencies()
-        supported = ["BTC", "ETH", "BNB", "SOL", "USDT", "USDC"]
-        
-        coins = []
-        for symbol in supported:
-            if symbol in currencies:
-                coin_data = currencies[symbol]
-                coins.append({
-                    "symbol": symbol,
-                    "name": coin_data.get("name", symbol),
-                    "networks": coin_data.get("networks", {})
-                })
-        
-        return coins
-    
-    async def get_coin_networks(self, symbol: str) -> list[dict]:
-        currencies = await self.get_currencies()
-        
-        if symbol not in currencies:
-            return []
-        
-        networks = currencies[symbol].get("networks", {})
-        result = []
-        
-        for network_key, network_data in networks.items():
-            result.append({
-                "network": network_data.get("network", network_key),
-                "name": network_data.get("name", network_key),
-                "withdraw_fee": Decimal(str(network_data.get("withdraw_fee", 0))),
-                "withdraw_min": Decimal(str(network_data.get("withdraw_min", 0))),
-                "deposit_min": Decimal(str(network_data.get("deposit_min", 0))),
-            })
-        
-        return result
-    
-    async def get_prices(self) -> dict:
-        """Get all crypto prices in USD"""
-        global _prices_cache, _prices_cache_time
-        
-        now = time.time()
-        if _prices_cache and (now - _prices_cache_time) < CACHE_TTL:
-            return _prices_cache
-        
-        session = await self._get_session()
-        url = f"{self.BASE_URL}/v1/common/prices"
+            return result.get("data", {})
         
-        try:
-            async with session.get(url) as resp:
-                result = await resp.json()
-                if result.get("status") == 200:
-                    _prices_cache = result.get("data", {})
-                    _prices_cache_time = now
-                    return _prices_cache
-        except Exception:
-            pass
-        return _prices_cache or {}
+        return None
     
-    async def get_exchange_rate(self, from_currency: str, to_currency: str = "USD") -> Optional[Decimal]:
-        """Get exchange rate for a specific currency to USD"""
-        prices = await self.get_prices()
+    async def get_prices(self) -> Optional[dict]:
+        """Fetch all crypto prices in USD. Returns None when the request fails."""
+        result = await self._request("GET", "/v1/common/prices", authenticated=False)
         
-        if from_currency in prices:
-            rate = prices[from_currency]
-            if rate:
-                return Decimal(str(rate))
+        if result.get("status") == 200:
+            return result.get("data", {})
         
         return None
     
@@ -267,7 +218,8 @@ class OxaPayService:
         
         return PayoutResult(
             success=False,
-            error=result.get("message", "Unknown error")
+            error=result.get("message") or result.get("error") or "Unknown error",
+            uncertain=bool(result.get("unreachable")),
         )
     
     async def get_payment_status(self, track_id: str) -> dict:
@@ -295,14 +247,31 @@ class OxaPayService:
         
         return {}
     
-    def verify_webhook(self, payload: dict, signature: str) -> bool:
+    async def find_payout(self, description: str, currency: str, since: datetime) -> Optional[dict]:
+        """Find a payout in the history by the description it was sent with. Returns None when absent or on failure."""
+        result = await self._request(
+            "GET",
+            "/v1/payout",
+            use_payout_key=True,
+            params={"currency": currency, "from_date": int(since.timestamp()), "size": 200},
+        )
+        
+        if result.get("status") != 200:
+            return None
+        
+        for payout in result.get("data", {}).get("list", []):
+            if payout.get("description") == description:
+                return payout
+        
+        return None
+    
+    def verify_webhook(self, body: bytes, signature: str) -> bool:
         if not self.webhook_secret:
             return False
         
-        sorted_payload = json.dumps(payload, sort_keys=True, separators=(',', ':'))
         expected_sig = hmac.new(
             self.webhook_secret.encode(),
-            sorted_payload.encode(),
+            body,
             hashlib.sha512
         ).hexdigest()
         
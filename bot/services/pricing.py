@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from decimal import Decimal
+from typing import Mapping, Optional
+
+from prisma import Prisma
+from prisma.models import CoinSetting
+
+from bot.db.queries import get_all_coin_settings
+from bot.services.market import MarketDataRefresher, MarketSnapshot
+from bot.services.quotes import LockedQuote, QuoteStore, QuoteTable
+
+logger = logging.getLogger(__name__)
+
+
+class PricingEngine:
+    """Rebuilds the QuoteTable whenever market data or coin settings change"""
+    
+    def __init__(
+        self,
+        db: Prisma,
+        market: MarketDataRefresher,
+        usd_to_idr: Decimal,
+        default_margin: Decimal = Decimal("2"),
+        settings_interval: float = 60,
+        quote_ttl: float = 60,
+        quote_tolerance: Decimal = Decimal("0.5"),
+    ):
+        self.db = db
+        self.market = market
+        self.usd_to_idr = usd_to_idr
+        self.default_margin = default_margin
+        self.settings_interval = settings_interval
+        self.quotes = QuoteStore(ttl=quote_ttl, tolerance=quote_tolerance)
+        self.table = QuoteTable(usd_to_idr=usd_to_idr)
+        self._settings: Mapping[tuple[str, str], CoinSetting] = {}
+        self._task: Optional[asyncio.Task] = None
+        market.subscribe(self.rebuild)
+    
+    async def start(self):
+        if self._task and not self._task.done():
+            return
+        
+        await self.refresh_settings()
+        self._task = asyncio.create_task(self._run(), name="pricing-engine")
+        logger.info("Pricing engine started")
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Pricing engine stopped")
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.settings_interval)
+            try:
+                await self.refresh_settings()
+            except Exception as e:
+                logger.error(f"Coin settings refresh failed: {e}")
+    
+    async def refresh_settings(self):
+        settings = await get_all_coin_settings(self.db)
+        self._settings = {(s.coinSymbol, s.network): s for s in settings}
+        self.rebuild(self.market.snapshot)
+    
+    def rebuild(self, snapshot: MarketSnapshot):
+        self.table = QuoteTable.build(snapshot, self._settings, self.usd_to_idr, self.default_margin)
+    
+    def lock_quote(self, user_id: int, symbol: str, network: str) -> Optional[LockedQuote]:
+        return self.quotes.lock(self.table, user_id, symbol, network)
+    
+    def revalidate(self, user_id: int, quote_id: Optional[str], symbol: str, network: str) -> Optional[LockedQuote]:
+        return self.quotes.revalidate(self.table, user_id, quote_id, symbol, network)
@@ -0,0 +1,197 @@
+import secrets
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import TYPE_CHECKING, Mapping, Optional
+
+from cachetools import TTLCache
+
+from bot.services.market import MarketSnapshot
+from bot.utils.money import Amount, idr_ceil
+
+if TYPE_CHECKING:
+    from prisma.models import CoinSetting
+
+
+HUNDRED = Decimal("100")
+
+
+@dataclass(frozen=True, slots=True)
+class Quote:
+    symbol: str
+    network: str
+    rate_idr: Decimal
+    buy_margin: Decimal
+    sell_margin: Decimal
+    buy_rate: Decimal
+    sell_rate: Decimal
+    network_fee: Amount
+    network_fee_idr: Amount
+    
+    def crypto_for_idr(self, idr_amount: Amount) -> Optional[Amount]:
+        """Crypto received for an IDR spend, or None when it does not cover the network fee"""
+        available = idr_amount - self.network_fee_idr
+        if available.units <= 0:
+            return None
+        return Amount.from_decimal(available.to_decimal() / self.buy_rate, self.symbol)
+    
+    def idr_for_crypto(self, crypto_amount: Amount) -> Amount:
+        return crypto_amount.convert(self.sell_rate, "IDR")
+    
+    def moved_from(self, other: "Quote", tolerance: Decimal) -> bool:
+        """True when the base rate differs from other's by more than tolerance percent"""
+        if not other.rate_idr:
+            return True
+        return abs(self.rate_idr - other.rate_idr) / other.rate_idr * HUNDRED > tolerance
+
+
+@dataclass(frozen=True, slots=True)
+class LockedQuote:
+    id: str
+    user_id: int
+    quote: Quote
+    expires_at: float
+    
+    @property
+    def ttl(self) -> int:
+        return max(0, int(self.expires_at - time.monotonic()))
+
+
+class QuoteStore:
+    """Short-lived per-user quotes addressed by short ids"""
+    
+    def __init__(self, ttl: float = 60, tolerance: Decimal = Decimal("0.5"), maxsize: int = 10000):
+        self.ttl = ttl
+        self.tolerance = tolerance
+        self._by_id: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._latest: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+    
+    def put(self, user_id: int, quote: Quote) -> LockedQuote:
+        locked = LockedQuote(
+            id=secrets.token_urlsafe(6),
+            user_id=user_id,
+            quote=quote,
+            expires_at=time.monotonic() + self.ttl,
+        )
+        self._by_id[locked.id] = locked
+        self._latest[(user_id, quote.symbol, quote.network)] = locked.id
+        return locked
+    
+    def get(self, quote_id: Optional[str], user_id: int) -> Optional[LockedQuote]:
+        locked = self._by_id.get(quote_id) if quote_id else None
+        if not locked or locked.user_id != user_id:
+            return None
+        return locked
+    
+    def latest(self, user_id: int, symbol: str, network: str) -> Optional[LockedQuote]:
+        return self.get(self._latest.get((user_id, symbol, network)), user_id)
+    
+    def lock(self, table: "QuoteTable", user_id: int, symbol: str, network: str) -> Optional[LockedQuote]:
+        """Reuse the user's live quote for this pair, or lock a fresh one from the table"""
+        latest = self.latest(user_id, symbol, network)
+        return self.revalidate(table, user_id, latest.id if latest else None, symbol, network)
+    
+    def revalidate(
+        self,
+        table: "QuoteTable",
+        user_id: int,
+        quote_id: Optional[str],
+        symbol: str,
+        network: str,
+    ) -> Optional[LockedQuote]:
+        """Keep a locked quote unless it expired or the live rate moved past the tolerance"""
+        locked = self.get(quote_id, user_id)
+        if locked and (locked.quote.symbol, locked.quote.network) != (symbol, network):
+            locked = None
+        
+        current = None if table.is_stale else table.get(symbol, network)
+        
+        if locked and (current is None or not current.moved_from(locked.quote, self.tolerance)):
+            return locked
+        
+        if table.is_stale or current is None:
+            return None
+        
+        return self.put(user_id, current)
+    
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+
+class QuoteTable:
+    """Effective IDR rates for every (coin, network), built once per price tick"""
+    __slots__ = ("usd_to_idr", "rates_idr", "fetched_at", "max_age", "_quotes", "_by_coin")
+    
+    def __init__(
+        self,
+        usd_to_idr: Decimal,
+        rates_idr: Optional[Mapping[str, Decimal]] = None,
+        quotes: tuple[Quote, ...] = (),
+        fetched_at: float = 0.0,
+        max_age: float = 90.0,
+    ):
+        self.usd_to_idr = usd_to_idr
+        self.rates_idr = rates_idr or {}
+        self.fetched_at = fetched_at
+        self.max_age = max_age
+        self._quotes: dict[tuple[str, str], Quote] = {(q.symbol, q.network): q for q in quotes}
+        self._by_coin: dict[str, tuple[Quote, ...]] = {}
+        for quote in quotes:
+            self._by_coin[quote.symbol] = self._by_coin.get(quote.symbol, ()) + (quote,)
+    
+    @classmethod
+    def build(
+        cls,
+        snapshot: MarketSnapshot,
+        settings: Mapping[tuple[str, str], "CoinSetting"],
+        usd_to_idr: Decimal,
+        default_margin: Decimal,
+    ) -> "QuoteTable":
+        rates_idr = {}
+        quotes = []
+        
+        for coin in snapshot.get_supported_coins():
+            rate_usd = snapshot.get_rate(coin.symbol)
+            if not rate_usd:
+                continue
+            
+            rate_idr = rate_usd * usd_to_idr
+            rates_idr[coin.symbol] = rate_idr
+            
+            for net in coin.networks:
+                setting = settings.get((coin.symbol, net.network))
+                if setting and not setting.isActive:
+                    continue
+                
+                buy_margin = setting.buyMargin if setting else default_margin
+                sell_margin = setting.sellMargin if setting else default_margin
+                
+                quotes.append(Quote(
+                    symbol=coin.symbol,
+                    network=net.network,
+                    rate_idr=rate_idr,
+                    buy_margin=buy_margin,
+                    sell_margin=sell_margin,
+                    buy_rate=rate_idr * (1 + buy_margin / HUNDRED),
+                    sell_rate=rate_idr * (1 - sell_margin / HUNDRED),
+                    network_fee=Amount.from_decimal(net.withdraw_fee, coin.symbol),
+                    network_fee_idr=idr_ceil(net.withdraw_fee * rate_idr),
+                ))
+        
+        return cls(
+            usd_to_idr=usd_to_idr,
+            rates_idr=rates_idr,
+            quotes=tuple(quotes),
+            fetched_at=snapshot.fetched_at,
+            max_age=snapshot.max_age,
+        )
+    
+    @property
+    def is_stale(self) -> bool:
+        return not self.fetched_at or time.time() - self.fetched_at > self.max_age
+    
+    def get(self, symbol: str, network: str) -> Optional[Quote]:
+        return self._quotes.get((symbol, network))
+    
+    def get_coin_quotes(self, symbol: str) -> tuple[Quote, ...]:
+        return self._by_coin.get(symbol, ())
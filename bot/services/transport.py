@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class TransportError(Exception):
+    pass
+
+
+class CircuitOpenError(TransportError):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets a single probe through after the reset timeout"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+    
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        
+        return False
+    
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+    
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+    
+    def abandon(self):
+        """Free the half-open probe slot when a call ends without an outcome, e.g. on cancellation"""
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+
+
+class HttpTransport:
+    """Pooled HTTP client with per-endpoint timeouts, retries for idempotent calls and separate read/write circuit breakers"""
+    CONNECTION_LIMIT = 100
+    CONNECTION_LIMIT_PER_HOST = 20
+    DNS_CACHE_TTL = 300
+    KEEPALIVE_TIMEOUT = 30
+    
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        timeouts: Optional[dict[str, float]] = None,
+        default_timeout: float = 10,
+        max_retries: int = 2,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2.0,
+        breaker: Optional[CircuitBreaker] = None,
+        write_breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.write_breaker = write_breaker or CircuitBreaker()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.counters = {
+            "requests": 0,
+            "successes": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "retries": 0,
+            "short_circuited": 0,
+        }
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.CONNECTION_LIMIT,
+                limit_per_host=self.CONNECTION_LIMIT_PER_HOST,
+                ttl_dns_cache=self.DNS_CACHE_TTL,
+                keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+    
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+    
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    async def request(
+        self,
+        method: str,
+        path: str,
+        json: Optional[dict] = None,
+        headers: Optional[dict] = None,
+        idempotent: bool = False,
+        params: Optional[dict] = None,
+    ) -> dict:
+        breaker = self.breaker if idempotent else self.write_breaker
+        if not breaker.allow():
+            self.counters["short_circuited"] += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        
+        # One breaker outcome per logical call, however many attempts it took
+        recorded = False
+        try:
+            result = await self._send(method, path, json, headers, idempotent, params)
+        except TransportError:
+            breaker.record_failure()
+            recorded = True
+            raise
+        else:
+            breaker.record_success()
+            recorded = True
+            return result
+        finally:
+            if not recorded:
+                breaker.abandon()
+    
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        json: Optional[dict],
+        headers: Optional[dict],
+        idempotent: bool,
+        params: Optional[dict] = None,
+    ) -> dict:
+        session = await self._get_session()
+        url = f"{self.base_url}{path}"
+        timeout = aiohttp.ClientTimeout(total=self.timeouts.get(path, self.default_timeout))
+        attempts = 1 + (self.max_retries if idempotent else 0)
+        last_error: Optional[Exception] = None
+        
+        for attempt in range(attempts):
+            if attempt:
+                self.counters["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt))
+            
+            self.counters["requests"] += 1
+            
+            try:
+                async with session.request(method, url, json=json, params=params, headers=headers, timeout=timeout) as resp:
+                    if resp.status >= 500:
+                        raise TransportError(f"{self.name} returned HTTP {resp.status}")
+                    result = await resp.json(content_type=None)
+            except asyncio.TimeoutError:
+                self.counters["timeouts"] += 1
+                last_error = TransportError(f"{self.name} timed out on {path}")
+            except (aiohttp.ClientError, TransportError, ValueError) as e:
+                last_error = e if isinstance(e, TransportError) else TransportError(str(e))
+            else:
+                self.counters["successes"] += 1
+                return result if isinstance(result, dict) else {}
+            
+            self.counters["failures"] += 1
+        
+        raise last_error
+    
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "write_circuit": self.write_breaker.state,
+            "write_consecutive_failures": self.write_breaker.failures,
+        }
@@ -1,43 +1,85 @@
-from typing import Any, Optional, Dict
-from datetime import datetime, timezone
-from cachetools import TTLCache
-import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
 
+from cachetools import LRUCache, TTLCache
+from prisma.models import User
 
-class BotCache:
-    def __init__(self):
-        self.users: TTLCache = TTLCache(maxsize=10000, ttl=300)
-        self.coin_settings: TTLCache = TTLCache(maxsize=100, ttl=60)
-        self.payment_methods: TTLCache = TTLCache(maxsize=50, ttl=60)
-        self.referral_settings: TTLCache = TTLCache(maxsize=10, ttl=60)
-        self._lock = asyncio.Lock()
+
+_deferred: ContextVar[Optional[set[str]]] = ContextVar("deferred_user_invalidations", default=None)
+
+
+class UserCache:
+    """Users with their balance keyed by telegram id, kept fresh by the queries that write them"""
     
-    def get_user(self, telegram_id: int) -> Optional[Any]:
-        return self.users.get(telegram_id)
+    def __init__(self, maxsize: int = 10000, ttl: float = 60, balance_ttl: float = 5):
+        self.users: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # The admin dashboard and other processes write balances without touching this cache,
+        # so a cached user's balance is only trusted for balance_ttl before it is re-read
+        self._fresh_balances: TTLCache = TTLCache(maxsize=maxsize, ttl=balance_ttl)
+        self._telegram_ids: LRUCache = LRUCache(maxsize=maxsize)
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+            "balance_refreshes": 0,
+        }
     
-    def set_user(self, telegram_id: int, user: Any):
-        self.users[telegram_id] = user
+    def get_user(self, telegram_id: int) -> Optional[User]:
+        user = self.users.get(telegram_id)
+        if user is None:
+            self.counters["misses"] += 1
+            return None
+        
+        # Touch the reverse index too so it evicts in step with users
+        self._telegram_ids[user.id] = telegram_id
+        self.counters["hits"] += 1
+        return user
     
-    def invalidate_user(self, telegram_id: int):
-        self.users.pop(telegram_id, None)
+    def set_user(self, user: User):
+        self.users[user.telegramId] = user
+        self._telegram_ids[user.id] = user.telegramId
+        self._fresh_balances[user.telegramId] = True
     
-    def get_coin_settings_all(self) -> Optional[list]:
-        return self.coin_settings.get("all")
+    def balance_fresh(self, telegram_id: int) -> bool:
+        return telegram_id in self._fresh_balances
     
-    def set_coin_settings_all(self, settings: list):
-        self.coin_settings["all"] = settings
+    def mark_balance_fresh(self, telegram_id: int):
+        self._fresh_balances[telegram_id] = True
+        self.counters["balance_refreshes"] += 1
     
-    def get_payment_methods_all(self) -> Optional[list]:
-        return self.payment_methods.get("all")
+    def invalidate_user(self, telegram_id: int):
+        self._fresh_balances.pop(telegram_id, None)
+        if self.users.pop(telegram_id, None) is not None:
+            self.counters["invalidations"] += 1
     
-    def set_payment_methods_all(self, methods: list):
-        self.payment_methods["all"] = methods
+    def invalidate_user_id(self, user_id: str):
+        telegram_id = self._telegram_ids.get(user_id)
+        if telegram_id is not None:
+            self.invalidate_user(telegram_id)
+        
+        pending = _deferred.get()
+        if pending is not None:
+            pending.add(user_id)
     
-    def get_referral_setting(self) -> Optional[Any]:
-        return self.referral_settings.get("active")
+    @contextmanager
+    def deferred(self) -> Iterator[None]:
+        # Drop again after the transaction ends so a read racing the commit cannot re-cache old rows
+        if _deferred.get() is not None:
+            yield
+            return
+        
+        pending: set[str] = set()
+        token = _deferred.set(pending)
+        try:
+            yield
+        finally:
+            _deferred.reset(token)
+            for user_id in pending:
+                self.invalidate_user_id(user_id)
     
-    def set_referral_setting(self, setting: Any):
-        self.referral_settings["active"] = setting
+    def stats(self) -> dict:
+        return {**self.counters, "size": len(self.users)}
 
 
-cache = BotCache()
+user_cache = UserCache()
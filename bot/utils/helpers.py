@@ -4,6 +4,20 @@ import re
 from decimal import Decimal, InvalidOperation
 from typing import Optional
 
+from bot.utils.money import Amount, idr
+
+
+def available_balance(user) -> Amount:
+    if not user or not user.balance:
+        return Amount.zero("IDR")
+    return idr(user.balance.amount - user.balance.held)
+
+
+def held_balance(user) -> Amount:
+    if not user or not user.balance:
+        return Amount.zero("IDR")
+    return idr(user.balance.held)
+
 
 def generate_referral_code(length: int = 8) -> str:
     chars = string.ascii_uppercase + string.digits
@@ -38,26 +52,26 @@ def normalize_phone(phone: str) -> str:
     return cleaned
 
 
-def parse_amount(text: str) -> Optional[Decimal]:
+def parse_amount(text: str) -> Optional[Amount]:
     try:
         cleaned = text.replace(',', '').replace('.', '').strip()
         cleaned = re.sub(r'[^\d]', '', cleaned)
         
         if cleaned:
-            return Decimal(cleaned)
+            return idr(cleaned)
     except (InvalidOperation, ValueError):
         pass
     
     return None
 
 
-def parse_crypto_amount(text: str) -> Optional[Decimal]:
+def parse_crypto_amount(text: str, currency: str) -> Optional[Amount]:
     try:
         cleaned = text.replace(',', '.').strip()
         cleaned = re.sub(r'[^\d.]', '', cleaned)
         
         if cleaned:
-            return Decimal(cleaned)
+            return Amount.from_decimal(cleaned, currency)
     except (InvalidOperation, ValueError):
         pass
     
@@ -79,70 +93,3 @@ def truncate_address(address: str, start: int = 6, end: int = 4) -> str:
         return address
     return f"{address[:start]}...{address[-end:]}"
 
-
-def calculate_buy_price(
-    crypto_amount: Decimal,
-    rate: Decimal,
-    margin_percent: Decimal,
-    network_fee: Decimal
-) -> dict:
-    margin_multiplier = Decimal('1') + (margin_percent / Decimal('100'))
-    rate_with_margin = rate * margin_multiplier
-    
-    subtotal = crypto_amount * rate_with_margin
-    network_fee_idr = network_fee * rate
-    total = subtotal + network_fee_idr
-    
-    return {
-        "rate_with_margin": rate_with_margin,
-        "subtotal": subtotal,
-        "network_fee_idr": network_fee_idr,
-        "total": total,
-    }
-
-
-def calculate_sell_price(
-    crypto_amount: Decimal,
-    rate: Decimal,
-    margin_percent: Decimal
-) -> dict:
-    margin_multiplier = Decimal('1') - (margin_percent / Decimal('100'))
-    rate_with_margin = rate * margin_multiplier
-    
-    total = crypto_amount * rate_with_margin
-    
-    return {
-        "rate_with_margin": rate_with_margin,
-        "total": total,
-    }
-
-
-def idr_to_crypto(
-    idr_amount: Decimal,
-    rate: Decimal,
-    margin_percent: Decimal,
-    network_fee: Decimal
-) -> dict:
-    margin_multiplier = Decimal('1') + (margin_percent / Decimal('100'))
-    rate_with_margin = rate * margin_multiplier
-    
-    network_fee_idr = network_fee * rate
-    available_for_crypto = idr_amount - network_fee_idr
-    
-    if available_for_crypto <= 0:
-        return {
-            "crypto_amount": Decimal('0'),
-            "rate_with_margin": rate_with_margin,
-            "network_fee_idr": network_fee_idr,
-            "total_idr": idr_amount,
-            "error": "Amount too low to cover network fee",
-        }
-    
-    crypto_amount = available_for_crypto / rate_with_margin
-    
-    return {
-        "crypto_amount": crypto_amount,
-        "rate_with_margin": rate_with_margin,
-        "network_fee_idr": network_fee_idr,
-        "total_idr": idr_amount,
-    }
@@ -0,0 +1,76 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from cachetools import LRUCache
+
+
+class _UserLock:
+    __slots__ = ("lock", "refs")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.refs = 0
+
+
+class UserLockManager:
+    """Per-user asyncio locks that exist only while someone holds or waits on them"""
+
+    def __init__(self, hot_size: int = 1000, hot_report: int = 10):
+        self._locks: dict[int, _UserLock] = {}
+        self._hot: LRUCache = LRUCache(maxsize=hot_size)
+        self.hot_report = hot_report
+        self.counters = {
+            "acquired": 0,
+            "contended": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+        }
+
+    @asynccontextmanager
+    async def hold(self, user_id: int) -> AsyncIterator[None]:
+        entry = self._locks.get(user_id)
+        if entry is None:
+            entry = self._locks[user_id] = _UserLock()
+        entry.refs += 1
+
+        try:
+            if entry.lock.locked():
+                await self._wait(user_id, entry.lock)
+            else:
+                await entry.lock.acquire()
+            self.counters["acquired"] += 1
+
+            try:
+                yield
+            finally:
+                entry.lock.release()
+        finally:
+            entry.refs -= 1
+            if not entry.refs:
+                self._locks.pop(user_id, None)
+
+    async def _wait(self, user_id: int, lock: asyncio.Lock):
+        self.counters["contended"] += 1
+        self._hot[user_id] = self._hot.get(user_id, 0) + 1
+
+        started = time.monotonic()
+        await lock.acquire()
+        waited = time.monotonic() - started
+
+        self.counters["wait_total"] += waited
+        self.counters["wait_max"] = max(self.counters["wait_max"], waited)
+
+    def is_locked(self, user_id: int) -> bool:
+        entry = self._locks.get(user_id)
+        return bool(entry and entry.lock.locked())
+
+    def stats(self) -> dict:
+        # Only the counts: these stats are served on /metrics, which must not leak Telegram ids
+        hot = sorted(self._hot.values(), reverse=True)[:self.hot_report]
+        return {
+            **self.counters,
+            "active": len(self._locks),
+            "hot_contention": hot,
+        }
@@ -0,0 +1,98 @@
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_DOWN, ROUND_UP
+from typing import Union
+
+
+DECIMALS = {
+    "IDR": 0,
+    "BTC": 8,
+    "ETH": 18,
+    "BNB": 18,
+    "SOL": 9,
+    "USDT": 6,
+    "USDC": 6,
+}
+DEFAULT_DECIMALS = 8
+
+
+def decimals_for(currency: str) -> int:
+    return DECIMALS.get(currency, DEFAULT_DECIMALS)
+
+
+@dataclass(frozen=True, slots=True)
+class Amount:
+    """Exact amount stored as an integer count of the currency's smallest unit"""
+    units: int
+    currency: str
+    
+    @classmethod
+    def from_decimal(cls, value: Union[Decimal, int, str], currency: str, rounding: str = ROUND_DOWN) -> "Amount":
+        scaled = Decimal(value).scaleb(decimals_for(currency))
+        return cls(int(scaled.to_integral_value(rounding=rounding)), currency)
+    
+    @classmethod
+    def zero(cls, currency: str) -> "Amount":
+        return cls(0, currency)
+    
+    @classmethod
+    def parse(cls, data: str) -> "Amount":
+        currency, units = data.split(":", 1)
+        return cls(int(units), currency)
+    
+    def serialize(self) -> str:
+        return f"{self.currency}:{self.units}"
+    
+    def to_decimal(self) -> Decimal:
+        return Decimal(self.units).scaleb(-decimals_for(self.currency))
+    
+    def convert(self, rate: Decimal, currency: str, rounding: str = ROUND_DOWN) -> "Amount":
+        """Multiply by a rate into another currency, rounding once at the end"""
+        return Amount.from_decimal(self.to_decimal() * rate, currency, rounding)
+    
+    def _check(self, other: "Amount"):
+        if not isinstance(other, Amount) or other.currency != self.currency:
+            raise ValueError(f"Cannot combine {self.currency} with {other!r}")
+    
+    def __add__(self, other: "Amount") -> "Amount":
+        self._check(other)
+        return Amount(self.units + other.units, self.currency)
+    
+    def __sub__(self, other: "Amount") -> "Amount":
+        self._check(other)
+        return Amount(self.units - other.units, self.currency)
+    
+    def __neg__(self) -> "Amount":
+        return Amount(-self.units, self.currency)
+    
+    def __lt__(self, other: "Amount") -> bool:
+        self._check(other)
+        return self.units < other.units
+    
+    def __le__(self, other: "Amount") -> bool:
+        self._check(other)
+        return self.units <= other.units
+    
+    def __gt__(self, other: "Amount") -> bool:
+        self._check(other)
+        return self.units > other.units
+    
+    def __ge__(self, other: "Amount") -> bool:
+        self._check(other)
+        return self.units >= other.units
+    
+    def __bool__(self) -> bool:
+        return self.units != 0
+    
+    def __format__(self, spec: str) -> str:
+        return format(self.to_decimal().normalize(), spec)
+    
+    def __str__(self) -> str:
+        return f"{self.to_decimal()} {self.currency}"
+
+
+def idr(value: Union[Decimal, int, str], rounding: str = ROUND_DOWN) -> Amount:
+    return Amount.from_decimal(value, "IDR", rounding)
+
+
+def idr_ceil(value: Union[Decimal, int, str]) -> Amount:
+    return Amount.from_decimal(value, "IDR", ROUND_UP)
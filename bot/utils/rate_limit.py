@@ -0,0 +1,160 @@
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from bot.utils.state_table import UserStateTable
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBuckets(ABC):
+    """Per-user token buckets: refill at rate per second up to burst, each event spends its cost"""
+    
+    def __init__(self, rate: float, burst: float, notice_interval: float):
+        self.rate = rate
+        self.burst = burst
+        self.notice_interval = notice_interval
+        self.counters = {
+            "allowed": 0,
+            "rejected": 0,
+            "notices": 0,
+            "errors": 0,
+        }
+    
+    async def take(self, user_id: int, cost: float = 1) -> tuple[bool, bool]:
+        """Spend cost tokens; returns (allowed, notify) where notify is set once per notice_interval of rejections"""
+        try:
+            allowed, notify = await self._take(user_id, cost)
+        except Exception as e:
+            # Fail open: a broken shared store must not lock every user out
+            self.counters["errors"] += 1
+            logger.warning(f"Throttle store failed: {e}")
+            return True, False
+        
+        self.counters["allowed" if allowed else "rejected"] += 1
+        if notify:
+            self.counters["notices"] += 1
+        return allowed, notify
+    
+    @abstractmethod
+    async def _take(self, user_id: int, cost: float) -> tuple[bool, bool]:
+        ...
+    
+    async def close(self):
+        pass
+    
+    def stats(self) -> dict:
+        return dict(self.counters)
+
+
+class LocalTokenBuckets(TokenBuckets):
+    """Buckets in a fixed-size in-process table; limits are per worker process"""
+    
+    def __init__(self, capacity: int, rate: float, burst: float, notice_interval: float):
+        super().__init__(rate, burst, notice_interval)
+        self.table = UserStateTable(capacity, fields=("tokens", "updated", "noticed"))
+    
+    async def _take(self, user_id: int, cost: float) -> tuple[bool, bool]:
+        now = time.monotonic()
+        table = self.table
+        
+        updated = table.get(user_id, "updated")
+        if updated:
+            tokens = min(self.burst, table.get(user_id, "tokens") + (now - updated) * self.rate)
+        else:
+            tokens = self.burst
+        
+        allowed = tokens >= cost
+        notify = False
+        if allowed:
+            tokens -= cost
+        elif now - table.get(user_id, "noticed") >= self.notice_interval:
+            table.set(user_id, "noticed", now)
+            notify = True
+        
+        table.set(user_id, "tokens", tokens)
+        table.set(user_id, "updated", now)
+        return allowed, notify
+    
+    def stats(self) -> dict:
+        return {**self.counters, "store": "local", **self.table.stats()}
+
+
+# Same refill/spend rule as LocalTokenBuckets, atomic per key and timed by the Redis clock
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local notice_interval = tonumber(ARGV[4])
+
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated', 'noticed')
+local tokens = burst
+if state[2] then
+    tokens = math.min(burst, tonumber(state[1]) + (now - tonumber(state[2])) * rate)
+end
+local noticed = tonumber(state[3]) or 0
+
+local allowed = 0
+local notify = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+elseif now - noticed >= notice_interval then
+    noticed = now
+    notify = 1
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now, 'noticed', noticed)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return {allowed, notify}
+"""
+
+
+class RedisTokenBuckets(TokenBuckets):
+    """Buckets in Redis so every worker process enforces one shared limit"""
+    
+    def __init__(self, url: str, rate: float, burst: float, notice_interval: float, prefix: str = "throttle:"):
+        super().__init__(rate, burst, notice_interval)
+        self.prefix = prefix
+        self.client = aioredis.from_url(url)
+        self._script = self.client.register_script(TAKE_SCRIPT)
+        # A bucket idle this long is full again, so its key can go
+        self.key_ttl = max(1, math.ceil(burst / rate + notice_interval))
+    
+    async def _take(self, user_id: int, cost: float) -> tuple[bool, bool]:
+        allowed, notify = await self._script(
+            keys=[f"{self.prefix}{user_id}"],
+            args=[self.rate, self.burst, cost, self.notice_interval, self.key_ttl],
+        )
+        return bool(allowed), bool(notify)
+    
+    async def close(self):
+        await self.client.aclose()
+    
+    def stats(self) -> dict:
+        return {**self.counters, "store": "redis"}
+
+
+def create_token_buckets(
+    capacity: int,
+    rate: float,
+    burst: float,
+    notice_interval: float,
+    redis_url: Optional[str] = None,
+) -> TokenBuckets:
+    if redis_url:
+        if aioredis is not None:
+            return RedisTokenBuckets(redis_url, rate, burst, notice_interval)
+        logger.warning("REDIS_URL is set but the redis package is not installed; throttling per process")
+    
+    return LocalTokenBuckets(capacity, rate, burst, notice_interval)
@@ -0,0 +1,73 @@
+import sys
+from array import array
+from collections import OrderedDict
+from typing import Iterable
+
+
+# OrderedDict keeps a linked-list node per key on top of its hash table
+_ORDER_NODE_BYTES = 40
+_KEY_BYTES = sys.getsizeof(2 ** 40)
+
+
+class UserStateTable:
+    """Fixed-capacity per-user float columns keyed by telegram id, evicting the least recently used"""
+    
+    def __init__(self, capacity: int = 10000, fields: Iterable[str] = ("last_seen",)):
+        self.capacity = capacity
+        self._fields = {name: i for i, name in enumerate(fields)}
+        self._columns = [array("d", bytes(8 * capacity)) for _ in self._fields]
+        self._slots: OrderedDict[int, int] = OrderedDict()
+        self._free = list(range(capacity - 1, -1, -1))
+        self.evictions = 0
+    
+    def __len__(self) -> int:
+        return len(self._slots)
+    
+    def __contains__(self, telegram_id: int) -> bool:
+        return telegram_id in self._slots
+    
+    def get(self, telegram_id: int, field: str, default: float = 0.0) -> float:
+        slot = self._slots.get(telegram_id)
+        if slot is None:
+            return default
+        
+        self._slots.move_to_end(telegram_id)
+        return self._columns[self._fields[field]][slot]
+    
+    def set(self, telegram_id: int, field: str, value: float):
+        self._columns[self._fields[field]][self._slot(telegram_id)] = value
+    
+    def _slot(self, telegram_id: int) -> int:
+        slot = self._slots.get(telegram_id)
+        if slot is not None:
+            self._slots.move_to_end(telegram_id)
+            return slot
+        
+        if self._free:
+            slot = self._free.pop()
+        else:
+            _, slot = self._slots.popitem(last=False)
+            self.evictions += 1
+        
+        for column in self._columns:
+            column[slot] = 0.0
+        self._slots[telegram_id] = slot
+        return slot
+    
+    def memory_bytes(self) -> int:
+        # Telegram ids are full int objects; the columns themselves never grow
+        keys = len(self._slots) * (_KEY_BYTES + _ORDER_NODE_BYTES)
+        return (
+            sum(column.buffer_info()[1] * column.itemsize for column in self._columns)
+            + sys.getsizeof(self._slots)
+            + sys.getsizeof(self._free)
+            + keys
+        )
+    
+    def stats(self) -> dict:
+        return {
+            "size": len(self._slots),
+            "capacity": self.capacity,
+            "evictions": self.evictions,
+            "memory_bytes": self.memory_bytes(),
+        }
@@ -1,69 +1,73 @@
 import logging
 import json
-from decimal import Decimal
+from typing import Optional
 from aiohttp import web
 from prisma import Prisma
 
 from bot.services.oxapay import OxaPayService
-from bot.db.queries import update_balance
+from bot.services.cryptobot import CryptoBotService
+from bot.workers.webhooks import WebhookProcessor
 from bot.config import config
 
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+MAX_WEBHOOK_BODY = 64 * 1024
+
+
+async def read_body(request: web.Request, limit: int = MAX_WEBHOOK_BODY) -> Optional[bytes]:
+    """Read the raw body once, or None when it exceeds the limit"""
+    if request.content_length is not None and request.content_length > limit:
+        return None
+    
+    body = bytearray()
+    while True:
+        chunk = await request.content.read(limit + 1 - len(body))
+        if not chunk:
+            return bytes(body)
+        body.extend(chunk)
+        if len(body) > limit:
+            return None
+
 
 async def handle_oxapay_webhook(request: web.Request) -> web.Response:
     try:
         signature = request.headers.get("X-OxaPay-Signature", "")
-        body = await request.json()
+        raw_body = await read_body(request)
         
-        logger.info(f"Received webhook: {json.dumps(body)}")
+        if raw_body is None:
+            return web.json_response({"error": "Payload too large"}, status=413)
         
-        oxapay = OxaPayService(
-            merchant_api_key=config.oxapay.merchant_api_key,
-            payout_api_key=config.oxapay.payout_api_key,
-            webhook_secret=config.oxapay.webhook_secret,
-        )
+        oxapay: OxaPayService = request.app["oxapay"]
         
-        if config.oxapay.webhook_secret and signature:
-            if not oxapay.verify_webhook(body, signature):
-                logger.warning("Invalid webhook signature")
+        if config.oxapay.webhook_secret:
+            if not signature or not oxapay.verify_webhook(raw_body, signature):
+                logger.warning("Missing or invalid webhook signature")
                 return web.json_response({"error": "Invalid signature"}, status=401)
         
+        try:
+            body = json_loads(raw_body)
+        except ValueError:
+            return web.json_response({"error": "Invalid JSON"}, status=400)
+        
+        if not isinstance(body, dict):
+            return web.json_response({"error": "Invalid JSON"}, status=400)
+        
         status = body.get("status")
         track_id = body.get("trackId")
-        order_id = body.get("orderId", "")
         
         if not track_id:
             return web.json_response({"error": "Missing trackId"}, status=400)
         
-        db: Prisma = request.app["db"]
-        
-        if order_id.startswith("SELL_"):
-            order = await db.cryptoorder.find_first(
-                where={"oxapayPaymentId": track_id},
-                include={"user": True}
-            )
-            
-            if order and status == "Paid":
-                await db.cryptoorder.update(
-                    where={"id": order.id},
-                    data={"status": "COMPLETED"}
-                )
-                
-                await update_balance(db, order.userId, order.fiatAmount)
-                
-                await db.transaction.create(
-                    data={
-                        "userId": order.userId,
-                        "type": "SELL",
-                        "amount": order.fiatAmount,
-                        "status": "COMPLETED",
-                        "description": f"Jual {order.cryptoAmount} {order.coinSymbol}",
-                        "metadata": {"orderId": order.id},
-                    }
-                )
-                
-                logger.info(f"Sell order {order.id} completed, added {order.fiatAmount} to balance")
+        logger.info(f"Received OxaPay webhook {track_id}: {status}")
+        
+        webhooks: WebhookProcessor = request.app["webhooks"]
+        await webhooks.ingest("oxapay", f"{track_id}:{status}", body)
         
         return web.json_response({"status": "ok"})
         
@@ -72,22 +76,90 @@ async def handle_oxapay_webhook(request: web.Request) -> web.Response:
         return web.json_response({"error": str(e)}, status=500)
 
 
+async def handle_cryptobot_webhook(request: web.Request) -> web.Response:
+    try:
+        signature = request.headers.get("crypto-pay-api-signature", "")
+        raw_body = await read_body(request)
+        
+        if raw_body is None:
+            return web.json_response({"error": "Payload too large"}, status=413)
+        
+        cryptobot: CryptoBotService = request.app["cryptobot"]
+        
+        if not cryptobot.verify_webhook(raw_body, signature):
+            logger.warning("Invalid CryptoBot webhook signature")
+            return web.json_response({"error": "Invalid signature"}, status=401)
+        
+        try:
+            body = json_loads(raw_body)
+        except ValueError:
+            return web.json_response({"error": "Invalid JSON"}, status=400)
+        
+        if not isinstance(body, dict):
+            return web.json_response({"error": "Invalid JSON"}, status=400)
+        
+        update_type = body.get("update_type")
+        invoice = body.get("payload") or {}
+        invoice_id = invoice.get("invoice_id")
+        
+        if update_type != "invoice_paid" or not invoice_id:
+            return web.json_response({"status": "ok"})
+        
+        logger.info(f"Received CryptoBot webhook for invoice {invoice_id}")
+        
+        webhooks: WebhookProcessor = request.app["webhooks"]
+        await webhooks.ingest("cryptobot", f"{invoice_id}:paid", invoice)
+        
+        return web.json_response({"status": "ok"})
+        
+    except Exception as e:
+        logger.error(f"CryptoBot webhook error: {str(e)}")
+        return web.json_response({"error": str(e)}, status=500)
+
+
 async def health_check(request: web.Request) -> web.Response:
     return web.json_response({"status": "healthy"})
 
 
-async def create_webhook_app(db: Prisma) -> web.Application:
+async def metrics(request: web.Request) -> web.Response:
+    sources = request.app.get("metrics", {})
+    return web.json_response({name: collect() for name, collect in sources.items()})
+
+
+async def create_webhook_app(
+    db: Prisma,
+    oxapay: OxaPayService,
+    cryptobot: CryptoBotService,
+    webhooks: WebhookProcessor,
+) -> web.Application:
     app = web.Application()
     app["db"] = db
+    app["oxapay"] = oxapay
+    app["cryptobot"] = cryptobot
+    app["webhooks"] = webhooks
+    app["metrics"] = {
+        "oxapay": oxapay.transport.stats,
+        "cryptobot": cryptobot.transport.stats,
+        "webhooks": webhooks.stats,
+    }
     
     app.router.add_post("/webhook/oxapay", handle_oxapay_webhook)
+    app.router.add_post("/webhook/cryptobot", handle_cryptobot_webhook)
     app.router.add_get("/health", health_check)
+    app.router.add_get("/metrics", metrics)
     
     return app
 
 
-async def run_webhook_server(db: Prisma, host: str = "0.0.0.0", port: int = 8080):
-    app = await create_webhook_app(db)
+async def run_webhook_server(
+    db: Prisma,
+    oxapay: OxaPayService,
+    cryptobot: CryptoBotService,
+    webhooks: WebhookProcessor,
+    host: str = "0.0.0.0",
+    port: int = 8080,
+):
+    app = await create_webhook_app(db, oxapay, cryptobot, webhooks)
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, host, port)
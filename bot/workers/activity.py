@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from prisma import Prisma
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityTracker:
+    """Collects lastActiveAt bumps in memory and writes them back in bulk"""
+    
+    def __init__(self, db: Prisma, flush_interval: float = 5, max_batch: int = 5000):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending: dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {
+            "touched": 0,
+            "flushes": 0,
+            "rows": 0,
+            "failures": 0,
+            "last_batch": 0,
+            "max_batch": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+        }
+    
+    async def start(self):
+        if self._task and not self._task.done():
+            return
+        
+        self._task = asyncio.create_task(self._run(), name="activity-tracker")
+        logger.info("Activity tracker started")
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        
+        await self.flush()
+        logger.info("Activity tracker stopped")
+    
+    def stats(self) -> dict:
+        return {**self.counters, "pending": len(self._pending)}
+    
+    def touch(self, user_id: str, at: Optional[datetime] = None):
+        self._merge(user_id, at or datetime.now(timezone.utc))
+        self.counters["touched"] += 1
+    
+    def _merge(self, user_id: str, at: datetime):
+        current = self._pending.get(user_id)
+        if current is None or at > current:
+            self._pending[user_id] = at
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Activity flush failed: {e}")
+    
+    async def flush(self):
+        if not self._pending:
+            return
+        
+        pending, self._pending = self._pending, {}
+        items = list(pending.items())
+        
+        for start in range(0, len(items), self.max_batch):
+            chunk = items[start:start + self.max_batch]
+            try:
+                await self._write(chunk)
+            except BaseException as e:
+                # Cancelled mid-write too: stop() flushes again, so the swapped-out batch must not be lost
+                if not isinstance(e, asyncio.CancelledError):
+                    self.counters["failures"] += 1
+                for user_id, at in items[start:]:
+                    self._merge(user_id, at)
+                raise
+    
+    async def _write(self, chunk: list[tuple[str, datetime]]):
+        values = []
+        params = []
+        for i, (user_id, at) in enumerate(chunk):
+            values.append(f"(${i * 2 + 1}::text, ${i * 2 + 2}::timestamp)")
+            params.extend([user_id, at.astimezone(timezone.utc).replace(tzinfo=None).isoformat()])
+        
+        started = time.monotonic()
+        rows = await self.db.execute_raw(
+            f"""
+            UPDATE users AS u
+            SET last_active_at = v.at
+            FROM (VALUES {", ".join(values)}) AS v(id, at)
+            WHERE u.id = v.id AND u.last_active_at < v.at
+            """,
+            *params,
+        )
+        elapsed_ms = (time.monotonic() - started) * 1000
+        
+        self.counters["flushes"] += 1
+        self.counters["rows"] += rows
+        self.counters["last_batch"] = len(chunk)
+        self.counters["max_batch"] = max(self.counters["max_batch"], len(chunk))
+        self.counters["last_flush_ms"] = round(elapsed_ms, 2)
+        self.counters["max_flush_ms"] = max(self.counters["max_flush_ms"], round(elapsed_ms, 2))
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from typing import Optional
+
+from aiogram import Bot
+from prisma import Prisma
+from prisma.models import Deposit
+
+from bot.db.queries import get_pending_cryptobot_deposits, complete_deposit, fail_deposits, unit_of_work
+from bot.formatters.messages import Emoji
+from bot.services.cryptobot import CryptoBotService
+
+logger = logging.getLogger(__name__)
+
+
+class DepositPoller:
+    """Fallback for missed CryptoBot webhooks: settles open invoices in batches"""
+    
+    def __init__(
+        self,
+        db: Prisma,
+        cryptobot: CryptoBotService,
+        bot: Optional[Bot] = None,
+        interval: float = 60,
+        chunk_size: int = 100,
+    ):
+        self.db = db
+        self.cryptobot = cryptobot
+        self.bot = bot
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {
+            "runs": 0,
+            "requests": 0,
+            "checked": 0,
+            "credited": 0,
+            "expired": 0,
+            "api_errors": 0,
+        }
+    
+    async def start(self):
+        if not self.cryptobot.api_token or (self._task and not self._task.done()):
+            return
+        
+        self._task = asyncio.create_task(self._run(), name="deposit-poller")
+        logger.info("CryptoBot deposit poller started")
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("CryptoBot deposit poller stopped")
+    
+    def stats(self) -> dict:
+        return dict(self.counters)
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.error(f"Deposit poll failed: {e}")
+    
+    async def poll(self):
+        self.counters["runs"] += 1
+        after_id: Optional[str] = None
+        
+        while True:
+            deposits = await get_pending_cryptobot_deposits(self.db, after_id, self.chunk_size)
+            if not deposits:
+                break
+            
+            after_id = deposits[-1].id
+            await self._settle(deposits)
+            
+            if len(deposits) < self.chunk_size:
+                break
+    
+    async def _settle(self, deposits: list[Deposit]):
+        by_invoice = {deposit.cryptobotInvoiceId: deposit for deposit in deposits}
+        
+        self.counters["requests"] += 1
+        invoices = await self.cryptobot.get_invoices(list(by_invoice))
+        
+        if invoices is None:
+            self.counters["api_errors"] += 1
+            return
+        
+        self.counters["checked"] += len(invoices)
+        paid = []
+        expired = []
+        
+        for invoice in invoices:
+            deposit = by_invoice.get(str(invoice.get("invoice_id")))
+            if not deposit:
+                continue
+            
+            if invoice.get("status") == "paid":
+                paid.append(deposit)
+            elif invoice.get("status") == "expired":
+                expired.append(deposit.id)
+        
+        credited = []
+        if paid:
+            async with unit_of_work(self.db) as tx:
+                for deposit in paid:
+                    if await complete_deposit(tx, deposit):
+                        credited.append(deposit)
+        
+        if expired:
+            self.counters["expired"] += await fail_deposits(self.db, expired)
+        
+        self.counters["credited"] += len(credited)
+        
+        for deposit in credited:
+            await self._notify(
+                deposit.user.telegramId,
+                f"{Emoji.CHECK} <b>Deposit Berhasil!</b>\n\n"
+                f"Saldo Anda telah ditambah <b>Rp {deposit.amount:,.0f}</b>",
+            )
+    
+    async def _notify(self, chat_id: int, text: str):
+        if not self.bot:
+            return
+        
+        try:
+            await self.bot.send_message(chat_id, text, parse_mode="HTML")
+        except Exception as e:
+            logger.warning(f"Failed to notify {chat_id}: {e}")
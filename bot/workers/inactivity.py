@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from prisma import Prisma
+
+from bot.db.queries import mark_inactive_users
+from bot.workers.activity import ActivityTracker
+
+logger = logging.getLogger(__name__)
+
+
+class InactivitySweeper:
+    """Periodically marks users INACTIVE once they have been away for inactive_days"""
+    
+    def __init__(
+        self,
+        db: Prisma,
+        activity: ActivityTracker,
+        interval: float = 3600,
+        inactive_days: int = 180,
+        batch_size: int = 1000,
+    ):
+        self.db = db
+        self.activity = activity
+        self.interval = interval
+        self.inactive_days = inactive_days
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {
+            "runs": 0,
+            "batches": 0,
+            "marked": 0,
+            "last_marked": 0,
+        }
+    
+    async def start(self):
+        if self._task and not self._task.done():
+            return
+        
+        self._task = asyncio.create_task(self._run(), name="inactivity-sweeper")
+        logger.info("Inactivity sweeper started")
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Inactivity sweeper stopped")
+    
+    def stats(self) -> dict:
+        return dict(self.counters)
+    
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Inactivity sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+    
+    async def sweep(self) -> int:
+        # Pending touches must land first or a returning user could be swept
+        await self.activity.flush()
+        
+        self.counters["runs"] += 1
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=self.inactive_days)
+        after_id = ""
+        marked = 0
+        
+        while True:
+            rows = await mark_inactive_users(self.db, cutoff, after_id, self.batch_size)
+            self.counters["batches"] += 1
+            if not rows:
+                break
+            
+            # A short batch is not the end: the UPDATE re-checks status, so rows touched meanwhile drop out
+            marked += len(rows)
+            after_id = max(row["id"] for row in rows)
+        
+        self.counters["marked"] += marked
+        self.counters["last_marked"] = marked
+        if marked:
+            logger.info(f"Marked {marked} users inactive")
+        return marked
@@ -0,0 +1,239 @@
+import asyncio
+import logging
+
+from aiogram import Bot
+from prisma import Prisma
+
+from bot.config import config
+from bot.db.queries import (
+    claim_payout_job,
+    mark_stalled_payout_jobs,
+    finish_payout_job,
+    record_payout_reference,
+    complete_buy_order,
+    fail_buy_order,
+)
+from bot.formatters.messages import format_transaction_success, format_error, Emoji
+from bot.keyboards.inline import get_back_keyboard
+from bot.services.oxapay import OxaPayService
+
+logger = logging.getLogger(__name__)
+
+
+def payout_reference(order_id: str) -> str:
+    """Description sent with every payout, so an unanswered payout can be found in OxaPay's history"""
+    return f"Order {order_id}"
+
+
+class PayoutWorker:
+    """Executes queued buy payouts with a bounded pool of workers"""
+    
+    def __init__(
+        self,
+        db: Prisma,
+        oxapay: OxaPayService,
+        bot: Bot,
+        concurrency: int = 3,
+        lease_seconds: int = 120,
+        poll_interval: float = 5,
+    ):
+        self.db = db
+        self.oxapay = oxapay
+        self.bot = bot
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks: list[asyncio.Task] = []
+        self.counters = {
+            "claimed": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "stalled": 0,
+            "in_flight": 0,
+        }
+    
+    async def start(self):
+        if self._tasks:
+            return
+        
+        self._stopping = False
+        await self._sweep_stalled()
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"payout-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        logger.info(f"Payout worker started with {self.concurrency} slots")
+    
+    async def stop(self, timeout: float = 30):
+        if not self._tasks:
+            return
+        
+        self._stopping = True
+        self._wakeup.set()
+        
+        done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        
+        self._tasks = []
+        logger.info("Payout worker stopped")
+    
+    def notify(self):
+        self._wakeup.set()
+    
+    def stats(self) -> dict:
+        return {**self.counters, "concurrency": self.concurrency}
+    
+    async def _run(self):
+        while not self._stopping:
+            try:
+                job = await claim_payout_job(self.db, self.lease_seconds)
+            except Exception as e:
+                logger.error(f"Failed to claim payout job: {e}")
+                job = None
+            
+            if job:
+                self.counters["claimed"] += 1
+                await self._execute(job)
+                continue
+            
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                await self._sweep_stalled()
+    
+    async def _sweep_stalled(self):
+        try:
+            stalled = await mark_stalled_payout_jobs(self.db)
+        except Exception as e:
+            logger.error(f"Failed to sweep stalled payout jobs: {e}")
+            return
+        
+        for job in stalled:
+            self.counters["stalled"] += 1
+            logger.warning(f"Payout job {job['id']} for order {job['order_id']} stalled, needs manual review")
+            await self._notify_admins(
+                f"{Emoji.WARNING} <b>Payout Perlu Dicek</b>\n\n"
+                f"Payout untuk order <code>{job['order_id']}</code> terhenti di tengah proses.\n"
+                f"Reconciler akan mengecek otomatis; jika tidak ditemukan gunakan "
+                f"/resolve_payout {job['order_id']} [sent|refund]."
+            )
+    
+    async def _execute(self, job: dict):
+        self.counters["in_flight"] += 1
+        try:
+            await self._process(job)
+        except Exception as e:
+            logger.error(f"Payout job {job['id']} crashed: {e}")
+        finally:
+            self.counters["in_flight"] -= 1
+    
+    async def _process(self, job: dict):
+        order = await self.db.cryptoorder.find_unique(where={"id": job["order_id"]})
+        
+        if not order or order.status != "PROCESSING":
+            await finish_payout_job(self.db, job["id"], "FAILED", "Order is not processing")
+            return
+        
+        result = await self.oxapay.create_payout(
+            address=order.walletAddress,
+            amount=order.cryptoAmount,
+            currency=order.coinSymbol,
+            network=order.network,
+            description=payout_reference(order.id),
+        )
+        
+        if result.payout_id:
+            await record_payout_reference(self.db, order.id, result.payout_id)
+        
+        if result.success:
+            moved, captured = await complete_buy_order(
+                self.db,
+                order,
+                {"oxapayPayoutId": result.payout_id, "txHash": result.tx_hash},
+            )
+            
+            if not moved:
+                await self._finish_settled(job, order.id, sent=True)
+            elif not captured:
+                logger.error(f"Payout for order {order.id} sent but its hold could not be captured")
+                await self._notify_admins(
+                    f"{Emoji.WARNING} <b>Saldo Tidak Terpotong</b>\n\n"
+                    f"Payout order <code>{order.id}</code> terkirim, tetapi saldo user tidak bisa dipotong.\n"
+                    f"Cek saldo user secara manual."
+                )
+            
+            self.counters["succeeded"] += 1
+            
+            await self._edit_message(
+                job,
+                format_transaction_success("Beli Crypto", order.fiatAmount) +
+                f"\n\nAnda menerima: <b>{order.cryptoAmount:.8f} {order.coinSymbol}</b>\n"
+                f"Ke: <code>{order.walletAddress[:20]}...</code>",
+            )
+        elif result.uncertain:
+            # The payout may have gone out: keep the hold and the order until it is reconciled
+            await finish_payout_job(self.db, job["id"], "STALLED", result.error)
+            self.counters["stalled"] += 1
+            logger.warning(f"Payout for order {order.id} has an unknown outcome: {result.error}")
+            
+            await self._notify_admins(
+                f"{Emoji.WARNING} <b>Payout Perlu Dicek</b>\n\n"
+                f"Payout untuk order <code>{order.id}</code> tidak mendapat jawaban pasti dari OxaPay.\n"
+                f"Reconciler akan mengecek otomatis; jika tidak ditemukan gunakan "
+                f"/resolve_payout {order.id} [sent|refund]."
+            )
+            await self._edit_message(
+                job,
+                f"{Emoji.CLOCK} <b>Pembelian Sedang Diverifikasi</b>\n\n"
+                f"Status pengiriman belum dapat dipastikan. Saldo Anda ditahan sampai pengecekan selesai.",
+            )
+        elif await fail_buy_order(self.db, order, result.error):
+            self.counters["failed"] += 1
+            
+            await self._edit_message(job, format_error(f"Payout gagal: {result.error}"))
+        else:
+            await self._finish_settled(job, order.id, sent=False)
+    
+    async def _finish_settled(self, job: dict, order_id: str, sent: bool):
+        # The reconciler, a webhook or an admin settled the order first; close the job to match so it never stalls
+        current = await self.db.cryptoorder.find_unique(where={"id": order_id})
+        status = current.status if current else "MISSING"
+        
+        if status == "COMPLETED":
+            await finish_payout_job(self.db, job["id"], "SUCCEEDED")
+        else:
+            await finish_payout_job(self.db, job["id"], "FAILED", f"Order already {status}")
+        logger.warning(f"Payout job {job['id']} found order {order_id} already {status}")
+        
+        if sent and status != "COMPLETED":
+            await self._notify_admins(
+                f"{Emoji.WARNING} <b>Payout Terkirim, Order Sudah Ditutup</b>\n\n"
+                f"Payout order <code>{order_id}</code> terkirim, tetapi order sudah berstatus {status}.\n"
+                f"Cek apakah saldo user sudah dikembalikan."
+            )
+    
+    async def _edit_message(self, job: dict, text: str):
+        if not job.get("chat_id") or not job.get("message_id"):
+            return
+        
+        try:
+            await self.bot.edit_message_text(
+                text,
+                chat_id=int(job["chat_id"]),
+                message_id=int(job["message_id"]),
+                reply_markup=get_back_keyboard(),
+                parse_mode="HTML"
+            )
+        except Exception as e:
+            logger.warning(f"Failed to update payout message for job {job['id']}: {e}")
+    
+    async def _notify_admins(self, text: str):
+        for admin_id in config.bot.admin_ids:
+            try:
+                await self.bot.send_message(admin_id, text, parse_mode="HTML")
+            except Exception:
+                pass
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from prisma import Prisma
+from prisma.models import CryptoOrder
+
+from bot.db.queries import (
+    get_open_orders_page,
+    transition_orders,
+    update_balance,
+    record_payout_reference,
+    complete_buy_order,
+    fail_buy_order,
+    unit_of_work,
+)
+from bot.services.oxapay import OxaPayService
+from bot.services.transport import CircuitBreaker
+from bot.workers.payouts import payout_reference
+
+logger = logging.getLogger(__name__)
+
+
+OPEN_STATUSES = ["PROCESSING", "AWAITING_PAYMENT", "AWAITING_CRYPTO"]
+
+ACTIVE_JOB_STATUSES = ("QUEUED", "RUNNING")
+
+PAYOUT_TRANSITIONS = {
+    "Complete": "COMPLETED",
+    "Confirmed": "COMPLETED",
+    "Rejected": "FAILED",
+    "Canceled": "FAILED",
+    "Failed": "FAILED",
+}
+
+PAYMENT_TRANSITIONS = {
+    "Paid": "COMPLETED",
+    "Expired": "EXPIRED",
+    "Failed": "FAILED",
+}
+
+
+class OrderReconciler:
+    """Periodically re-checks open orders against OxaPay and applies the resulting transitions"""
+    
+    def __init__(
+        self,
+        db: Prisma,
+        oxapay: OxaPayService,
+        interval: float = 60,
+        batch_size: int = 200,
+        concurrency: int = 5,
+    ):
+        self.db = db
+        self.oxapay = oxapay
+        self.interval = interval
+        self.batch_size = batch_size
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {
+            "runs": 0,
+            "scanned": 0,
+            "checked": 0,
+            "transitions": 0,
+            "api_errors": 0,
+            "unmatched_payouts": 0,
+        }
+        self.last_run = {
+            "started_at": 0.0,
+            "duration": 0.0,
+            "checked": 0,
+            "throughput": 0.0,
+            "oldest_open_age": 0.0,
+        }
+    
+    async def start(self):
+        if self._task and not self._task.done():
+            return
+        
+        self._task = asyncio.create_task(self._run(), name="order-reconciler")
+        logger.info("Order reconciler started")
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Order reconciler stopped")
+    
+    def stats(self) -> dict:
+        return {**self.counters, "last_run": dict(self.last_run)}
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Order reconciliation failed: {e}")
+    
+    async def reconcile(self):
+        started = time.monotonic()
+        now = datetime.now(timezone.utc)
+        checked = 0
+        oldest_open: Optional[datetime] = None
+        after_id: Optional[str] = None
+        
+        while True:
+            orders = await get_open_orders_page(self.db, OPEN_STATUSES, after_id, self.batch_size)
+            if not orders:
+                break
+            
+            after_id = orders[-1].id
+            self.counters["scanned"] += len(orders)
+            
+            trackable = [order for order in orders if self._reconcilable(order)]
+            statuses = await asyncio.gather(*(self._check(order) for order in trackable))
+            checked += len(trackable)
+            
+            moves = []
+            for order, remote_status in zip(trackable, statuses):
+                target = self._target_status(order, remote_status)
+                if target:
+                    moves.append((order, target))
+                elif oldest_open is None or order.createdAt < oldest_open:
+                    oldest_open = order.createdAt
+            
+            await self._apply(moves)
+            
+            if len(orders) < self.batch_size:
+                break
+            
+            if self.oxapay.transport.breaker.state == CircuitBreaker.OPEN:
+                logger.warning("OxaPay circuit is open, cutting reconciliation short")
+                break
+        
+        duration = time.monotonic() - started
+        self.counters["runs"] += 1
+        self.counters["checked"] += checked
+        self.last_run = {
+            "started_at": time.time() - duration,
+            "duration": round(duration, 3),
+            "checked": checked,
+            "throughput": round(checked / duration, 2) if duration else 0.0,
+            "oldest_open_age": (now - oldest_open).total_seconds() if oldest_open else 0.0,
+        }
+    
+    def _reconcilable(self, order: CryptoOrder) -> bool:
+        if order.orderType != "BUY":
+            return bool(order.oxapayPaymentId)
+        
+        # A queued or running job still owns the payout; only stalled or orphaned buys are ours
+        job = order.payoutJob
+        return order.status == "PROCESSING" and not (job and job.status in ACTIVE_JOB_STATUSES)
+    
+    async def _check(self, order: CryptoOrder) -> Optional[str]:
+        async with self._semaphore:
+            if order.orderType != "BUY":
+                info = await self.oxapay.get_payment_status(order.oxapayPaymentId)
+            elif order.oxapayPayoutId:
+                info = await self.oxapay.get_payout_status(order.oxapayPayoutId)
+            else:
+                return await self._find_payout(order)
+        
+        if not info:
+            self.counters["api_errors"] += 1
+            return None
+        
+        return info.get("status")
+    
+    async def _find_payout(self, order: CryptoOrder) -> Optional[str]:
+        # No trackId came back, so look the payout up by the reference it was sent with
+        payout = await self.oxapay.find_payout(payout_reference(order.id), order.coinSymbol, order.createdAt)
+        if not payout:
+            self.counters["unmatched_payouts"] += 1
+            return None
+        
+        if payout.get("track_id"):
+            await record_payout_reference(self.db, order.id, str(payout["track_id"]))
+        return payout.get("status")
+    
+    def _target_status(self, order: CryptoOrder, remote_status: Optional[str]) -> Optional[str]:
+        if not remote_status:
+            return None
+        
+        transitions = PAYOUT_TRANSITIONS if order.orderType == "BUY" else PAYMENT_TRANSITIONS
+        target = transitions.get(remote_status)
+        
+        if target == order.status:
+            return None
+        
+        return target
+    
+    async def _apply(self, moves: list[tuple[CryptoOrder, str]]):
+        if not moves:
+            return
+        
+        payments = [(order, target) for order, target in moves if order.orderType != "BUY"]
+        payouts = [(order, target) for order, target in moves if order.orderType == "BUY"]
+        moved_count = 0
+        uncaptured = []
+        
+        async with unit_of_work(self.db) as tx:
+            moved = set(await transition_orders(
+                tx,
+                [(order.id, order.status, target) for order, target in payments],
+            ))
+            
+            for order, target in payments:
+                if order.id not in moved or order.orderType != "SELL" or target != "COMPLETED":
+                    continue
+                
+                await update_balance(tx, order.userId, order.fiatAmount)
+                await tx.transaction.create(
+                    data={
+                        "userId": order.userId,
+                        "type": "SELL",
+                        "amount": order.fiatAmount,
+                        "status": "COMPLETED",
+                        "description": f"Jual {order.cryptoAmount} {order.coinSymbol}",
+                        "orderId": order.id,
+                    }
+                )
+            moved_count += len(moved)
+            
+            for order, target in payouts:
+                if target == "COMPLETED":
+                    done, captured = await complete_buy_order(tx, order)
+                    if done and not captured:
+                        uncaptured.append(order.id)
+                else:
+                    done = await fail_buy_order(tx, order, "Rejected by OxaPay")
+                moved_count += done
+        
+        for order_id in uncaptured:
+            logger.error(f"Reconciled payout for order {order_id} but its hold could not be captured")
+        
+        self.counters["transitions"] += moved_count
+        if moved_count:
+            logger.info(f"Reconciled {moved_count} orders")
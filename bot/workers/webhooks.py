@@ -0,0 +1,273 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from aiogram import Bot
+from cachetools import LRUCache
+from prisma import Prisma
+from prisma.models import WebhookEvent
+
+from bot.config import config
+from bot.db.queries import (
+    record_webhook_event,
+    get_pending_webhook_events,
+    retry_webhook_event,
+    complete_deposit,
+    update_balance,
+    transition_status,
+    unit_of_work,
+)
+from bot.formatters.messages import Emoji
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookProcessor:
+    """Dedupes and persists provider callbacks, then applies them off the request path"""
+    
+    def __init__(
+        self,
+        db: Prisma,
+        bot: Optional[Bot] = None,
+        queue_size: int = 10000,
+        seen_size: int = 50000,
+        max_attempts: int = 8,
+        retry_delay: float = 5,
+        max_retry_delay: float = 900,
+        retry_interval: float = 30,
+    ):
+        self.db = db
+        self.bot = bot
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.retry_interval = retry_interval
+        self._queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self._seen: LRUCache = LRUCache(maxsize=seen_size)
+        self._task: Optional[asyncio.Task] = None
+        self._overflowed = False
+        self._appliers = {
+            "oxapay": self._apply_oxapay,
+            "cryptobot": self._apply_cryptobot,
+        }
+        self.counters = {
+            "received": 0,
+            "duplicates": 0,
+            "applied": 0,
+            "ignored": 0,
+            "retried": 0,
+            "failed": 0,
+        }
+    
+    async def start(self):
+        if self._task and not self._task.done():
+            return
+        
+        await self._requeue_pending()
+        self._task = asyncio.create_task(self._run(), name="webhook-processor")
+        logger.info("Webhook processor started")
+    
+    async def stop(self, timeout: float = 10):
+        if not self._task:
+            return
+        
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Webhook processor stopped with {self._queue.qsize()} events pending")
+        
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Webhook processor stopped")
+    
+    def stats(self) -> dict:
+        return {**self.counters, "queued": self._queue.qsize()}
+    
+    async def ingest(self, provider: str, key: str, payload: dict) -> bool:
+        """Record an incoming event; returns False when it was already seen"""
+        self.counters["received"] += 1
+        idempotency_key = f"{provider}:{key}"
+        
+        if idempotency_key in self._seen:
+            self.counters["duplicates"] += 1
+            return False
+        
+        event = await record_webhook_event(self.db, provider, idempotency_key, payload)
+        self._seen[idempotency_key] = True
+        
+        if not event:
+            self.counters["duplicates"] += 1
+            return False
+        
+        self._enqueue(event.id)
+        return True
+    
+    def _enqueue(self, event_id: str):
+        try:
+            self._queue.put_nowait(event_id)
+        except asyncio.QueueFull:
+            self._overflowed = True
+    
+    async def _requeue_pending(self):
+        self._overflowed = False
+        try:
+            events = await get_pending_webhook_events(self.db, limit=self._queue.maxsize)
+        except Exception as e:
+            logger.error(f"Failed to requeue pending webhook events: {e}")
+            return
+        
+        for event in events:
+            self._enqueue(event.id)
+    
+    async def _run(self):
+        while True:
+            try:
+                event_id = await asyncio.wait_for(self._queue.get(), timeout=self.retry_interval)
+            except asyncio.TimeoutError:
+                # Idle: pick up events whose retry backoff has elapsed
+                await self._requeue_pending()
+                continue
+            
+            try:
+                await self._process(event_id)
+            except Exception as e:
+                logger.error(f"Webhook event {event_id} failed: {e}")
+            finally:
+                self._queue.task_done()
+            
+            if self._overflowed and self._queue.empty():
+                await self._requeue_pending()
+    
+    async def _process(self, event_id: str):
+        event = await self.db.webhookevent.find_unique(where={"id": event_id})
+        if not event or event.status != "PENDING" or event.nextAttemptAt > datetime.now(timezone.utc):
+            return
+        
+        applier = self._appliers.get(event.provider)
+        notices: list[tuple[int, str]] = []
+        
+        try:
+            async with unit_of_work(self.db) as tx:
+                claimed = await transition_status(
+                    tx,
+                    "webhookevent",
+                    event.id,
+                    "PENDING",
+                    "APPLIED",
+                    {"processedAt": datetime.now(timezone.utc)},
+                )
+                if not claimed:
+                    return
+                
+                applied = await applier(tx, event, notices) if applier else False
+                
+                if not applied:
+                    await tx.webhookevent.update(
+                        where={"id": event.id},
+                        data={"status": "IGNORED"}
+                    )
+        except Exception as e:
+            await self._retry_later(event, e)
+            raise
+        
+        self.counters["applied" if applied else "ignored"] += 1
+        
+        for chat_id, text in notices:
+            await self._notify(chat_id, text)
+    
+    async def _retry_later(self, event: WebhookEvent, error: Exception):
+        # The event stays PENDING with a growing delay, so the dedupe key never swallows an unapplied callback
+        attempt = event.attempts + 1
+        if attempt < self.max_attempts:
+            delay = min(self.max_retry_delay, self.retry_delay * 2 ** (attempt - 1))
+            await retry_webhook_event(self.db, event.id, str(error), datetime.now(timezone.utc) + timedelta(seconds=delay))
+            self.counters["retried"] += 1
+            return
+        
+        await retry_webhook_event(self.db, event.id, str(error), None)
+        self.counters["failed"] += 1
+        logger.error(f"Webhook event {event.idempotencyKey} gave up after {attempt} attempts: {error}")
+        
+        for admin_id in config.bot.admin_ids:
+            await self._notify(
+                admin_id,
+                f"{Emoji.WARNING} <b>Webhook Gagal Diproses</b>\n\n"
+                f"Event <code>{event.idempotencyKey}</code> gagal {attempt} kali dan tidak dicoba lagi.\n"
+                f"Cek event ini secara manual.",
+            )
+    
+    async def _notify(self, chat_id: int, text: str):
+        if not self.bot:
+            return
+        
+        try:
+            await self.bot.send_message(chat_id, text, parse_mode="HTML")
+        except Exception as e:
+            logger.warning(f"Failed to notify {chat_id}: {e}")
+    
+    async def _apply_oxapay(self, tx: Prisma, event: WebhookEvent, notices: list) -> bool:
+        payload = event.payload
+        
+        if not str(payload.get("orderId", "")).startswith("SELL_") or payload.get("status") != "Paid":
+            return False
+        
+        order = await tx.cryptoorder.find_first(where={"oxapayPaymentId": payload.get("trackId")})
+        if not order:
+            return False
+        
+        if not await transition_status(tx, "cryptoorder", order.id, "AWAITING_CRYPTO", "COMPLETED"):
+            return False
+        
+        await update_balance(tx, order.userId, order.fiatAmount)
+        
+        await tx.transaction.create(
+            data={
+                "userId": order.userId,
+                "type": "SELL",
+                "amount": order.fiatAmount,
+                "status": "COMPLETED",
+                "description": f"Jual {order.cryptoAmount} {order.coinSymbol}",
+                "orderId": order.id,
+            }
+        )
+        
+        logger.info(f"Sell order {order.id} completed, added {order.fiatAmount} to balance")
+        return True
+    
+    async def _apply_cryptobot(self, tx: Prisma, event: WebhookEvent, notices: list) -> bool:
+        payload = event.payload
+        
+        if payload.get("status") != "paid":
+            return False
+        
+        deposit = await tx.deposit.find_first(
+            where={"cryptobotInvoiceId": str(payload.get("invoice_id"))},
+            include={"user": True}
+        )
+        # The money arrived even if the deposit was cancelled meanwhile, so credit it and tell the admins
+        if not deposit or not await complete_deposit(tx, deposit, ["PENDING", "CANCELLED"]):
+            return False
+        
+        if deposit.status == "CANCELLED":
+            logger.warning(f"CryptoBot deposit {deposit.id} was paid after it was cancelled")
+            for admin_id in config.bot.admin_ids:
+                notices.append((
+                    admin_id,
+                    f"{Emoji.WARNING} <b>Deposit Batal Tetap Dibayar</b>\n\n"
+                    f"Invoice deposit <code>{deposit.id}</code> dibayar setelah deposit dibatalkan.\n"
+                    f"Saldo user tetap ditambah Rp {deposit.amount:,.0f}.",
+                ))
+        
+        notices.append((
+            deposit.user.telegramId,
+            f"{Emoji.CHECK} <b>Deposit Berhasil!</b>\n\n"
+            f"Saldo Anda telah ditambah <b>Rp {deposit.amount:,.0f}</b>",
+        ))
+        
+        logger.info(f"CryptoBot deposit {deposit.id} completed, added {deposit.amount} to balance")
+        return True
@@ -0,0 +1,29 @@
+-- One-off backfill for balances.held. Run once, right after `prisma db push`
+-- adds the column and before the new bot version starts.
+
+BEGIN;
+
+-- Buy orders still in PROCESSING were debited up front by the old flow:
+-- give the debit back and hold it instead, so available balance is unchanged.
+UPDATE balances AS b
+SET amount = b.amount + o.total, held = b.held + o.total, updated_at = NOW()
+FROM (
+    SELECT user_id, SUM(fiat_amount) AS total
+    FROM crypto_orders
+    WHERE order_type = 'BUY' AND status = 'PROCESSING'
+    GROUP BY user_id
+) AS o
+WHERE b.user_id = o.user_id;
+
+-- Pending withdrawals reserved nothing before; hold their amount now.
+UPDATE balances AS b
+SET held = b.held + w.total, updated_at = NOW()
+FROM (
+    SELECT user_id, SUM(amount) AS total
+    FROM withdrawals
+    WHERE status = 'PENDING'
+    GROUP BY user_id
+) AS w
+WHERE b.user_id = w.user_id;
+
+COMMIT;
@@ -0,0 +1,44 @@
+-- Partial indexes for the bot's "small open set inside a big table" queries.
+-- Prisma cannot declare partial indexes in schema.prisma, so they live here.
+-- Every statement is idempotent and non-blocking; re-run this file after
+-- each `prisma db push`, since a push may drop indexes it does not know about.
+-- CONCURRENTLY cannot run inside a transaction block: run with plain psql -f.
+
+-- Admin /pending_topup and /pending_withdraw: oldest PENDING first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS deposits_pending_created_at_idx
+    ON deposits (created_at) WHERE status = 'PENDING';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS withdrawals_pending_created_at_idx
+    ON withdrawals (created_at) WHERE status = 'PENDING';
+
+-- DepositPoller keyset scan over open CryptoBot invoices
+CREATE INDEX CONCURRENTLY IF NOT EXISTS deposits_pending_cryptobot_id_idx
+    ON deposits (id) WHERE status = 'PENDING' AND cryptobot_invoice_id IS NOT NULL;
+
+-- OrderReconciler keyset scan over open orders
+CREATE INDEX CONCURRENTLY IF NOT EXISTS crypto_orders_open_id_idx
+    ON crypto_orders (id) WHERE status IN ('PROCESSING', 'AWAITING_PAYMENT', 'AWAITING_CRYPTO');
+
+-- PayoutWorker claim and stalled-lease sweep
+CREATE INDEX CONCURRENTLY IF NOT EXISTS payout_jobs_queued_created_at_idx
+    ON payout_jobs (created_at) WHERE status = 'QUEUED';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS payout_jobs_running_lease_idx
+    ON payout_jobs (lease_until) WHERE status = 'RUNNING';
+
+-- WebhookProcessor requeue of unprocessed events that are due for another attempt
+DROP INDEX CONCURRENTLY IF EXISTS webhook_events_pending_created_at_idx;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS webhook_events_pending_next_attempt_idx
+    ON webhook_events (next_attempt_at) WHERE status = 'PENDING';
+
+-- Active lookups on the settings tables
+CREATE INDEX CONCURRENTLY IF NOT EXISTS coin_settings_active_idx
+    ON coin_settings (coin_symbol, network) WHERE is_active;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS payment_methods_active_idx
+    ON payment_methods (id) WHERE is_active;
+
+-- InactivitySweeper: stale ACTIVE users only
+CREATE INDEX CONCURRENTLY IF NOT EXISTS users_active_last_active_at_idx
+    ON users (last_active_at) WHERE status = 'ACTIVE';
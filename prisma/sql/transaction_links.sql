@@ -0,0 +1,28 @@
+-- One-off backfill for transactions.deposit_id / withdrawal_id / order_id.
+-- Run after `prisma db push` has added the columns and their indexes.
+-- Rows whose JSON link points at a record that no longer exists are left NULL.
+
+BEGIN;
+
+UPDATE transactions AS t
+SET deposit_id = d.id
+FROM deposits AS d
+WHERE t.deposit_id IS NULL
+  AND t.metadata ? 'depositId'
+  AND d.id = t.metadata->>'depositId';
+
+UPDATE transactions AS t
+SET withdrawal_id = w.id
+FROM withdrawals AS w
+WHERE t.withdrawal_id IS NULL
+  AND t.metadata ? 'withdrawalId'
+  AND w.id = t.metadata->>'withdrawalId';
+
+UPDATE transactions AS t
+SET order_id = o.id
+FROM crypto_orders AS o
+WHERE t.order_id IS NULL
+  AND t.metadata ? 'orderId'
+  AND o.id = t.metadata->>'orderId';
+
+COMMIT;
@@ -19,7 +19,21 @@ from bot.middlewares.throttling import ThrottlingMiddleware
 from bot.middlewares.database import DatabaseMiddleware
 from bot.middlewares.user_status import UserStatusMiddleware
 from bot.middlewares.logging import LoggingMiddleware
-from bot.webhook import handle_oxapay_webhook, health_check
+from bot.middlewares.user_lock import UserLockMiddleware
+from bot.services.oxapay import OxaPayService
+from bot.services.market import MarketDataRefresher
+from bot.services.pricing import PricingEngine
+from bot.services.cryptobot import CryptoBotService
+from bot.workers.payouts import PayoutWorker
+from bot.workers.activity import ActivityTracker
+from bot.workers.inactivity import InactivitySweeper
+from bot.utils.locks import UserLockManager
+from bot.utils.cache import user_cache
+from bot.utils.rate_limit import TokenBuckets, create_token_buckets
+from bot.workers.reconciler import OrderReconciler
+from bot.workers.webhooks import WebhookProcessor
+from bot.workers.deposits import DepositPoller
+from bot.webhook import handle_oxapay_webhook, handle_cryptobot_webhook, health_check, metrics
 
 logging.basicConfig(
     level=logging.INFO,
@@ -31,14 +45,32 @@ WEBHOOK_PATH = "/telegram/webhook"
 WEBHOOK_PORT = 8080
 
 
-def setup_dispatcher(prisma: Prisma) -> Dispatcher:
+def setup_dispatcher(
+    prisma: Prisma,
+    oxapay: OxaPayService,
+    market: MarketDataRefresher,
+    pricing: PricingEngine,
+    cryptobot: CryptoBotService,
+    payouts: PayoutWorker,
+    locks: UserLockManager,
+    activity: ActivityTracker,
+    throttle: TokenBuckets,
+) -> Dispatcher:
     storage = MemoryStorage()
     dp = Dispatcher(storage=storage)
     
     logging_mw = LoggingMiddleware()
-    throttling_mw = ThrottlingMiddleware(rate_limit=0.1)
-    database_mw = DatabaseMiddleware(prisma)
-    user_status_mw = UserStatusMiddleware()
+    throttling_mw = ThrottlingMiddleware(throttle)
+    database_mw = DatabaseMiddleware(
+        prisma,
+        oxapay=oxapay,
+        market=market,
+        pricing=pricing,
+        cryptobot=cryptobot,
+        payouts=payouts,
+    )
+    user_status_mw = UserStatusMiddleware(activity)
+    user_lock_mw = UserLockMiddleware(locks)
     
     dp.message.middleware(logging_mw)
     dp.callback_query.middleware(logging_mw)
@@ -52,9 +84,19 @@ def setup_dispatcher(prisma: Prisma) -> Dispatcher:
     dp.message.middleware(user_status_mw)
     dp.callback_query.middleware(user_status_mw)
     
+    dp.message.middleware(user_lock_mw)
+    dp.callback_query.middleware(user_lock_mw)
+    
     router = setup_routers()
     dp.include_router(router)
     
+    dp.startup.register(market.start)
+    dp.shutdown.register(market.stop)
+    dp.startup.register(pricing.start)
+    dp.shutdown.register(pricing.stop)
+    dp.startup.register(payouts.start)
+    dp.shutdown.register(payouts.stop)
+    
     return dp
 
 
@@ -100,17 +142,100 @@ async def main():
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
     
-    dp = setup_dispatcher(prisma)
+    oxapay = OxaPayService.from_config(config.oxapay)
+    market = MarketDataRefresher(oxapay)
+    pricing = PricingEngine(
+        prisma,
+        market,
+        usd_to_idr=config.pricing.usd_to_idr,
+        default_margin=config.pricing.default_margin,
+        settings_interval=config.pricing.settings_refresh_interval,
+        quote_ttl=config.pricing.quote_ttl,
+        quote_tolerance=config.pricing.quote_tolerance,
+    )
+    cryptobot = CryptoBotService.from_config(config.cryptobot, usd_to_idr=config.pricing.usd_to_idr)
+    payouts = PayoutWorker(
+        prisma,
+        oxapay,
+        bot,
+        concurrency=config.workers.payout_concurrency,
+        lease_seconds=config.workers.payout_lease_seconds,
+    )
+    reconciler = OrderReconciler(
+        prisma,
+        oxapay,
+        interval=config.workers.reconcile_interval,
+        batch_size=config.workers.reconcile_batch_size,
+        concurrency=config.workers.reconcile_concurrency,
+    )
+    webhooks = WebhookProcessor(prisma, bot)
+    locks = UserLockManager()
+    throttle = create_token_buckets(
+        config.bot.user_state_capacity,
+        rate=config.throttle.rate,
+        burst=config.throttle.burst,
+        notice_interval=config.throttle.notice_interval,
+        redis_url=config.throttle.redis_url,
+    )
+    activity = ActivityTracker(prisma, flush_interval=config.workers.activity_flush_interval)
+    inactivity = InactivitySweeper(
+        prisma,
+        activity,
+        interval=config.workers.inactivity_sweep_interval,
+        inactive_days=config.workers.inactive_days,
+    )
+    deposits = DepositPoller(
+        prisma,
+        cryptobot,
+        bot,
+        interval=config.workers.deposit_poll_interval,
+    )
+    
+    dp = setup_dispatcher(prisma, oxapay, market, pricing, cryptobot, payouts, locks, activity, throttle)
     
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
+    dp.startup.register(reconciler.start)
+    dp.shutdown.register(reconciler.stop)
+    dp.startup.register(webhooks.start)
+    dp.shutdown.register(webhooks.stop)
+    dp.startup.register(deposits.start)
+    dp.shutdown.register(deposits.stop)
+    dp.startup.register(inactivity.start)
+    dp.shutdown.register(inactivity.stop)
+    dp.startup.register(activity.start)
+    dp.shutdown.register(activity.stop)
+    dp.startup.register(cryptobot.start)
+    dp.shutdown.register(cryptobot.stop)
+    dp.shutdown.register(throttle.close)
     
     app = web.Application()
     app["db"] = prisma
     app["bot"] = bot
+    app["oxapay"] = oxapay
+    app["market"] = market
+    app["pricing"] = pricing
+    app["cryptobot"] = cryptobot
+    app["payouts"] = payouts
+    app["webhooks"] = webhooks
+    app["metrics"] = {
+        "oxapay": oxapay.transport.stats,
+        "cryptobot": cryptobot.transport.stats,
+        "payouts": payouts.stats,
+        "reconciler": reconciler.stats,
+        "webhooks": webhooks.stats,
+        "deposits": deposits.stats,
+        "locks": locks.stats,
+        "users": user_cache.stats,
+        "throttle": throttle.stats,
+        "activity": activity.stats,
+        "inactivity": inactivity.stats,
+    }
     
     app.router.add_post("/webhook/oxapay", handle_oxapay_webhook)
+    app.router.add_post("/webhook/cryptobot", handle_cryptobot_webhook)
     app.router.add_get("/health", health_check)
+    app.router.add_get("/metrics", metrics)
     
     webhook_handler = SimpleRequestHandler(dispatcher=dp, bot=bot)
     webhook_handler.register(app, path=WEBHOOK_PATH)
@@ -133,6 +258,8 @@ async def main():
         await asyncio.Event().wait()
     finally:
         await runner.cleanup()
+        await oxapay.close()
+        await cryptobot.close()
         await prisma.disconnect()
         await bot.session.close()
 
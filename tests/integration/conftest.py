@@ -0,0 +1,27 @@
+import asyncio
+import os
+
+import pytest
+
+
+@pytest.fixture
+def run_db():
+    """Run an async scenario against TEST_DATABASE_URL, a throwaway Postgres with the schema pushed"""
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    from prisma import Prisma
+
+    def run(scenario):
+        async def main():
+            db = Prisma(datasource={"url": url})
+            await db.connect()
+            try:
+                return await scenario(db)
+            finally:
+                await db.disconnect()
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,43 @@
+import secrets
+from decimal import Decimal
+
+from bot.db.queries import create_crypto_order, create_deposit, create_user, hold_balance, update_balance
+
+
+async def make_user(db, balance="0", held="0"):
+    user = await create_user(
+        db,
+        telegram_id=10**12 + secrets.randbelow(10**12),
+        referral_code=secrets.token_hex(4).upper(),
+    )
+    if Decimal(balance):
+        await update_balance(db, user.id, Decimal(balance))
+    if Decimal(held):
+        assert await hold_balance(db, user.id, Decimal(held))
+    return user
+
+
+async def balance_of(db, user_id):
+    balance = await db.balance.find_unique(where={"userId": user_id})
+    return balance.amount, balance.held
+
+
+async def make_order(db, user_id, order_type="BUY", fiat_amount="100000", status="PROCESSING"):
+    return await create_crypto_order(
+        db,
+        user_id,
+        order_type,
+        "USDT",
+        "TRC20",
+        crypto_amount=Decimal("6"),
+        fiat_amount=Decimal(fiat_amount),
+        rate=Decimal("16320"),
+        margin=Decimal("2"),
+        network_fee=Decimal("1"),
+        wallet_address="TJRabPrwbZy45sbavfcjinPJC18kjpRTv8",
+        status=status,
+    )
+
+
+async def make_deposit(db, user_id, amount="50000", invoice_id=None):
+    return await create_deposit(db, user_id, Decimal(amount), "CryptoBot USDT", cryptobot_invoice_id=invoice_id)
@@ -0,0 +1,27 @@
+class FakeBot:
+    """Records what the workers would send to Telegram"""
+
+    def __init__(self):
+        self.sent = []
+        self.edited = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edited.append(text)
+
+
+class FakeOxaPay:
+    """Answers every payout with a fixed result; on_payout runs first to stand in for a racing settler"""
+
+    def __init__(self, result, on_payout=None):
+        self.result = result
+        self.on_payout = on_payout
+        self.payouts = []
+
+    async def create_payout(self, **kwargs):
+        self.payouts.append(kwargs)
+        if self.on_payout:
+            await self.on_payout()
+        return self.result
@@ -0,0 +1,45 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("prisma.models")
+
+from bot.db.queries import capture_hold, hold_balance, release_hold
+from tests.integration.factories import balance_of, make_user
+
+
+def test_concurrent_holds_never_overdraw(run_db):
+    async def scenario(db):
+        user = await make_user(db, balance="100000")
+        held = await asyncio.gather(*(hold_balance(db, user.id, Decimal("30000")) for _ in range(10)))
+        return held, await balance_of(db, user.id)
+
+    held, balance = run_db(scenario)
+    assert held.count(True) == 3
+    assert balance == (Decimal("100000"), Decimal("90000"))
+
+
+def test_hold_is_captured_or_released_once(run_db):
+    async def scenario(db):
+        captured = await make_user(db, balance="50000", held="50000")
+        released = await make_user(db, balance="50000", held="50000")
+        captures = await asyncio.gather(*(capture_hold(db, captured.id, Decimal("50000")) for _ in range(5)))
+        releases = await asyncio.gather(*(release_hold(db, released.id, Decimal("50000")) for _ in range(5)))
+        return captures, releases, await balance_of(db, captured.id), await balance_of(db, released.id)
+
+    captures, releases, captured, released = run_db(scenario)
+    assert captures.count(True) == 1
+    assert releases.count(True) == 1
+    assert captured == (Decimal("0"), Decimal("0"))
+    assert released == (Decimal("50000"), Decimal("0"))
+
+
+def test_capture_without_a_hold_is_refused(run_db):
+    async def scenario(db):
+        user = await make_user(db, balance="50000")
+        return await capture_hold(db, user.id, Decimal("10000")), await balance_of(db, user.id)
+
+    captured, balance = run_db(scenario)
+    assert not captured
+    assert balance == (Decimal("50000"), Decimal("0"))
@@ -0,0 +1,74 @@
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("prisma.models")
+pytest.importorskip("aiogram")
+
+from bot.db.queries import complete_buy_order, enqueue_payout_job, fail_buy_order
+from bot.services.oxapay import PayoutResult
+from bot.workers.payouts import PayoutWorker
+from tests.integration.factories import balance_of, make_order, make_user
+from tests.integration.fakes import FakeBot, FakeOxaPay
+
+
+async def run_job(db, oxapay, order):
+    job = await enqueue_payout_job(db, order.id)
+    worker = PayoutWorker(db, oxapay, FakeBot())
+    await worker._process({"id": job.id, "order_id": order.id, "chat_id": None, "message_id": None})
+    return (
+        worker,
+        await db.payoutjob.find_unique(where={"id": job.id}),
+        await db.cryptoorder.find_unique(where={"id": order.id}),
+    )
+
+
+def test_uncertain_payout_stalls_and_keeps_the_hold(run_db):
+    async def scenario(db):
+        user = await make_user(db, balance="100000", held="100000")
+        order = await make_order(db, user.id)
+        oxapay = FakeOxaPay(PayoutResult(success=False, payout_id="trk-1", error="timeout", uncertain=True))
+        return (*await run_job(db, oxapay, order), await balance_of(db, user.id))
+
+    worker, job, order, balance = run_db(scenario)
+    assert job.status == "STALLED"
+    assert job.leaseUntil is None
+    assert order.status == "PROCESSING"
+    assert order.oxapayPayoutId == "trk-1"
+    assert balance == (Decimal("100000"), Decimal("100000"))
+    assert worker.counters["stalled"] == 1
+
+
+def test_payout_completed_elsewhere_closes_the_job(run_db):
+    async def scenario(db):
+        user = await make_user(db, balance="100000", held="100000")
+        order = await make_order(db, user.id)
+
+        async def reconciler_wins():
+            assert (await complete_buy_order(db, order)) == (True, True)
+
+        oxapay = FakeOxaPay(PayoutResult(success=True, payout_id="trk-2"), on_payout=reconciler_wins)
+        return (*await run_job(db, oxapay, order), await balance_of(db, user.id))
+
+    worker, job, order, balance = run_db(scenario)
+    assert job.status == "SUCCEEDED"
+    assert order.status == "COMPLETED"
+    assert balance == (Decimal("0"), Decimal("0"))
+
+
+def test_failed_payout_on_a_settled_order_closes_the_job(run_db):
+    async def scenario(db):
+        user = await make_user(db, balance="100000", held="100000")
+        order = await make_order(db, user.id)
+
+        async def admin_refunds():
+            assert await fail_buy_order(db, order, "refunded by admin")
+
+        oxapay = FakeOxaPay(PayoutResult(success=False, error="rejected"), on_payout=admin_refunds)
+        return (*await run_job(db, oxapay, order), await balance_of(db, user.id))
+
+    worker, job, order, balance = run_db(scenario)
+    assert job.status == "FAILED"
+    assert order.status == "FAILED"
+    assert balance == (Decimal("100000"), Decimal("0"))
+    assert worker.counters["failed"] == 0
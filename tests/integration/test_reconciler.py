@@ -0,0 +1,61 @@
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("prisma.models")
+
+from bot.workers.reconciler import OrderReconciler
+from tests.integration.factories import balance_of, make_order, make_user
+
+
+async def order_status(db, order):
+    return (await db.cryptoorder.find_unique(where={"id": order.id})).status
+
+
+def test_apply_settles_each_kind_of_order(run_db):
+    async def scenario(db):
+        seller = await make_user(db)
+        buyer = await make_user(db, balance="200000", held="200000")
+        sell = await make_order(db, seller.id, order_type="SELL", status="AWAITING_CRYPTO")
+        sent = await make_order(db, buyer.id)
+        rejected = await make_order(db, buyer.id)
+
+        reconciler = OrderReconciler(db, oxapay=None)
+        moves = [(sell, "COMPLETED"), (sent, "COMPLETED"), (rejected, "FAILED")]
+        await reconciler._apply(moves)
+        # Replaying the same moves must not credit or capture again
+        await reconciler._apply(moves)
+
+        return (
+            reconciler.counters["transitions"],
+            [await order_status(db, order) for order in (sell, sent, rejected)],
+            await balance_of(db, seller.id),
+            await balance_of(db, buyer.id),
+            await db.transaction.count(where={"orderId": sell.id}),
+        )
+
+    transitions, statuses, seller, buyer, sell_transactions = run_db(scenario)
+    assert transitions == 3
+    assert statuses == ["COMPLETED", "COMPLETED", "FAILED"]
+    assert seller == (Decimal("100000"), Decimal("0"))
+    assert buyer == (Decimal("100000"), Decimal("0"))
+    assert sell_transactions == 1
+
+
+def test_apply_is_one_unit_of_work(run_db):
+    async def scenario(db):
+        seller = await make_user(db)
+        buyer = await make_user(db, balance="100000", held="100000")
+        sell = await make_order(db, seller.id, order_type="SELL", status="AWAITING_CRYPTO")
+        sent = await make_order(db, buyer.id)
+        # Without a balance row the sell credit fails halfway through the batch
+        await db.balance.delete(where={"userId": seller.id})
+
+        with pytest.raises(Exception):
+            await OrderReconciler(db, oxapay=None)._apply([(sell, "COMPLETED"), (sent, "COMPLETED")])
+
+        return [await order_status(db, order) for order in (sell, sent)], await balance_of(db, buyer.id)
+
+    statuses, buyer = run_db(scenario)
+    assert statuses == ["AWAITING_CRYPTO", "PROCESSING"]
+    assert buyer == (Decimal("100000"), Decimal("100000"))
@@ -0,0 +1,68 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("prisma.models")
+
+from bot.db.queries import cancel_deposit, complete_deposit, transition_status
+from tests.integration.factories import balance_of, make_deposit, make_order, make_user
+
+
+def test_only_one_transition_wins(run_db):
+    async def scenario(db):
+        user = await make_user(db)
+        order = await make_order(db, user.id, status="PENDING")
+        moved = await asyncio.gather(
+            *(transition_status(db, "cryptoorder", order.id, "PENDING", "PROCESSING") for _ in range(5)),
+            transition_status(db, "cryptoorder", order.id, "PENDING", "CANCELLED"),
+        )
+        return moved, await db.cryptoorder.find_unique(where={"id": order.id})
+
+    moved, order = run_db(scenario)
+    assert moved.count(True) == 1
+    assert order.status in ("PROCESSING", "CANCELLED")
+
+
+def test_transition_accepts_several_sources(run_db):
+    async def scenario(db):
+        user = await make_user(db)
+        order = await make_order(db, user.id, status="PROCESSING")
+        return (
+            await transition_status(db, "cryptoorder", order.id, ["PENDING", "PROCESSING"], "FAILED"),
+            await transition_status(db, "cryptoorder", order.id, ["PENDING", "PROCESSING"], "FAILED"),
+        )
+
+    assert run_db(scenario) == (True, False)
+
+
+def test_deposit_is_credited_once(run_db):
+    async def scenario(db):
+        user = await make_user(db)
+        deposit = await make_deposit(db, user.id, amount="50000")
+        completed = await asyncio.gather(*(complete_deposit(db, deposit) for _ in range(5)))
+        transactions = await db.transaction.find_many(where={"depositId": deposit.id})
+        return completed, await balance_of(db, user.id), [t.status for t in transactions]
+
+    completed, balance, statuses = run_db(scenario)
+    assert completed.count(True) == 1
+    assert balance == (Decimal("50000"), Decimal("0"))
+    assert statuses == ["COMPLETED"]
+
+
+def test_cancel_and_complete_race_settles_once(run_db):
+    async def scenario(db):
+        user = await make_user(db)
+        deposit = await make_deposit(db, user.id, amount="50000")
+        completed, cancelled = await asyncio.gather(complete_deposit(db, deposit), cancel_deposit(db, deposit.id))
+        current = await db.deposit.find_unique(where={"id": deposit.id})
+        return completed, cancelled, current.status, await balance_of(db, user.id)
+
+    completed, cancelled, status, balance = run_db(scenario)
+    assert completed != cancelled
+    if completed:
+        assert status == "COMPLETED"
+        assert balance == (Decimal("50000"), Decimal("0"))
+    else:
+        assert status == "CANCELLED"
+        assert balance == (Decimal("0"), Decimal("0"))
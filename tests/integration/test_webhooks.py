@@ -0,0 +1,110 @@
+import secrets
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("prisma.models")
+pytest.importorskip("aiogram")
+
+from bot.db.queries import cancel_deposit
+from bot.workers.webhooks import WebhookProcessor
+from tests.integration.factories import balance_of, make_deposit, make_user
+
+
+async def flaky_applier(tx, event, notices):
+    raise RuntimeError("provider payload not understood")
+
+
+async def events_for(db, key):
+    return await db.webhookevent.find_many(where={"idempotencyKey": f"test:{key}"})
+
+
+def test_redelivered_callbacks_are_recorded_once(run_db):
+    key = secrets.token_hex(8)
+
+    async def scenario(db):
+        first = WebhookProcessor(db)
+        # A restarted process has an empty in-memory cache and must fall back to the unique key
+        restarted = WebhookProcessor(db)
+        accepted = [
+            await first.ingest("test", key, {"n": 1}),
+            await first.ingest("test", key, {"n": 2}),
+            await restarted.ingest("test", key, {"n": 3}),
+        ]
+        return accepted, first.counters["duplicates"], await events_for(db, key)
+
+    accepted, duplicates, events = run_db(scenario)
+    assert accepted == [True, False, False]
+    assert duplicates == 1
+    assert [event.payload for event in events] == [{"n": 1}]
+
+
+def test_failed_event_stays_pending_with_backoff(run_db):
+    key = secrets.token_hex(8)
+
+    async def scenario(db):
+        processor = WebhookProcessor(db, retry_delay=60)
+        processor._appliers["test"] = flaky_applier
+        await processor.ingest("test", key, {})
+        event_id = processor._queue.get_nowait()
+
+        with pytest.raises(RuntimeError):
+            await processor._process(event_id)
+        # Not due yet, so an immediate redelivery from the queue is skipped
+        await processor._process(event_id)
+
+        return processor.counters, (await events_for(db, key))[0]
+
+    counters, event = run_db(scenario)
+    assert event.status == "PENDING"
+    assert event.attempts == 1
+    assert event.lastError == "provider payload not understood"
+    assert event.nextAttemptAt > datetime.now(timezone.utc)
+    assert counters["retried"] == 1
+    assert counters["failed"] == 0
+
+
+def test_event_is_parked_after_the_last_attempt(run_db):
+    key = secrets.token_hex(8)
+
+    async def scenario(db):
+        processor = WebhookProcessor(db, max_attempts=2, retry_delay=0)
+        processor._appliers["test"] = flaky_applier
+        await processor.ingest("test", key, {})
+        event_id = processor._queue.get_nowait()
+
+        for _ in range(3):
+            try:
+                await processor._process(event_id)
+            except RuntimeError:
+                pass
+
+        return processor.counters, (await events_for(db, key))[0]
+
+    counters, event = run_db(scenario)
+    assert event.status == "FAILED"
+    assert event.attempts == 2
+    assert counters["retried"] == 1
+    assert counters["failed"] == 1
+
+
+def test_paid_invoice_on_a_cancelled_deposit_is_credited(run_db):
+    invoice_id = str(secrets.randbelow(10**9))
+
+    async def scenario(db):
+        user = await make_user(db)
+        deposit = await make_deposit(db, user.id, amount="50000", invoice_id=invoice_id)
+        assert await cancel_deposit(db, deposit.id)
+
+        processor = WebhookProcessor(db)
+        await processor.ingest("cryptobot", invoice_id, {"status": "paid", "invoice_id": invoice_id})
+        await processor._process(processor._queue.get_nowait())
+
+        current = await db.deposit.find_unique(where={"id": deposit.id})
+        return processor.counters, current.status, await balance_of(db, user.id)
+
+    counters, status, balance = run_db(scenario)
+    assert counters["applied"] == 1
+    assert status == "COMPLETED"
+    assert balance == (Decimal("50000"), Decimal("0"))
@@ -0,0 +1,87 @@
+import asyncio
+
+from bot.utils.locks import UserLockManager
+
+
+def test_same_user_is_serialized():
+    locks = UserLockManager()
+    order = []
+
+    async def worker(name):
+        async with locks.hold(1):
+            order.append(f"{name}:in")
+            await asyncio.sleep(0.01)
+            order.append(f"{name}:out")
+
+    async def main():
+        await asyncio.gather(worker("a"), worker("b"))
+
+    asyncio.run(main())
+    assert order == ["a:in", "a:out", "b:in", "b:out"]
+    assert locks.stats()["contended"] == 1
+
+
+def test_different_users_run_concurrently():
+    locks = UserLockManager()
+    inside = set()
+    overlapped = []
+
+    async def worker(user_id):
+        async with locks.hold(user_id):
+            inside.add(user_id)
+            await asyncio.sleep(0.01)
+            overlapped.append(len(inside))
+            inside.discard(user_id)
+
+    async def main():
+        await asyncio.gather(worker(1), worker(2))
+
+    asyncio.run(main())
+    assert max(overlapped) == 2
+    assert locks.stats()["contended"] == 0
+
+
+def test_locks_are_dropped_when_released():
+    locks = UserLockManager()
+
+    async def main():
+        async with locks.hold(1):
+            assert locks.is_locked(1)
+            assert locks.stats()["active"] == 1
+
+    asyncio.run(main())
+    assert not locks.is_locked(1)
+    assert locks.stats()["active"] == 0
+
+
+def test_lock_released_on_error():
+    locks = UserLockManager()
+
+    async def main():
+        try:
+            async with locks.hold(1):
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+
+        async with locks.hold(1):
+            pass
+
+    asyncio.run(asyncio.wait_for(main(), timeout=1))
+    assert locks.stats()["active"] == 0
+
+
+def test_stats_do_not_expose_user_ids():
+    locks = UserLockManager()
+
+    async def worker():
+        async with locks.hold(123456789):
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(worker(), worker(), worker())
+
+    asyncio.run(main())
+    stats = locks.stats()
+    assert stats["hot_contention"] == [2]
+    assert "123456789" not in repr(stats)
@@ -0,0 +1,52 @@
+from decimal import Decimal, ROUND_UP
+
+import pytest
+
+from bot.utils.money import Amount, idr, idr_ceil
+
+
+def test_from_decimal_rounds_to_smallest_unit():
+    assert Amount.from_decimal("1.123456789", "USDT").units == 1123456
+    assert Amount.from_decimal("1.123456189", "USDT", ROUND_UP).units == 1123457
+    assert idr("999.9").units == 999
+    assert idr_ceil("999.1").units == 1000
+
+
+def test_to_decimal_round_trips():
+    amount = Amount.from_decimal(Decimal("0.00012345"), "BTC")
+    assert amount.units == 12345
+    assert amount.to_decimal() == Decimal("0.00012345")
+
+
+def test_serialize_round_trips():
+    amount = Amount.from_decimal("2.5", "SOL")
+    assert Amount.parse(amount.serialize()) == amount
+
+
+def test_arithmetic_and_ordering():
+    a = idr(15000)
+    b = idr(5000)
+    assert a - b == idr(10000)
+    assert a + b == idr(20000)
+    assert -b == idr(-5000)
+    assert b < a and a > b and a >= a and b <= b
+    assert not Amount.zero("IDR")
+    assert a
+
+
+def test_mixing_currencies_is_rejected():
+    with pytest.raises(ValueError):
+        idr(1) + Amount.from_decimal(1, "BTC")
+    with pytest.raises(ValueError):
+        idr(1) < Amount.from_decimal(1, "BTC")
+
+
+def test_convert_rounds_once():
+    usdt = Amount.from_decimal("1.5", "USDT")
+    assert usdt.convert(Decimal("16000.5"), "IDR") == idr(24000)
+    assert usdt.convert(Decimal("16000.5"), "IDR", ROUND_UP) == idr(24001)
+
+
+def test_format_uses_decimal_value():
+    assert f"{idr(1234567):,.0f}" == "1,234,567"
+    assert f"{Amount.from_decimal('0.5', 'BTC'):f}" == "0.5"
@@ -0,0 +1,126 @@
+import time
+from decimal import Decimal
+
+from bot.services.quotes import Quote, QuoteStore, QuoteTable
+from bot.utils.money import Amount, idr
+
+
+def make_quote(rate_idr, symbol="USDT", network="TRC20"):
+    rate_idr = Decimal(rate_idr)
+    return Quote(
+        symbol=symbol,
+        network=network,
+        rate_idr=rate_idr,
+        buy_margin=Decimal("2"),
+        sell_margin=Decimal("2"),
+        buy_rate=rate_idr * Decimal("1.02"),
+        sell_rate=rate_idr * Decimal("0.98"),
+        network_fee=Amount.from_decimal(1, symbol),
+        network_fee_idr=idr(rate_idr),
+    )
+
+
+def make_table(*quotes, fetched_at=None):
+    return QuoteTable(
+        usd_to_idr=Decimal("16000"),
+        quotes=quotes,
+        fetched_at=time.time() if fetched_at is None else fetched_at,
+    )
+
+
+def test_quote_covers_network_fee_first():
+    quote = make_quote("16000")
+    assert quote.crypto_for_idr(idr(16000)) is None
+    assert quote.crypto_for_idr(idr(16000 + 16320)) == Amount.from_decimal(1, "USDT")
+
+
+def test_idr_for_crypto_uses_sell_rate():
+    quote = make_quote("16000")
+    assert quote.idr_for_crypto(Amount.from_decimal(1, "USDT")) == idr(15680)
+
+
+def test_moved_from_uses_percent_tolerance():
+    base = make_quote("16000")
+    assert not make_quote("16079").moved_from(base, Decimal("0.5"))
+    assert make_quote("16081").moved_from(base, Decimal("0.5"))
+
+
+def test_table_lookup():
+    table = make_table(make_quote("16000"), make_quote("16000", network="ERC20"))
+    assert table.get("USDT", "TRC20").network == "TRC20"
+    assert len(table.get_coin_quotes("USDT")) == 2
+    assert table.get("BTC", "BTC") is None
+
+
+def test_table_staleness():
+    assert not make_table(make_quote("16000")).is_stale
+    assert make_table(fetched_at=time.time() - 1000).is_stale
+    assert QuoteTable(usd_to_idr=Decimal("16000")).is_stale
+
+
+def test_store_is_scoped_per_user():
+    store = QuoteStore(ttl=60)
+    locked = store.put(1, make_quote("16000"))
+
+    assert store.get(locked.id, 1) is locked
+    assert store.get(locked.id, 2) is None
+    assert store.latest(1, "USDT", "TRC20") is locked
+
+
+def test_store_expires_quotes():
+    store = QuoteStore(ttl=0.01)
+    locked = store.put(1, make_quote("16000"))
+
+    time.sleep(0.02)
+    assert store.get(locked.id, 1) is None
+    assert store.latest(1, "USDT", "TRC20") is None
+
+
+def test_lock_reuses_the_live_quote():
+    store = QuoteStore(ttl=60)
+    table = make_table(make_quote("16000"))
+
+    locked = store.lock(table, 1, "USDT", "TRC20")
+    assert store.lock(table, 1, "USDT", "TRC20") is locked
+
+
+def test_revalidate_keeps_quote_within_tolerance():
+    store = QuoteStore(ttl=60, tolerance=Decimal("0.5"))
+    locked = store.lock(make_table(make_quote("16000")), 1, "USDT", "TRC20")
+
+    assert store.revalidate(make_table(make_quote("16050")), 1, locked.id, "USDT", "TRC20") is locked
+
+
+def test_revalidate_requotes_past_tolerance():
+    store = QuoteStore(ttl=60, tolerance=Decimal("0.5"))
+    locked = store.lock(make_table(make_quote("16000")), 1, "USDT", "TRC20")
+
+    fresh = store.revalidate(make_table(make_quote("16200")), 1, locked.id, "USDT", "TRC20")
+    assert fresh.id != locked.id
+    assert fresh.quote.rate_idr == Decimal("16200")
+
+
+def test_revalidate_requotes_after_expiry():
+    store = QuoteStore(ttl=0.01)
+    table = make_table(make_quote("16000"))
+    locked = store.lock(table, 1, "USDT", "TRC20")
+
+    time.sleep(0.02)
+    assert store.revalidate(table, 1, locked.id, "USDT", "TRC20").id != locked.id
+
+
+def test_revalidate_rejects_another_pair():
+    store = QuoteStore(ttl=60)
+    table = make_table(make_quote("16000"), make_quote("16000", network="ERC20"))
+    locked = store.lock(table, 1, "USDT", "TRC20")
+
+    assert store.revalidate(table, 1, locked.id, "USDT", "ERC20").quote.network == "ERC20"
+
+
+def test_locked_quote_survives_a_stale_table():
+    store = QuoteStore(ttl=60)
+    locked = store.lock(make_table(make_quote("16000")), 1, "USDT", "TRC20")
+    stale = make_table(make_quote("20000"), fetched_at=time.time() - 1000)
+
+    assert store.revalidate(stale, 1, locked.id, "USDT", "TRC20") is locked
+    assert store.lock(stale, 2, "USDT", "TRC20") is None
@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+import pytest
+
+from bot.utils.rate_limit import LocalTokenBuckets, TokenBuckets, create_token_buckets
+
+
+def take(buckets, user_id, cost=1):
+    return asyncio.run(buckets.take(user_id, cost))
+
+
+def test_burst_then_reject():
+    buckets = LocalTokenBuckets(capacity=10, rate=0.001, burst=3, notice_interval=60)
+
+    assert [take(buckets, 1)[0] for _ in range(4)] == [True, True, True, False]
+    assert buckets.stats()["allowed"] == 3
+    assert buckets.stats()["rejected"] == 1
+
+
+def test_users_have_separate_buckets():
+    buckets = LocalTokenBuckets(capacity=10, rate=0.001, burst=1, notice_interval=60)
+
+    assert take(buckets, 1) == (True, False)
+    assert take(buckets, 2) == (True, False)
+    assert take(buckets, 1)[0] is False
+
+
+def test_weighted_cost():
+    buckets = LocalTokenBuckets(capacity=10, rate=0.001, burst=5, notice_interval=60)
+
+    assert take(buckets, 1, cost=4)[0] is True
+    assert take(buckets, 1, cost=2)[0] is False
+    assert take(buckets, 1, cost=1)[0] is True
+
+
+def test_notifies_once_per_interval():
+    buckets = LocalTokenBuckets(capacity=10, rate=0.001, burst=1, notice_interval=60)
+    take(buckets, 1)
+
+    assert take(buckets, 1) == (False, True)
+    assert take(buckets, 1) == (False, False)
+    assert buckets.stats()["notices"] == 1
+
+
+def test_refills_over_time():
+    buckets = LocalTokenBuckets(capacity=10, rate=100, burst=1, notice_interval=60)
+    take(buckets, 1)
+    assert take(buckets, 1)[0] is False
+
+    time.sleep(0.05)
+    assert take(buckets, 1)[0] is True
+
+
+def test_table_capacity_bounds_tracked_users():
+    buckets = LocalTokenBuckets(capacity=2, rate=0.001, burst=1, notice_interval=60)
+    for user_id in range(5):
+        take(buckets, user_id)
+
+    stats = buckets.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 3
+
+
+def test_falls_back_to_local_without_redis_url():
+    buckets = create_token_buckets(capacity=10, rate=1, burst=1, notice_interval=1)
+    assert isinstance(buckets, LocalTokenBuckets)
+
+
+def test_base_buckets_are_abstract():
+    with pytest.raises(TypeError):
+        TokenBuckets(rate=1, burst=1, notice_interval=1)
@@ -0,0 +1,56 @@
+from bot.utils.state_table import UserStateTable
+
+
+def test_get_defaults_for_unknown_user():
+    table = UserStateTable(capacity=2, fields=("a", "b"))
+    assert table.get(1, "a") == 0.0
+    assert table.get(1, "a", default=7.0) == 7.0
+    assert 1 not in table
+
+
+def test_fields_are_independent():
+    table = UserStateTable(capacity=2, fields=("a", "b"))
+    table.set(1, "a", 1.5)
+    table.set(1, "b", 2.5)
+    assert table.get(1, "a") == 1.5
+    assert table.get(1, "b") == 2.5
+    assert len(table) == 1
+
+
+def test_evicts_least_recently_used():
+    table = UserStateTable(capacity=2)
+    table.set(1, "last_seen", 1.0)
+    table.set(2, "last_seen", 2.0)
+
+    # Reading 1 makes 2 the oldest
+    table.get(1, "last_seen")
+    table.set(3, "last_seen", 3.0)
+
+    assert 2 not in table
+    assert 1 in table and 3 in table
+    assert table.evictions == 1
+    assert len(table) == 2
+
+
+def test_reused_slot_starts_cleared():
+    table = UserStateTable(capacity=1, fields=("a", "b"))
+    table.set(1, "a", 5.0)
+    table.set(1, "b", 6.0)
+    table.set(2, "a", 1.0)
+
+    assert table.get(2, "a") == 1.0
+    assert table.get(2, "b") == 0.0
+
+
+def test_memory_is_bounded_by_capacity():
+    table = UserStateTable(capacity=100, fields=("a",))
+    for telegram_id in range(1000):
+        table.set(telegram_id, "a", float(telegram_id))
+
+    full = table.memory_bytes()
+    for telegram_id in range(1000, 2000):
+        table.set(telegram_id, "a", float(telegram_id))
+
+    assert len(table) == 100
+    assert table.memory_bytes() == full
+    assert table.stats()["evictions"] == 1900
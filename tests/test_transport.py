@@ -0,0 +1,69 @@
+from bot.services.transport import CircuitBreaker
+
+
+def fail(breaker, times):
+    for _ in range(times):
+        breaker.record_failure()
+
+
+def test_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+
+    fail(breaker, 2)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+    fail(breaker, 1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+
+    fail(breaker, 2)
+    breaker.record_success()
+    fail(breaker, 2)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_a_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    fail(breaker, 1)
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_probe_success_closes():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    fail(breaker, 1)
+    breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+
+
+def test_probe_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60)
+    fail(breaker, 5)
+    breaker.reset_timeout = 0
+    breaker.allow()
+
+    breaker.reset_timeout = 60
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_abandoned_probe_frees_the_slot():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    fail(breaker, 1)
+    breaker.allow()
+    assert not breaker.allow()
+
+    breaker.abandon()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()